@@ -2,6 +2,8 @@ package main
 
 import (
 	"log"
+	"os"
+	"strconv"
 
 	"feature-api/internal/handler"
 	"feature-api/internal/service"
@@ -11,8 +13,14 @@ import (
 )
 
 func main() {
-	// Initialize Redis
-	redis, err := storage.NewRedisClient("localhost:6379")
+	// Initialize Redis, reading the key layout the stream processors write
+	// (same variables as the Python services' redis.key_layout settings)
+	keyLayout := getEnv("REDIS__KEY_LAYOUT", storage.LayoutString)
+	expiryBucketSeconds, err := strconv.ParseInt(getEnv("REDIS__EXPIRY_BUCKET_SECONDS", "60"), 10, 64)
+	if err != nil {
+		log.Fatalf("Invalid REDIS__EXPIRY_BUCKET_SECONDS: %v", err)
+	}
+	redis, err := storage.NewRedisClient("localhost:6379", keyLayout, expiryBucketSeconds)
 	if err != nil {
 		log.Fatalf("Failed to connect to Redis: %v", err)
 	}
@@ -76,6 +84,7 @@ func main() {
 
 	log.Println("Starting Feature API on :8000")
 	log.Println("Multi-tier caching: L1 (local) -> L2 (Redis) -> PostgreSQL fallback")
+	log.Printf("Redis key layout: %s", keyLayout)
 	log.Println("Endpoints:")
 	log.Println("  GET  /health")
 	log.Println("  GET  /stats")
@@ -86,3 +95,10 @@ func main() {
 		log.Fatalf("Failed to start server: %v", err)
 	}
 }
+
+func getEnv(name, fallback string) string {
+	if value, ok := os.LookupEnv(name); ok {
+		return value
+	}
+	return fallback
+}
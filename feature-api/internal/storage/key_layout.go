@@ -0,0 +1,68 @@
+package storage
+
+import (
+	"fmt"
+	"strconv"
+	"strings"
+	"time"
+)
+
+// Redis key layouts written by the Python stream processors (src/storage/key_layout.py),
+// selected with REDIS__KEY_LAYOUT like the Python side's redis.key_layout
+const (
+	LayoutString = "string" // feature:{name}:{entity_id} string keys
+	LayoutHash   = "hash"   // h:{u|p|s}:{entity_id} hash per entity, a field per feature
+)
+
+type featureField struct {
+	prefix string // Hash key prefix of the feature's entity type (ENTITY_HASH_PREFIXES)
+	code   string // Field in the entity's hash (FeatureDefinition.field_code)
+}
+
+// Field of each feature in the hash layout, must match src/common/features.py.
+// Codes are never reused, so a feature missing here reads as a miss, never as another's value.
+var featureFields = map[string]featureField{
+	"user_clicks_1h":              {"u", "c1h"},
+	"user_views_1h":               {"u", "v1h"},
+	"user_distinct_subreddits_1h": {"u", "ds1h"},
+	"user_engagement_score":       {"u", "es"},
+	"post_views_10m":              {"p", "v10m"},
+	"post_velocity":               {"p", "vel"},
+	"post_unique_viewers_10m":     {"p", "uv10m"},
+	"post_upvote_ratio":           {"p", "ur"},
+	"subreddit_trending_posts_1h": {"s", "tp1h"},
+}
+
+func validateLayout(layout string) error {
+	if layout != LayoutString && layout != LayoutHash {
+		return fmt.Errorf("unknown Redis key layout %q, expected %q or %q", layout, LayoutString, LayoutHash)
+	}
+	return nil
+}
+
+func stringKey(featureName, entityID string) string {
+	return fmt.Sprintf("feature:%s:%s", featureName, entityID)
+}
+
+func hashKey(prefix, entityID string) string {
+	return fmt.Sprintf("h:%s:%s", prefix, entityID)
+}
+
+// decodeField returns the value of a hash layout field stored as "{expiry bucket}|{value}",
+// ok is false for a malformed field or one whose expiry bucket has passed (Redis can't
+// expire single hash fields, so readers do)
+func decodeField(raw string, now time.Time, expiryBucketSeconds int64) (value string, ok bool) {
+	bucket, value, found := strings.Cut(raw, "|")
+	if !found {
+		return "", false
+	}
+	expiryBucket, err := strconv.ParseInt(bucket, 10, 64)
+	if err != nil {
+		return "", false
+	}
+	expiresAt := time.Unix(expiryBucket*expiryBucketSeconds, 0)
+	if !now.Before(expiresAt) {
+		return "", false
+	}
+	return value, true
+}
@@ -37,12 +37,10 @@ func NewPostgresClient(host string, port int, user, password, dbname string) (*P
 func (p *PostgresClient) GetOfflineFeature(entityID, entityType, featureName string) (string, error) {
 	query := `
         SELECT feature_value 
-        FROM offline_features
+        FROM latest_features
         WHERE entity_id = $1 
           AND entity_type = $2 
           AND feature_name = $3
-        ORDER BY computed_at DESC
-        LIMIT 1
     `
 
 	var value string
@@ -13,12 +13,20 @@ type RedisClient struct {
 	client *redis.Client
 	ctx    context.Context
 
+	// Where features live, see key_layout.go
+	layout              string
+	expiryBucketSeconds int64
+
 	// Metrics
 	hits   int64
 	misses int64
 }
 
-func NewRedisClient(addr string) (*RedisClient, error) {
+func NewRedisClient(addr, layout string, expiryBucketSeconds int64) (*RedisClient, error) {
+	if err := validateLayout(layout); err != nil {
+		return nil, err
+	}
+
 	client := redis.NewClient(&redis.Options{
 		Addr:         addr,
 		DialTimeout:  5 * time.Second,
@@ -36,15 +44,23 @@ func NewRedisClient(addr string) (*RedisClient, error) {
 	}
 
 	return &RedisClient{
-		client: client,
-		ctx:    ctx,
+		client:              client,
+		ctx:                 ctx,
+		layout:              layout,
+		expiryBucketSeconds: expiryBucketSeconds,
 	}, nil
 }
 
 func (r *RedisClient) GetFeature(featureName, entityID string) (interface{}, error) {
-	key := fmt.Sprintf("feature:%s:%s", featureName, entityID)
+	if r.layout == LayoutHash {
+		results, err := r.getHashFeatures([]string{featureName}, entityID)
+		if err != nil {
+			return nil, err
+		}
+		return results[featureName], nil
+	}
 
-	val, err := r.client.Get(r.ctx, key).Result()
+	val, err := r.client.Get(r.ctx, stringKey(featureName, entityID)).Result()
 	if err == redis.Nil {
 		r.misses++
 		return nil, nil // Key doesn't exist
@@ -54,25 +70,20 @@ func (r *RedisClient) GetFeature(featureName, entityID string) (interface{}, err
 	}
 
 	r.hits++
-
-	// Try to unmarshal as JSON
-	var result interface{}
-	if err := json.Unmarshal([]byte(val), &result); err != nil {
-		// If not JSON, return as string
-		return val, nil
-	}
-
-	return result, nil
+	return parseValue(val), nil
 }
 
 func (r *RedisClient) GetMultipleFeatures(features []string, entityID string) (map[string]interface{}, error) {
+	if r.layout == LayoutHash {
+		return r.getHashFeatures(features, entityID)
+	}
+
 	// Use pipeline for efficient batch retrieval
 	pipe := r.client.Pipeline()
 
 	cmds := make([]*redis.StringCmd, len(features))
 	for i, feature := range features {
-		key := fmt.Sprintf("feature:%s:%s", feature, entityID)
-		cmds[i] = pipe.Get(r.ctx, key)
+		cmds[i] = pipe.Get(r.ctx, stringKey(feature, entityID))
 	}
 
 	_, err := pipe.Exec(r.ctx)
@@ -95,19 +106,73 @@ func (r *RedisClient) GetMultipleFeatures(features []string, entityID string) (m
 		}
 
 		r.hits++
+		results[features[i]] = parseValue(val)
+	}
+
+	return results, nil
+}
 
-		// Try to unmarshal as JSON
-		var result interface{}
-		if err := json.Unmarshal([]byte(val), &result); err != nil {
-			results[features[i]] = val
-		} else {
-			results[features[i]] = result
+// getHashFeatures reads features from the hash layout, one HMGET per entity hash the
+// features live in (features of one entity type share a hash). Unknown features,
+// missing fields and fields past their expiry bucket are nil.
+func (r *RedisClient) getHashFeatures(features []string, entityID string) (map[string]interface{}, error) {
+	results := make(map[string]interface{}, len(features))
+	names := make(map[string][]string) // hash prefix -> features read from it
+	codes := make(map[string][]string) // hash prefix -> their field codes
+	for _, feature := range features {
+		results[feature] = nil
+		field, ok := featureFields[feature]
+		if !ok {
+			r.misses++
+			continue
+		}
+		names[field.prefix] = append(names[field.prefix], feature)
+		codes[field.prefix] = append(codes[field.prefix], field.code)
+	}
+	if len(names) == 0 {
+		return results, nil
+	}
+
+	pipe := r.client.Pipeline()
+	cmds := make(map[string]*redis.SliceCmd, len(names))
+	for prefix, fields := range codes {
+		cmds[prefix] = pipe.HMGet(r.ctx, hashKey(prefix, entityID), fields...)
+	}
+	if _, err := pipe.Exec(r.ctx); err != nil && err != redis.Nil {
+		return nil, err
+	}
+
+	now := time.Now()
+	for prefix, cmd := range cmds {
+		for i, raw := range cmd.Val() {
+			feature := names[prefix][i]
+			s, isString := raw.(string)
+			if !isString {
+				r.misses++
+				continue
+			}
+			val, ok := decodeField(s, now, r.expiryBucketSeconds)
+			if !ok {
+				r.misses++
+				continue
+			}
+			r.hits++
+			results[feature] = parseValue(val)
 		}
 	}
 
 	return results, nil
 }
 
+// parseValue unmarshals a stored value as JSON, or returns it as a string if it isn't JSON
+func parseValue(val string) interface{} {
+	var result interface{}
+	if err := json.Unmarshal([]byte(val), &result); err != nil {
+		return val
+	}
+	return result
+}
+
 func (r *RedisClient) HitRate() float64 {
 	total := r.hits + r.misses
 	if total == 0 {
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for the event codec
+Compares the old hot path (json + model_dump + EventType.value compares) with
+src.common.codec in JSON and binary encodings, single process, and reports
+payload size and events per second per core. Round-trip correctness is
+covered by tests/test_codec.py.
+
+    python -m scripts.benchmark_codec --events 50000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Callable, List
+from src.common import codec
+from src.common.events import BaseEvent, EventType
+from src.common.event_generator import EventGenerator
+
+
+def legacy_encode(event: BaseEvent) -> bytes:
+    return json.dumps(event.model_dump(), default=str).encode('utf-8')
+
+
+def legacy_decode(payload: bytes) -> int:
+    event_data = json.loads(payload.decode('utf-8'))
+    datetime.fromisoformat(event_data['timestamp']).timestamp()
+    event_type = event_data.get('event_type')
+    if event_type == EventType.USER_CLICK.value:
+        return 1
+    elif event_type == EventType.USER_VIEW.value:
+        return 2
+    return 0
+
+
+def make_decoder(encoding: bytes) -> Callable[[bytes], int]:
+    """Codec decode plus the same event type switch the processor does"""
+    def decode(payload: bytes) -> int:
+        event = codec.decode_user_event(payload, encoding)
+        event_type = event.event_type
+        if event_type == codec.USER_CLICK:
+            return 1
+        elif event_type == codec.USER_VIEW:
+            return 2
+        return 0
+    return decode
+
+
+def measure(fn: Callable, items: List, repeat: int) -> float:
+    """Best-of-repeat throughput in items per second"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event encode/decode throughput")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    generator = EventGenerator()
+    events = [generator.generate_user_event() for _ in range(args.events)]
+
+    encoders = {
+        "legacy": legacy_encode,
+        "json": codec.encode_event_json,
+        "binary": codec.encode_event_binary,
+    }
+    decoders = {
+        "legacy": legacy_decode,
+        "json": make_decoder(codec.ENCODING_JSON),
+        "binary": make_decoder(codec.ENCODING_BINARY),
+    }
+    payloads = {name: [encode(event) for event in events] for name, encode in encoders.items()}
+
+    backend = "orjson" if codec.orjson is not None else "json"
+    print(f"{args.events} user events, best of {args.repeat}, codec JSON backend: {backend}")
+    print(f"{'':8}{'bytes/ev':>10}{'encode ev/s':>14}{'decode ev/s':>14}")
+    for name in encoders:
+        size = sum(map(len, payloads[name])) / len(events)
+        encode_rate = measure(encoders[name], events, args.repeat)
+        decode_rate = measure(decoders[name], payloads[name], args.repeat)
+        print(f"{name:8}{size:>10.0f}{encode_rate:>14,.0f}{decode_rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
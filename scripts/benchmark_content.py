@@ -0,0 +1,110 @@
+"""
+Benchmark for ContentFeatureProcessor at high post cardinality
+Feeds decoded view/vote events for N distinct posts (Zipf-ranked) through the
+processor and reports events per second and the state it held, for each N.
+Storage is replaced by in-process stand-ins that keep spilled state in a dict
+and drop feature writes, so this measures the processor itself.
+
+    python -m scripts.benchmark_content --posts 10000 100000 1000000 --max-state-mb 64
+"""
+import argparse
+import time
+import uuid
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from src.common import codec
+from src.streaming.content_feature_processor import ContentFeatureProcessor
+
+
+class InMemoryRedis:
+    """The RedisClient calls ContentFeatureProcessor makes, backed by a dict"""
+
+    def __init__(self):
+        self.states: Dict[str, Any] = {}
+
+    def set_features(self, updates: List[Tuple[Any, str, Any]]):
+        pass
+
+    def set_entity_states(self, entity_type: str, states: Dict[str, bytes], ttl: int):
+        self.states.update(states)
+
+    def get_entity_states(self, entity_type: str, entity_ids: List[str], delete: bool = True) -> Dict[str, Any]:
+        found = {}
+        for entity_id in entity_ids:
+            state = self.states.pop(entity_id, None) if delete else self.states.get(entity_id)
+            if state is not None:
+                found[entity_id] = state
+        return found
+
+
+class NullPostgres:
+    """Drops offline rows"""
+
+    def store_offline_feature(self, **kwargs):
+        pass
+
+    def store_offline_features(self, rows):
+        pass
+
+
+def make_batches(num_events: int, num_posts: int, batch_size: int, rate: float,
+                 zipf_skew: float, seed: int) -> List[List[codec.UserEventRecord]]:
+    """Decoded events, 80% views and 20% votes, over num_posts Zipf-ranked posts"""
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, num_posts + 1, dtype=np.float64)
+    weights = ranks ** -zipf_skew if zipf_skew else np.ones(num_posts)
+    posts = rng.choice(num_posts, size=num_events, p=weights / weights.sum())
+    types = rng.choice([codec.USER_VIEW, codec.USER_UPVOTE, codec.USER_DOWNVOTE],
+                       size=num_events, p=[0.8, 0.15, 0.05])
+    start = time.time()
+    timestamps = start + np.arange(num_events) / rate
+
+    event_id = str(uuid.uuid4())
+    records = [codec.UserEventRecord(event_id, int(t), float(ts), "user_0", f"post_{p}",
+                                     None, None, None, None)
+               for p, t, ts in zip(posts.tolist(), types.tolist(), timestamps.tolist())]
+    return [records[i:i + batch_size] for i in range(0, num_events, batch_size)]
+
+
+def run(num_posts: int, args) -> Dict[str, Any]:
+    batches = make_batches(args.events, num_posts, args.batch_size, args.rate, args.zipf_skew, seed=42)
+    processor = ContentFeatureProcessor(InMemoryRedis(), NullPostgres(),  # type: ignore[arg-type]
+                                        max_state_mb=args.max_state_mb)
+
+    start = time.process_time()
+    for batch in batches:
+        processor.process_batch(batch)
+    elapsed = time.process_time() - start
+
+    stats = processor.stats()
+    return {
+        'events_per_second': args.events / elapsed,
+        'cached_posts': stats['size'],
+        'max_cached_posts': processor.max_cached_posts,
+        'spilled': stats['spilled'],
+        'reloaded': stats['reloaded'],
+        'state_mb': stats['size'] * processor.state_bytes / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the content feature processor")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--posts", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=50000.0, help="Event time rate, events/s")
+    parser.add_argument("--zipf-skew", type=float, default=0.0)
+    parser.add_argument("--max-state-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.events} events, batch {args.batch_size}, zipf skew {args.zipf_skew}, "
+          f"state budget {args.max_state_mb} MB")
+    print(f"{'posts':>10}{'events/s':>12}{'cached':>10}{'state MB':>10}{'spilled':>10}{'reloaded':>10}")
+    for num_posts in args.posts:
+        result = run(num_posts, args)
+        print(f"{num_posts:>10}{result['events_per_second']:>12,.0f}{result['cached_posts']:>10}"
+              f"{result['state_mb']:>10.1f}{result['spilled']:>10}{result['reloaded']:>10}")
+
+
+if __name__ == "__main__":
+    main()
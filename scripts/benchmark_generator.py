@@ -0,0 +1,73 @@
+"""
+Benchmark for EventGenerator throughput
+Compares the per-event path (generate_batch + json.dumps(model_dump())) with
+the NumPy batch mode (generate_encoded_batch) in JSON and binary encodings,
+single process, in events per CPU second including encoding
+
+    python -m scripts.benchmark_generator --events 100000 --zipf-skew 1.1
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Callable
+from src.common import codec
+from src.common.event_generator import EventGenerator
+
+
+def measure(fn: Callable[[], int], repeat: int) -> float:
+    """Best-of-repeat events per CPU second of fn, which returns how many events it made"""
+    best = 0.0
+    for _ in range(repeat):
+        # CPU time, so noisy neighbours on shared hosts don't skew the ratio
+        start = time.process_time()
+        count = fn()
+        best = max(best, count / (time.process_time() - start))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event generation throughput")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--num-users", type=int, default=100000)
+    parser.add_argument("--num-posts", type=int, default=500000)
+    parser.add_argument("--zipf-skew", type=float, default=1.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = EventGenerator(num_users=args.num_users, num_posts=args.num_posts,
+                               zipf_skew=args.zipf_skew, seed=42)
+
+    def legacy() -> int:
+        # The per-event path is slow, time a tenth of the events
+        events = generator.generate_batch(args.events // 10)
+        for event in events:
+            json.dumps(event.model_dump(), default=str).encode('utf-8')
+        return len(events)
+
+    def batched(encoding: bytes) -> Callable[[], int]:
+        def run() -> int:
+            produced = 0
+            while produced < args.events:
+                produced += len(generator.generate_encoded_batch(args.batch_size, encoding=encoding))
+            return produced
+        return run
+
+    legacy_rate = measure(legacy, args.repeat)
+    print(f"{args.num_users} users, {args.num_posts} posts, zipf skew {args.zipf_skew}, best of {args.repeat}")
+    print(f"{'':16}{'events/s':>12}{'speedup':>10}")
+    print(f"{'per-event json':16}{legacy_rate:>12,.0f}{1.0:>9.1f}x")
+    for name, encoding in (("batch json", codec.ENCODING_JSON), ("batch binary", codec.ENCODING_BINARY)):
+        rate = measure(batched(encoding), args.repeat)
+        print(f"{name:16}{rate:>12,.0f}{rate / legacy_rate:>9.1f}x")
+
+    # Skew check: share of user events going to the hottest 1% of users
+    batch = generator.generate_encoded_batch(args.batch_size)
+    counts = Counter(key for key, _ in batch.user_events)
+    top = sum(count for _, count in counts.most_common(max(1, args.num_users // 100)))
+    print(f"hottest 1% of users get {top / len(batch.user_events):.0%} of user events")
+
+
+if __name__ == "__main__":
+    main()
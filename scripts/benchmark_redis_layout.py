@@ -0,0 +1,83 @@
+"""
+Benchmark for the Redis key layouts (src.storage.key_layout)
+Writes every USER_FEATURES value for N users in each layout, then reports
+Redis memory per user (INFO used_memory delta), write and read throughput
+through RedisClient, and commands per user. Needs a running Redis, and
+FLUSHDBs the database it's given before each layout.
+
+    python -m scripts.benchmark_redis_layout --users 100000 --db 15
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+from src.common.features import USER_FEATURES
+from src.storage.redis_client import RedisClient
+
+
+def used_memory(redis: RedisClient) -> int:
+    return int(redis.client.info("memory")["used_memory"])
+
+
+def run(layout: str, args) -> Dict[str, Any]:
+    redis = RedisClient(args.host, args.port, args.db, key_layout=layout)
+    feature_defs = list(USER_FEATURES.values())
+    user_ids = [f"user_{i}" for i in range(args.users)]
+    rng = random.Random(42)
+
+    try:
+        redis.client.flushdb()
+        baseline = used_memory(redis)
+
+        start = time.perf_counter()
+        for batch_start in range(0, args.users, args.batch_size):
+            redis.set_features([(feature_def, user_id, rng.randint(0, 500))
+                                for user_id in user_ids[batch_start:batch_start + args.batch_size]
+                                for feature_def in feature_defs])
+        write_seconds = time.perf_counter() - start
+        memory = used_memory(redis) - baseline
+        keys = redis.client.dbsize()
+
+        start = time.perf_counter()
+        for batch_start in range(0, args.users, args.batch_size):
+            redis.get_feature_matrix(feature_defs, user_ids[batch_start:batch_start + args.batch_size])
+        read_seconds = time.perf_counter() - start
+
+        redis.client.flushdb()
+    finally:
+        redis.close()
+
+    return {
+        'bytes_per_user': memory / args.users,
+        'keys': keys,
+        'writes_per_second': args.users / write_seconds,
+        'reads_per_second': args.users / read_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Redis memory and throughput per key layout")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per pipelined write or read")
+    parser.add_argument("--layouts", nargs="+", default=["string", "hash"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15, help="Flushed before each layout")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    print(f"{args.users} users x {len(USER_FEATURES)} features, batch {args.batch_size}, db {args.db}")
+    print(f"{'layout':>8}{'keys':>10}{'bytes/user':>12}{'writes/s':>12}{'reads/s':>12}")
+    for layout in args.layouts:
+        result = run(layout, args)
+        results.append(result)
+        print(f"{layout:>8}{result['keys']:>10}{result['bytes_per_user']:>12,.0f}"
+              f"{result['writes_per_second']:>12,.0f}{result['reads_per_second']:>12,.0f}")
+
+    if len(results) > 1 and results[-1]['bytes_per_user']:
+        print(f"{args.layouts[0]} / {args.layouts[-1]} memory: "
+              f"{results[0]['bytes_per_user'] / results[-1]['bytes_per_user']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
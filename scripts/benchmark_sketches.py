@@ -0,0 +1,118 @@
+"""
+Benchmark for the probabilistic sketches (src.streaming.sketches)
+Feeds synthetic streams to each sketch and reports accuracy against exact
+counts, throughput (adds per second) and memory. HyperLogLog is measured
+at several precisions and cardinalities, Count-Min on a Zipf stream, and
+the windowed top-k by recall of the exact top k and count error.
+
+    python -m scripts.benchmark_sketches --items 1000000
+"""
+import argparse
+import time
+from collections import Counter
+from typing import List
+import numpy as np
+from src.streaming.sketches import CountMinSketch, HyperLogLog, SlidingWindowDistinct, SlidingWindowTopK
+
+
+def zipf_stream(n: int, distinct: int, skew: float, rng: np.random.Generator) -> List[str]:
+    """n item ids drawn from distinct ids with Zipf-like popularity"""
+    weights = 1.0 / np.arange(1, distinct + 1) ** skew
+    ids = rng.choice(distinct, size=n, p=weights / weights.sum())
+    return [f"post_{i}" for i in ids]
+
+
+def bench_hll(args, rng: np.random.Generator):
+    print(f"HyperLogLog, {args.trials} trials per cardinality")
+    print(f"{'p':>4}{'bytes':>8}{'std err':>9}{'cardinality':>13}{'mean |err|':>12}{'max |err|':>11}{'adds/s':>12}")
+    for precision in args.precisions:
+        for cardinality in args.cardinalities:
+            errors = []
+            seconds = 0.0
+            for trial in range(args.trials):
+                items = [f"user_{trial}_{i}" for i in range(cardinality)]
+                sketch = HyperLogLog(precision)
+                start = time.perf_counter()
+                for item in items:
+                    sketch.add(item)
+                seconds += time.perf_counter() - start
+                errors.append(abs(sketch.count() - cardinality) / cardinality)
+            print(f"{precision:>4}{1 << precision:>8}{HyperLogLog(precision).standard_error:>9.2%}"
+                  f"{cardinality:>13,}{np.mean(errors):>12.2%}{max(errors):>11.2%}"
+                  f"{args.trials * cardinality / seconds:>12,.0f}")
+
+
+def bench_count_min(args, rng: np.random.Generator):
+    items = zipf_stream(args.items, args.distinct, args.skew, rng)
+    exact = Counter(items)
+    top = [item for item, _ in exact.most_common(100)]
+
+    print(f"\nCount-Min, {args.items:,} adds over {args.distinct:,} items (Zipf {args.skew})")
+    print(f"{'width x depth':>14}{'bytes':>9}{'bound':>9}{'top-100 err':>13}{'all err':>10}{'adds/s':>12}")
+    for width, depth in ((256, 4), (512, 4), (2048, 5)):
+        sketch = CountMinSketch(width, depth)
+        start = time.perf_counter()
+        for item in items:
+            sketch.add(item)
+        seconds = time.perf_counter() - start
+
+        # Overestimates as a fraction of the stream, comparable to the e/w bound
+        top_error = np.mean([sketch.estimate(item) - exact[item] for item in top]) / args.items
+        sample = list(exact)[:2000]
+        all_error = np.mean([sketch.estimate(item) - exact[item] for item in sample]) / args.items
+        print(f"{f'{width} x {depth}':>14}{sketch.counts.nbytes:>9,}{sketch.epsilon:>9.2%}"
+              f"{top_error:>13.3%}{all_error:>10.3%}{args.items / seconds:>12,.0f}")
+
+
+def bench_windowed(args, rng: np.random.Generator):
+    items = zipf_stream(args.items, args.distinct, args.skew, rng)
+    # Spread over one window so every bucket is in use
+    timestamps = np.sort(rng.uniform(0, 3600, size=len(items)))
+    exact = Counter(items)
+    exact_top = exact.most_common(args.k)
+
+    top_k = SlidingWindowTopK(600, 6, k=args.k)
+    distinct = SlidingWindowDistinct(600, 6, precision=10)
+    start = time.perf_counter()
+    for timestamp, item in zip(timestamps, items):
+        top_k.add(timestamp, item)
+    top_k_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for timestamp, item in zip(timestamps, items):
+        distinct.add(timestamp, item)
+    distinct_seconds = time.perf_counter() - start
+
+    now = float(timestamps[-1])
+    start = time.perf_counter()
+    reported = top_k.value(now)
+    value_ms = (time.perf_counter() - start) * 1000
+
+    recall = len({item for item, _ in reported} & {item for item, _ in exact_top}) / args.k
+    count_error = np.mean([(count - exact[item]) / exact[item] for item, count in reported])
+    print(f"\nWindowed sketches, 1h window in 6 buckets, {args.items:,} adds")
+    print(f"top-{args.k}: recall {recall:.0%}, mean count overestimate {count_error:.2%}, "
+          f"{args.items / top_k_seconds:,.0f} adds/s, value() {value_ms:.2f} ms, "
+          f"~{top_k.size_bytes():,} bytes")
+    print(f"distinct: {distinct.value(now):,} estimated vs {len(exact):,} exact, "
+          f"{args.items / distinct_seconds:,.0f} adds/s, {distinct.size_bytes():,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sketch accuracy, throughput and memory")
+    parser.add_argument("--items", type=int, default=1000000, help="Stream length for Count-Min and top-k")
+    parser.add_argument("--distinct", type=int, default=100000, help="Distinct items in those streams")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--precisions", type=int, nargs="+", default=[8, 10, 12, 14])
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=[100, 10000, 1000000])
+    parser.add_argument("--trials", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    bench_hll(args, rng)
+    bench_count_min(args, rng)
+    bench_windowed(args, rng)
+
+
+if __name__ == "__main__":
+    main()
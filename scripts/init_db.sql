@@ -7,7 +7,24 @@ CREATE TABLE IF NOT EXISTS feature_definitions (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Databases created before partitioning have a plain offline_features table.
+-- It's renamed out of the way here and its rows are copied into the
+-- partitioned table further down (see "Unpartitioned history").
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('offline_features')) = 'r' THEN
+        ALTER TABLE offline_features RENAME TO offline_features_unpartitioned;
+        ALTER INDEX IF EXISTS offline_features_pkey RENAME TO offline_features_unpartitioned_pkey;
+        DROP INDEX IF EXISTS idx_offline_features_lookup;
+        DROP INDEX IF EXISTS idx_offline_features_time;
+    END IF;
+END $$;
+
 -- Offline feature storage (for training)
+-- Range partitioned by day on computed_at, so time-bounded reads only touch
+-- the partitions they need and retention is a DROP TABLE per day.
+-- Partitions are created ahead of time and expired by
+--   python -m scripts.maintain_offline_features
 CREATE TABLE IF NOT EXISTS offline_features (
     entity_id VARCHAR(100) NOT NULL,
     entity_type VARCHAR(50) NOT NULL,
@@ -15,13 +32,149 @@ CREATE TABLE IF NOT EXISTS offline_features (
     feature_value TEXT NOT NULL,
     computed_at TIMESTAMP NOT NULL,
     PRIMARY KEY (entity_id, entity_type, feature_name, computed_at)
+) PARTITION BY RANGE (computed_at);
+
+-- The primary key already serves (entity_id, entity_type, feature_name) lookups
+CREATE INDEX IF NOT EXISTS idx_offline_features_time 
+ON offline_features(computed_at);
+
+-- Catches rows outside every daily partition, kept empty in normal operation.
+-- Rows that land here are moved out when their day's partition is created.
+CREATE TABLE IF NOT EXISTS offline_features_default
+PARTITION OF offline_features DEFAULT;
+
+-- Partitions whose history has been downsampled by the compaction job
+CREATE TABLE IF NOT EXISTS offline_feature_compactions (
+    partition_name VARCHAR(63) PRIMARY KEY,
+    interval_seconds INTEGER NOT NULL,
+    rows_before BIGINT NOT NULL,
+    rows_after BIGINT NOT NULL,
+    compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_offline_features_lookup 
-ON offline_features(entity_id, entity_type, feature_name);
+-- Daily partitions offline_features_pYYYYMMDD for [from_day, to_day], returns how many were created.
+-- If maintenance fell behind, rows for days without a partition sit in the default
+-- partition, and a partition can't be created over them. So the range is widened
+-- back to the oldest such row, and those days' partitions are filled from the
+-- default partition before being attached.
+CREATE OR REPLACE FUNCTION create_offline_feature_partitions(from_day DATE, to_day DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    day DATE := LEAST(from_day, (SELECT min(computed_at)::date FROM offline_features_default));
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE day <= to_day LOOP
+        partition_name := 'offline_features_p' || to_char(day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM offline_features_default
+                       WHERE computed_at >= day::timestamp AND computed_at < (day + 1)::timestamp) THEN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE offline_features INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    partition_name);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM offline_features_default '
+                    || 'WHERE computed_at >= %L AND computed_at < %L RETURNING *) '
+                    || 'INSERT INTO %I SELECT * FROM moved',
+                    day::timestamp, (day + 1)::timestamp, partition_name);
+                EXECUTE format(
+                    'ALTER TABLE offline_features ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, day::timestamp, (day + 1)::timestamp);
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF offline_features FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, day::timestamp, (day + 1)::timestamp);
+            END IF;
+            created := created + 1;
+        END IF;
+        day := day + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
 
-CREATE INDEX idx_offline_features_time 
-ON offline_features(computed_at);
+-- Drop daily partitions that end on or before before_day, returns their names
+CREATE OR REPLACE FUNCTION drop_offline_feature_partitions(before_day DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part TEXT;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'offline_features'::regclass
+          AND c.relname ~ '^offline_features_p[0-9]{8}$'
+          AND to_date(substring(c.relname from 19), 'YYYYMMDD') < before_day
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('DROP TABLE %I', part);
+        DELETE FROM offline_feature_compactions WHERE partition_name = part;
+        RETURN NEXT part;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_offline_feature_partitions(CURRENT_DATE - 7, CURRENT_DATE + 7);
+
+-- Unpartitioned history: partitions for its whole range, then one copy. Run
+-- python -m scripts.rebuild_latest_features afterwards, the copy bypasses the
+-- latest_features trigger. Days past retention go on the next maintenance pass.
+DO $$
+DECLARE
+    first_day DATE;
+    last_day DATE;
+BEGIN
+    IF to_regclass('offline_features_unpartitioned') IS NOT NULL THEN
+        SELECT min(computed_at)::date, max(computed_at)::date INTO first_day, last_day
+        FROM offline_features_unpartitioned;
+        IF first_day IS NOT NULL THEN
+            PERFORM create_offline_feature_partitions(first_day, last_day);
+        END IF;
+        INSERT INTO offline_features (entity_id, entity_type, feature_name, feature_value, computed_at)
+        SELECT entity_id, entity_type, feature_name, feature_value, computed_at
+        FROM offline_features_unpartitioned;
+        DROP TABLE offline_features_unpartitioned;
+    END IF;
+END $$;
+
+-- Latest value of every (entity, feature), maintained from offline_features
+-- so latest-value reads are primary-key lookups instead of history scans.
+-- This section can be applied on its own to an existing database, then
+-- backfilled with: python -m scripts.rebuild_latest_features
+CREATE TABLE IF NOT EXISTS latest_features (
+    entity_type VARCHAR(50) NOT NULL,
+    entity_id VARCHAR(100) NOT NULL,
+    feature_name VARCHAR(255) NOT NULL,
+    feature_value TEXT NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (entity_type, entity_id, feature_name)
+);
+
+-- One upsert per INSERT/COPY statement, so every write path (prepared
+-- INSERT, multi-row INSERT, COPY) keeps the table current in the same
+-- transaction. Out-of-order writes never replace a newer value.
+CREATE OR REPLACE FUNCTION upsert_latest_features() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO latest_features
+        (entity_type, entity_id, feature_name, feature_value, computed_at)
+    SELECT DISTINCT ON (entity_type, entity_id, feature_name)
+        entity_type, entity_id, feature_name, feature_value, computed_at
+    FROM new_rows
+    ORDER BY entity_type, entity_id, feature_name, computed_at DESC
+    ON CONFLICT (entity_type, entity_id, feature_name) DO UPDATE
+        SET feature_value = EXCLUDED.feature_value,
+            computed_at = EXCLUDED.computed_at
+        WHERE latest_features.computed_at <= EXCLUDED.computed_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS offline_features_latest ON offline_features;
+CREATE TRIGGER offline_features_latest
+AFTER INSERT ON offline_features
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION upsert_latest_features();
 
 -- Consistency check results
 CREATE TABLE IF NOT EXISTS consistency_checks (
@@ -0,0 +1,129 @@
+"""
+Open-loop load test for the Python feature API (src.serving.api)
+Sends POST /api/v1/features (or /features/batch with --batch N entities per
+request) at a fixed target rate over keep-alive connections, and reports
+achieved rate and p50/p90/p99/max latency. Latency is measured from when a
+request was due, so queueing behind a slow server counts (no coordinated
+omission).
+
+    python -m src.serving.api &
+    python -m scripts.load_test_serving --qps 2000 --duration 30 --users 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List, Optional
+import numpy as np
+from src.common.features import USER_FEATURES
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client, one request at a time"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post(self, path: str, body: bytes) -> int:
+        """Send a JSON POST and read the whole response, returns the status code"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        status = int((await self.reader.readline()).split()[1])
+
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def make_body(rng: random.Random, users: int, batch: int, features: List[str]) -> bytes:
+    if not batch:
+        return json.dumps({"entity_id": f"user_{rng.randrange(users)}", "entity_type": "user",
+                           "features": features}).encode()
+    return json.dumps({"requests": [{"entity_id": f"user_{rng.randrange(users)}", "entity_type": "user",
+                                     "features": features} for _ in range(batch)]}).encode()
+
+
+async def run(args) -> None:
+    path = "/api/v1/features/batch" if args.batch else "/api/v1/features"
+    features = list(USER_FEATURES)
+    rng = random.Random(42)
+
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.connections):
+        pool.put_nowait(Connection(args.host, args.port))
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def send(due: float, body: bytes):
+        nonlocal errors
+        connection = await pool.get()
+        try:
+            status = await connection.post(path, body)
+            if status != 200:
+                errors += 1
+        except Exception:
+            errors += 1
+            connection.close()
+        finally:
+            pool.put_nowait(connection)
+        latencies.append(time.perf_counter() - due)
+
+    interval = 1.0 / args.qps
+    total = int(args.qps * args.duration)
+    tasks = []
+    start = time.perf_counter()
+    for i in range(total):
+        due = start + i * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(due, make_body(rng, args.users, args.batch, features))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    while not pool.empty():
+        pool.get_nowait().close()
+
+    ms = np.array(latencies) * 1000
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:,.0f}/s, target {args.qps:,.0f}/s), "
+          f"{errors} errors, {args.connections} connections, batch {args.batch or 'off'}")
+    print(f"latency ms  p50 {np.percentile(ms, 50):.2f}  p90 {np.percentile(ms, 90):.2f}  "
+          f"p99 {np.percentile(ms, 99):.2f}  max {ms.max():.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the feature API at a target rate")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--qps", type=float, default=1000.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--users", type=int, default=100000, help="Entity ids are drawn from user_0..user_N")
+    parser.add_argument("--batch", type=int, default=0, help="Entities per /features/batch request, 0 for single")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Partition upkeep for offline_features: create upcoming daily partitions,
+drop expired ones and compact old history (see src.storage.offline_maintenance)
+
+    python -m scripts.maintain_offline_features --once
+"""
+import argparse
+from src.common.config import Config
+from src.storage.postgres_client import PostgresClient
+from src.storage.offline_maintenance import OfflineFeatureMaintenance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain offline_features partitions")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    config = Config().offline
+    postgres = PostgresClient()
+    maintenance = OfflineFeatureMaintenance(
+        postgres,
+        days_ahead=config.partition_days_ahead,
+        retention_days=config.retention_days,
+        compact_after_days=config.compact_after_days,
+        compaction_interval_seconds=config.compaction_interval_seconds
+    )
+
+    try:
+        if args.once:
+            maintenance.run_once()
+        else:
+            maintenance.run(config.maintenance_interval_seconds)
+    finally:
+        postgres.close()
+
+
+if __name__ == "__main__":
+    main()
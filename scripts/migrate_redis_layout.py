@@ -0,0 +1,136 @@
+"""
+Copy online features between the Redis key layouts (src.storage.key_layout)
+--to hash reads every feature:{name}:{entity_id} key and writes it into the
+entity's hash, --to string goes back. Remaining TTLs carry over. Values
+already in the target layout are kept, so switch writers to the target
+layout (redis.key_layout) first, run this, then switch readers: Python
+readers with the same setting, the Go feature-api with REDIS__KEY_LAYOUT
+(and REDIS__EXPIRY_BUCKET_SECONDS). Source keys are kept unless --delete is
+given, only pass it once every reader is on the target layout.
+
+    python -m scripts.migrate_redis_layout --to hash --delete
+"""
+import argparse
+import time
+from typing import Dict, Iterator, List, Tuple
+from src.common.features import ENTITY_FEATURES, ENTITY_HASH_PREFIXES, FeatureDefinition
+from src.storage.key_layout import FeatureUpdateWithTTL, HashKeyLayout, StringKeyLayout
+from src.storage.redis_client import RedisClient
+
+FEATURES: Dict[str, FeatureDefinition] = {name: feature_def for features in ENTITY_FEATURES.values()
+                                          for name, feature_def in features.items()}
+
+
+def scan_batches(redis: RedisClient, pattern: str, batch_size: int) -> Iterator[List[str]]:
+    """Keys matching pattern, batch_size at a time (SCAN, so Redis keeps serving)"""
+    batch = []
+    for key in redis.client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_string_keys(redis: RedisClient, keys: List[str], now: float) -> List[Tuple[str, FeatureUpdateWithTTL]]:
+    """(source key, update) for each feature:{name}:{entity_id} key of a known feature"""
+    parsed = []
+    for key in keys:
+        name, _, entity_id = key[len("feature:"):].partition(":")
+        # :buckets hashes and :hll: buckets are server-side state, not feature values
+        if name in FEATURES and entity_id and not entity_id.endswith(":buckets") and ":hll:" not in entity_id:
+            parsed.append((key, FEATURES[name], entity_id))
+
+    pipeline = redis.client.pipeline(transaction=False)
+    for key, _, _ in parsed:
+        pipeline.get(key)
+        pipeline.ttl(key)
+    results = pipeline.execute(raise_on_error=False)
+
+    updates = []
+    for (key, feature_def, entity_id), value, ttl in zip(parsed, results[::2], results[1::2]):
+        if value is None or isinstance(value, Exception) or isinstance(ttl, Exception) or ttl == -2:
+            continue
+        # Keys without expiry take the feature's TTL, the hash layout needs one
+        updates.append((key, (feature_def, entity_id, value, ttl if ttl > 0 else feature_def.ttl_seconds or 0)))
+    return updates
+
+
+def read_hash_keys(redis: RedisClient, layout: HashKeyLayout, keys: List[str],
+                   now: float) -> List[Tuple[str, FeatureUpdateWithTTL]]:
+    """(source key, update) for each live field of each h:{prefix}:{entity_id} hash"""
+    entity_keys = {prefix: entity_key for entity_key, prefix in ENTITY_HASH_PREFIXES.items()}
+    codes = {(feature_def.entity_key, feature_def.field_code): feature_def for feature_def in FEATURES.values()}
+
+    pipeline = redis.client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.hgetall(key)
+
+    updates = []
+    for key, fields in zip(keys, pipeline.execute(raise_on_error=False)):
+        prefix, _, entity_id = key[len("h:"):].partition(":")
+        if prefix not in entity_keys or not isinstance(fields, dict):
+            continue
+        for code, raw in fields.items():
+            feature_def = codes.get((entity_keys[prefix], code))
+            if feature_def is None:
+                continue
+            value, ttl = layout.decode_field(raw, now)
+            if value is not None:
+                updates.append((key, (feature_def, entity_id, value, ttl)))
+    return updates
+
+
+def migrate(redis: RedisClient, hash_layout: HashKeyLayout, to: str,
+            batch_size: int, delete: bool) -> Dict[str, int]:
+    """Copy every known feature into the target layout, returns counters"""
+    target = hash_layout if to == "hash" else StringKeyLayout()
+    pattern = "feature:*" if to == "hash" else "h:*"
+    stats = {'keys_scanned': 0, 'values_copied': 0, 'keys_deleted': 0}
+
+    for keys in scan_batches(redis, pattern, batch_size):
+        now = time.time()
+        if to == "hash":
+            updates = read_string_keys(redis, keys, now)
+        else:
+            updates = read_hash_keys(redis, hash_layout, keys, now)
+
+        pipeline = redis.client.pipeline(transaction=False)
+        target.queue_set_with_ttl(pipeline, [update for _, update in updates], now, if_missing=True)
+        if delete:
+            migrated = sorted({key for key, _ in updates})
+            if migrated:
+                pipeline.unlink(*migrated)
+            stats['keys_deleted'] += len(migrated)
+        pipeline.execute()
+
+        stats['keys_scanned'] += len(keys)
+        stats['values_copied'] += len(updates)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy online features between Redis key layouts")
+    parser.add_argument("--to", choices=["hash", "string"], required=True, help="Target layout")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Keys per SCAN batch and pipeline")
+    parser.add_argument("--delete", action="store_true", help="Remove source keys once copied, once every reader uses the target layout")
+    parser.add_argument("--expiry-bucket-seconds", type=int, default=60,
+                        help="Must match redis.expiry_bucket_seconds")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    args = parser.parse_args()
+
+    redis = RedisClient(args.host, args.port, args.db)
+    try:
+        start = time.perf_counter()
+        stats = migrate(redis, HashKeyLayout(args.expiry_bucket_seconds), args.to, args.batch_size, args.delete)
+        print(f"Scanned {stats['keys_scanned']} keys, copied {stats['values_copied']} values, "
+              f"deleted {stats['keys_deleted']} keys in {time.perf_counter() - start:.1f}s")
+    finally:
+        redis.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Rebuild the latest_features table from offline_features history
+Needed once after adding latest_features to an existing database, or to
+repair it after history was loaded with triggers disabled
+
+    python -m scripts.rebuild_latest_features --entity-type user
+"""
+import argparse
+import time
+from src.storage.postgres_client import PostgresClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild latest_features from offline_features")
+    parser.add_argument("--entity-type", default=None, help="Only rebuild this entity type (default: all)")
+    args = parser.parse_args()
+
+    postgres = PostgresClient()
+    try:
+        start = time.perf_counter()
+        rows = postgres.rebuild_latest_features(args.entity_type)
+        print(f"Rebuilt {rows} latest values in {time.perf_counter() - start:.1f}s")
+    finally:
+        postgres.close()
+
+
+if __name__ == "__main__":
+    main()
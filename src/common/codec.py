@@ -0,0 +1,406 @@
+import json
+import struct
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from src.common.events import EventType, BaseEvent, UserEvent, ContentEvent
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the stdlib json module is the fallback
+    orjson = None
+
+# Small integer codes for event types, used instead of enum/string compares in hot loops.
+# Codes are part of the event contract: append new types, never renumber.
+UNKNOWN_EVENT_TYPE = 0
+EVENT_TYPE_CODES: Dict[str, int] = {
+    EventType.USER_VIEW.value: 1,
+    EventType.USER_CLICK.value: 2,
+    EventType.USER_UPVOTE.value: 3,
+    EventType.USER_DOWNVOTE.value: 4,
+    EventType.USER_COMMENT.value: 5,
+    EventType.POST_CREATED.value: 6,
+    EventType.POST_EDITED.value: 7,
+    EventType.POST_DELETED.value: 8,
+}
+EVENT_TYPES_BY_CODE: Dict[int, EventType] = {code: EventType(value) for value, code in EVENT_TYPE_CODES.items()}
+EVENT_TYPE_NAMES_BY_CODE: Dict[int, str] = {code: value for value, code in EVENT_TYPE_CODES.items()}
+
+USER_VIEW = EVENT_TYPE_CODES[EventType.USER_VIEW.value]
+USER_CLICK = EVENT_TYPE_CODES[EventType.USER_CLICK.value]
+USER_UPVOTE = EVENT_TYPE_CODES[EventType.USER_UPVOTE.value]
+USER_DOWNVOTE = EVENT_TYPE_CODES[EventType.USER_DOWNVOTE.value]
+USER_COMMENT = EVENT_TYPE_CODES[EventType.USER_COMMENT.value]
+POST_CREATED = EVENT_TYPE_CODES[EventType.POST_CREATED.value]
+POST_EDITED = EVENT_TYPE_CODES[EventType.POST_EDITED.value]
+POST_DELETED = EVENT_TYPE_CODES[EventType.POST_DELETED.value]
+
+# Interned codes for low-cardinality string fields in the binary format,
+# 0 means "not interned", the string itself follows in the payload
+DEVICE_TYPE_CODES: Dict[str, int] = {"mobile": 1, "desktop": 2, "tablet": 3}
+CONTENT_TYPE_CODES: Dict[str, int] = {"text": 1, "link": 2, "image": 3, "video": 4}
+DEVICE_TYPES_BY_CODE = {code: value for value, code in DEVICE_TYPE_CODES.items()}
+CONTENT_TYPES_BY_CODE = {code: value for value, code in CONTENT_TYPE_CODES.items()}
+
+# Kafka message header naming the payload encoding, JSON when absent
+ENCODING_HEADER = "encoding"
+ENCODING_JSON = b"json"
+ENCODING_BINARY = b"binary/1"
+ENCODINGS = {"json": ENCODING_JSON, "binary": ENCODING_BINARY}
+
+# Binary format v1, little endian:
+#   head     version u8, event type u8, flags u8, device/content type code u8,
+#            timestamp i64 (epoch micros), event_id 16 bytes (UUID),
+#            duration_seconds f64 (user) or word_count u32 (content)
+#   strings  u16 length of each string, then the utf-8 bytes back to back,
+#            length 0xFFFF encodes None
+#            user:    user_id, post_id, subreddit, session_id[, device_type]
+#            content: post_id, author_id, subreddit, title[, content_type]
+BINARY_VERSION = 1
+FLAG_HAS_OPTIONAL = 0x01  # duration_seconds / word_count is set
+_USER_HEAD = struct.Struct("<BBBBq16sd")
+_CONTENT_HEAD = struct.Struct("<BBBBq16sI")
+_STR_LENS = {count: struct.Struct(f"<{count}H") for count in (4, 5)}
+_NONE_LEN = 0xFFFF
+
+
+class UserEventRecord(NamedTuple):
+    """Decoded user event, event_type is a code and timestamp is epoch seconds"""
+    event_id: Optional[str]
+    event_type: int
+    timestamp: float
+    user_id: Optional[str]
+    post_id: Optional[str]
+    subreddit: Optional[str]
+    session_id: Optional[str]
+    device_type: Optional[str]
+    duration_seconds: Optional[float]
+
+
+class ContentEventRecord(NamedTuple):
+    """Decoded content event, event_type is a code and timestamp is epoch seconds"""
+    event_id: Optional[str]
+    event_type: int
+    timestamp: float
+    post_id: Optional[str]
+    author_id: Optional[str]
+    subreddit: Optional[str]
+    title: Optional[str]
+    content_type: Optional[str]
+    word_count: Optional[int]
+
+
+def _json_default(value: Any) -> Any:
+    """Fallback encoder for types the json module doesn't know"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to JSON bytes (orjson)"""
+        return orjson.dumps(obj, default=_json_default)
+
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to JSON bytes (stdlib json)"""
+        return json.dumps(obj, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+    loads = json.loads
+
+
+def encode_event(event: BaseEvent, encoding: bytes = ENCODING_JSON) -> bytes:
+    """Serialize an event in the given encoding"""
+    if encoding == ENCODING_BINARY:
+        return encode_event_binary(event)
+    return encode_event_json(event)
+
+
+def encode_event_json(event: BaseEvent) -> bytes:
+    """
+    Serialize an event to JSON bytes
+    Same fields as json.dumps(event.model_dump(), default=str) with ISO-8601
+    timestamps, but skips the model_dump copy by serializing the field dict directly
+    """
+    return dumps(event.__dict__)
+
+
+def encode_event_binary(event: BaseEvent) -> bytes:
+    """
+    Serialize an event in binary format v1
+    Raises ValueError if the event can't be represented (e.g. a non-UUID event_id)
+    """
+    event_type = EVENT_TYPE_CODES[event.event_type.value]
+    timestamp = event.timestamp.timestamp()
+
+    if isinstance(event, UserEvent):
+        return _pack_user_event(event.event_id, event_type, timestamp, event.user_id, event.post_id,
+                                event.subreddit, event.session_id, event.device_type, event.duration_seconds)
+    elif isinstance(event, ContentEvent):
+        return _pack_content_event(event.event_id, event_type, timestamp, event.post_id, event.author_id,
+                                   event.subreddit, event.title, event.content_type, event.word_count)
+    raise ValueError(f"Unsupported event class {type(event).__name__}")
+
+
+def encode_record(record: Union[UserEventRecord, ContentEventRecord], encoding: bytes = ENCODING_JSON) -> bytes:
+    """
+    Serialize a decoded record in the given encoding, without a pydantic model
+    Used by bulk generators that build records straight from column arrays
+    """
+    if encoding == ENCODING_BINARY:
+        if isinstance(record, UserEventRecord):
+            return _pack_user_event(*record)
+        return _pack_content_event(*record)
+
+    doc = record._asdict()
+    doc['event_type'] = EVENT_TYPE_NAMES_BY_CODE[record.event_type]
+    doc['timestamp'] = _isoformat(record.timestamp)
+    return dumps(doc)
+
+
+def encode_records(record_type: type, columns: Sequence[Sequence[Any]],
+                   encoding: bytes = ENCODING_JSON) -> List[bytes]:
+    """
+    Serialize events given as columns, one sequence per record_type field in field order
+    Same payloads as encode_record per row, with per-column conversions done once
+    """
+    if encoding == ENCODING_BINARY:
+        if record_type is UserEventRecord:
+            return _pack_columns(_USER_HEAD, DEVICE_TYPE_CODES, columns)
+        return _pack_columns(_CONTENT_HEAD, CONTENT_TYPE_CODES, columns)
+
+    columns = list(columns)
+    event_type_names = EVENT_TYPE_NAMES_BY_CODE
+    columns[1] = [event_type_names[code] for code in columns[1]]
+    columns[2] = [_isoformat(timestamp) for timestamp in columns[2]]
+
+    fields = record_type._fields
+    return [dumps(dict(zip(fields, row))) for row in zip(*columns)]
+
+
+@lru_cache(maxsize=1024)
+def _isoformat(timestamp: float) -> str:
+    """UTC ISO-8601 string for epoch seconds, cached since bulk records share timestamps"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def _pack_user_event(event_id: str, event_type: int, timestamp: float, user_id: Optional[str],
+                     post_id: Optional[str], subreddit: Optional[str], session_id: Optional[str],
+                     device_type: Optional[str], duration_seconds: Optional[float]) -> bytes:
+    """Binary v1 user event, arguments in UserEventRecord order"""
+    code = DEVICE_TYPE_CODES.get(device_type, 0)
+    head = _USER_HEAD.pack(BINARY_VERSION, event_type, FLAG_HAS_OPTIONAL if duration_seconds is not None else 0,
+                           code, round(timestamp * 1_000_000), _uuid_bytes(event_id), duration_seconds or 0.0)
+    if code:
+        return head + _pack_strings((user_id, post_id, subreddit, session_id))
+    return head + _pack_strings((user_id, post_id, subreddit, session_id, device_type))
+
+
+def _pack_content_event(event_id: str, event_type: int, timestamp: float, post_id: Optional[str],
+                        author_id: Optional[str], subreddit: Optional[str], title: Optional[str],
+                        content_type: Optional[str], word_count: Optional[int]) -> bytes:
+    """Binary v1 content event, arguments in ContentEventRecord order"""
+    code = CONTENT_TYPE_CODES.get(content_type, 0)
+    head = _CONTENT_HEAD.pack(BINARY_VERSION, event_type, FLAG_HAS_OPTIONAL if word_count is not None else 0,
+                              code, round(timestamp * 1_000_000), _uuid_bytes(event_id), word_count or 0)
+    if code:
+        return head + _pack_strings((post_id, author_id, subreddit, title))
+    return head + _pack_strings((post_id, author_id, subreddit, title, content_type))
+
+
+def _pack_columns(head: struct.Struct, type_codes: Dict[str, int],
+                  columns: Sequence[Sequence[Any]]) -> List[bytes]:
+    """
+    Binary v1 payloads for columns in record field order
+    Both record types share the layout: id, type, timestamp, four strings,
+    the interned type string and the optional number
+    """
+    event_ids = [_uuid_bytes(value) for value in columns[0]]
+    timestamps = [round(timestamp * 1_000_000) for timestamp in columns[2]]
+    codes = [type_codes.get(value, 0) for value in columns[7]]
+
+    # Strings are encoded a column at a time
+    raws = []
+    lengths = []
+    for column in columns[3:8]:
+        column_raws = [b"" if value is None else value.encode('utf-8') for value in column]
+        column_lengths = [len(raw) for raw in column_raws]
+        if column_lengths and max(column_lengths) >= _NONE_LEN:
+            raise ValueError(f"String field too long for binary format ({max(column_lengths)} bytes)")
+        if None in column:
+            column_lengths = [_NONE_LEN if value is None else length
+                              for value, length in zip(column, column_lengths)]
+        raws.append(column_raws)
+        lengths.append(column_lengths)
+
+    pack_head = head.pack
+    pack_lengths4 = _STR_LENS[4].pack
+    pack_lengths5 = _STR_LENS[5].pack
+
+    payloads = []
+    for event_id, event_type, timestamp, optional, code, r1, r2, r3, r4, r5, l1, l2, l3, l4, l5 in zip(
+            event_ids, columns[1], timestamps, columns[8], codes, *raws, *lengths):
+        flags = FLAG_HAS_OPTIONAL if optional is not None else 0
+        fixed = pack_head(BINARY_VERSION, event_type, flags, code, timestamp, event_id, optional or 0)
+        if code:
+            payloads.append(b"".join((fixed, pack_lengths4(l1, l2, l3, l4), r1, r2, r3, r4)))
+        else:
+            payloads.append(b"".join((fixed, pack_lengths5(l1, l2, l3, l4, l5), r1, r2, r3, r4, r5)))
+    return payloads
+
+
+def _uuid_bytes(value: str) -> bytes:
+    """16 raw bytes of a canonical (lowercase, hyphenated) UUID string"""
+    if len(value) != 36 or value[8] != '-' or value[13] != '-' or value[18] != '-' \
+            or value[23] != '-' or value != value.lower():
+        raise ValueError(f"event_id {value!r} is not a canonical UUID")
+    return bytes.fromhex(value.replace('-', ''))
+
+
+def _uuid_str(raw: bytes) -> str:
+    """Canonical UUID string, same as str(uuid.UUID(bytes=raw)) but cheaper"""
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _pack_strings(values: Sequence[Optional[str]]) -> bytes:
+    """All string lengths as one u16 block, then the utf-8 bytes back to back"""
+    raws = [b"" if value is None else value.encode('utf-8') for value in values]
+    lengths = [len(raw) for raw in raws]
+    if max(lengths) >= _NONE_LEN:
+        raise ValueError(f"String field too long for binary format ({max(lengths)} bytes)")
+
+    if None in values:
+        lengths = [_NONE_LEN if value is None else length for value, length in zip(values, lengths)]
+    return _STR_LENS[len(values)].pack(*lengths) + b"".join(raws)
+
+
+def _unpack_strings(data: bytes, offset: int, count: int) -> List[Optional[str]]:
+    """Read a block written by _pack_strings starting at offset"""
+    lengths_struct = _STR_LENS[count]
+    values: List[Optional[str]] = []
+    pos = offset + lengths_struct.size
+    for length in lengths_struct.unpack_from(data, offset):
+        if length == _NONE_LEN:
+            values.append(None)
+            continue
+        values.append(data[pos:pos + length].decode('utf-8'))
+        pos += length
+    return values
+
+
+def message_encoding(headers: Optional[List[Tuple[str, bytes]]]) -> bytes:
+    """Payload encoding from Kafka message headers, JSON when not set"""
+    if headers:
+        for key, value in headers:
+            if key == ENCODING_HEADER:
+                return value
+    return ENCODING_JSON
+
+
+def parse_timestamp(value: Any) -> float:
+    """ISO-8601 timestamp as epoch seconds, falling back to now"""
+    if value:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time.time()
+
+
+def decode_user_event(data: Union[bytes, str], encoding: bytes = ENCODING_JSON) -> UserEventRecord:
+    """Decode a user event without building a pydantic model"""
+    if encoding == ENCODING_BINARY:
+        return _decode_user_event_binary(data)  # type: ignore[arg-type]
+    if encoding != ENCODING_JSON:
+        raise ValueError(f"Unknown event encoding {encoding!r}")
+
+    doc = loads(data)
+    get = doc.get
+    return UserEventRecord(
+        get('event_id'),
+        EVENT_TYPE_CODES.get(get('event_type'), UNKNOWN_EVENT_TYPE),
+        parse_timestamp(get('timestamp')),
+        get('user_id'),
+        get('post_id'),
+        get('subreddit'),
+        get('session_id'),
+        get('device_type'),
+        get('duration_seconds'),
+    )
+
+
+def decode_content_event(data: Union[bytes, str], encoding: bytes = ENCODING_JSON) -> ContentEventRecord:
+    """Decode a content event without building a pydantic model"""
+    if encoding == ENCODING_BINARY:
+        return _decode_content_event_binary(data)  # type: ignore[arg-type]
+    if encoding != ENCODING_JSON:
+        raise ValueError(f"Unknown event encoding {encoding!r}")
+
+    doc = loads(data)
+    get = doc.get
+    return ContentEventRecord(
+        get('event_id'),
+        EVENT_TYPE_CODES.get(get('event_type'), UNKNOWN_EVENT_TYPE),
+        parse_timestamp(get('timestamp')),
+        get('post_id'),
+        get('author_id'),
+        get('subreddit'),
+        get('title'),
+        get('content_type'),
+        get('word_count'),
+    )
+
+
+def _decode_user_event_binary(data: bytes) -> UserEventRecord:
+    """Decode a binary v1 user event"""
+    if data[0] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary event version {data[0]}")
+
+    _, event_type, flags, code, timestamp, event_id, duration = _USER_HEAD.unpack_from(data)
+    strings = _unpack_strings(data, _USER_HEAD.size, 4 if code else 5)
+    return UserEventRecord(
+        _uuid_str(event_id),
+        event_type,
+        timestamp / 1_000_000,
+        strings[0],
+        strings[1],
+        strings[2],
+        strings[3],
+        DEVICE_TYPES_BY_CODE[code] if code else strings[4],
+        duration if flags & FLAG_HAS_OPTIONAL else None,
+    )
+
+
+def _decode_content_event_binary(data: bytes) -> ContentEventRecord:
+    """Decode a binary v1 content event"""
+    if data[0] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary event version {data[0]}")
+
+    _, event_type, flags, code, timestamp, event_id, word_count = _CONTENT_HEAD.unpack_from(data)
+    strings = _unpack_strings(data, _CONTENT_HEAD.size, 4 if code else 5)
+    return ContentEventRecord(
+        _uuid_str(event_id),
+        event_type,
+        timestamp / 1_000_000,
+        strings[0],
+        strings[1],
+        strings[2],
+        strings[3],
+        CONTENT_TYPES_BY_CODE[code] if code else strings[4],
+        word_count if flags & FLAG_HAS_OPTIONAL else None,
+    )
+
+
+def to_model(record: Union[UserEventRecord, ContentEventRecord]) -> BaseEvent:
+    """Validated pydantic event for a decoded record (slow path, e.g. for tooling)"""
+    fields = {name: value for name, value in record._asdict().items() if value is not None}
+    fields['event_type'] = EVENT_TYPES_BY_CODE[record.event_type]
+    fields['timestamp'] = datetime.fromtimestamp(record.timestamp, timezone.utc)
+    if isinstance(record, UserEventRecord):
+        return UserEvent(**fields)
+    return ContentEvent(**fields)
@@ -6,16 +6,130 @@ class KafkaConfig(BaseSettings):
     bootstrap_servers: str = "localhost:19092"
     user_events_topic: str = "user-events"
     content_events_topic: str = "content-events"
+    wire_format: str = "json"  # Producer payload encoding: json or binary (see src.common.codec)
+
+class ProducerConfig(BaseSettings):
+    # librdkafka batching (src.ingestion.kafka_producer), passed to EventProducer as kwargs
+    linger_ms: int = 10  # How long a partition batch waits to fill before it's sent
+    batch_size: int = 16384  # Max bytes per partition batch
+    batch_num_messages: int = 10000  # Max messages per partition batch
+    compression_type: str = "snappy"
+    acks: str = "all"
+    queue_buffering_max_messages: int = 100000  # librdkafka local queue, BufferError beyond this
+    queue_buffering_max_kbytes: int = 1048576
+
+    # Backpressure: produce blocks while this many messages await delivery reports
+    max_in_flight: int = 100000
+    backpressure_timeout_seconds: float = 30.0  # Then the message is dropped and counted
+    poll_interval_ms: int = 100  # Background delivery report poll timeout
 
 class GeneratorConfig(BaseSettings):
     num_users: int = 1000
     num_posts: int = 5000
     events_per_second: int = 100
     user_event_ratio: float = 0.9
+    zipf_skew: float = 0.0  # Batch mode popularity skew, 0 is uniform, ~1 concentrates on hot users/posts
+
+class LoadConfig(BaseSettings):
+    # Open-loop load driver (src.ingestion.load_driver)
+    target_rate: int = 50000  # Events per second across all processes
+    num_processes: int = 4
+    duration_seconds: int = 60
+    batch_size: int = 1000  # Events generated and enqueued per token grab
+    report_interval_seconds: float = 5.0
+
+class StreamConfig(BaseSettings):
+    # Defaults are one per-message consumer writing offline rows inline. Scale up
+    # through the environment, e.g. STREAM__BATCH_SIZE=500 STREAM__NUM_WORKERS=4
+    # STREAM__OFFLINE_WRITER_ENABLED=true
+    group_id: str = "feature-store-stream-processor"
+    batch_size: int = 1     # Max messages per consume() call, 1 is per-message processing
+    linger_ms: int = 100    # Max time to wait for a batch to fill
+    max_cached_users: int = 100000  # Bound on in-process per-user state (LRU)
+    server_side_state: bool = False  # Keep counters in Redis, updated by Lua script
+
+    # Multi-process runner (src.streaming.supervisor)
+    num_workers: int = 1
+    pin_cpus: bool = False
+
+    # asyncio runner (src.streaming.async_stream_consumer)
+    async_concurrency: int = 8  # Shards processed concurrently, ordered per user
+
+    # Background offline writer (bulk COPY into offline_features)
+    offline_writer_enabled: bool = False  # Off writes offline rows inline
+    offline_queue_size: int = 100000
+    offline_flush_rows: int = 5000
+    offline_flush_interval_ms: int = 1000
+
+    # Reservoir sample of updated users for the consistency checker, 0 disables it
+    update_sample_size: int = 1000  # Per activity stratum per interval and process
+    update_sample_interval_seconds: float = 60.0
+    update_sample_feature: str = "user_engagement_score"  # User feature whose value picks the stratum
+
+    # Per-post features (src.streaming.content_feature_processor). Events are keyed by
+    # user_id, so these need a single consumer: the supervisor refuses them with num_workers > 1
+    content_features_enabled: bool = False
+    content_state_mb: int = 256  # Post state held in process, the rest spills to Redis
+
+    # Per-subreddit features, e.g. trending posts (src.streaming.subreddit_feature_processor),
+    # single consumer only like post features
+    subreddit_features_enabled: bool = False
+    subreddit_state_mb: int = 64  # Subreddit state held in process, the rest spills to Redis
+
+class RedisConfig(BaseSettings):
+    # Online store key layout (src.storage.key_layout): "string" is a key per
+    # feature, "hash" a hash per entity (smaller, but needs server_side_state off).
+    # The Go feature-api reads REDIS__KEY_LAYOUT and REDIS__EXPIRY_BUCKET_SECONDS too
+    key_layout: str = "string"
+    expiry_bucket_seconds: int = 60  # Granularity of per-field expiry in the hash layout
+
+    # In-process read-through cache for Python readers (src.storage.feature_cache), 0 disables
+    local_cache_entries: int = 0
+    local_cache_max_staleness_seconds: float = 5.0  # Capped by each feature's ttl_seconds
+
+class OfflineConfig(BaseSettings):
+    # offline_features partition upkeep (src.storage.offline_maintenance)
+    partition_days_ahead: int = 7  # Daily partitions created ahead of time
+    retention_days: int = 90  # Older partitions are dropped
+    compact_after_days: int = 7  # Older partitions are downsampled, 0 disables
+    compaction_interval_seconds: int = 3600  # One value per entity, feature and interval
+    maintenance_interval_seconds: float = 3600.0
+
+class ServingConfig(BaseSettings):
+    # Python feature API (src.serving.api)
+    host: str = "0.0.0.0"
+    port: int = 8001
+    max_batch_keys: int = 2000  # Lookups read in one Redis pipeline
+    max_batch_wait_ms: float = 1.0  # How long the first lookup waits for others to share its pipeline
+    redis_max_connections: int = 50
+    postgres_fallback: bool = True  # Read latest_features for values Redis doesn't have
+
+class ConsistencyConfig(BaseSettings):
+    # Online/offline consistency monitor (src.validation.consistency_checker)
+    interval_seconds: float = 30.0
+    sample_interval_seconds: float = 60.0  # Must match stream.update_sample_interval_seconds
+    batch_size: int = 1000  # Entities per MGET / query / INSERT
+    max_workers: int = 4
+    min_sample_size: int = 10
+    max_sample_size: int = 10000  # Entities per cycle
+    min_per_stratum: int = 10
+    confidence: float = 0.95  # 0.90, 0.95 or 0.99
+
+    # Load budget, the sample shrinks to stay within it
+    redis_keys_per_second: float = 2000.0
+    postgres_rows_per_second: float = 2000.0
+    max_duty_cycle: float = 0.1  # Max fraction of each interval spent checking
 
 class Config(BaseSettings):
     kafka: KafkaConfig = KafkaConfig()
+    producer: ProducerConfig = ProducerConfig()
     generator: GeneratorConfig = GeneratorConfig()
+    load: LoadConfig = LoadConfig()
+    stream: StreamConfig = StreamConfig()
+    redis: RedisConfig = RedisConfig()
+    offline: OfflineConfig = OfflineConfig()
+    consistency: ConsistencyConfig = ConsistencyConfig()
+    serving: ServingConfig = ServingConfig()
 
     class Config:
         env_file = ".env"
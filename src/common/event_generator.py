@@ -1,14 +1,52 @@
 import random
+import time
+import numpy as np
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, NamedTuple, Optional, Tuple
 from faker import Faker
+from src.common import codec
 from src.common.events import UserEvent, ContentEvent, EventType
 
 fake = Faker()
 
+# Event type mixes, shared by the per-event and batch generators
+USER_EVENT_TYPES = [EventType.USER_VIEW, EventType.USER_CLICK, EventType.USER_UPVOTE,
+                    EventType.USER_DOWNVOTE, EventType.USER_COMMENT]
+USER_EVENT_WEIGHTS = [60, 20, 10, 5, 5]
+CONTENT_EVENT_TYPES = [EventType.POST_CREATED, EventType.POST_EDITED, EventType.POST_DELETED]
+CONTENT_EVENT_WEIGHTS = [70, 25, 5]
+
+# Chance an event starts a new session for its user
+NEW_SESSION_PROBABILITY = 0.1
+
+# Positions of the 32 hex digits in a 36-character UUID string
+UUID_HEX_COLUMNS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+class EncodedBatch(NamedTuple):
+    """Pre-encoded events as (key, payload) pairs per topic"""
+    encoding: bytes
+    user_events: List[Tuple[bytes, bytes]]
+    content_events: List[Tuple[bytes, bytes]]
+
+    def __len__(self) -> int:
+        return len(self.user_events) + len(self.content_events)
+
+
+def zipf_cdf(n: int, skew: float) -> np.ndarray:
+    """
+    CDF over ranks 0..n-1 with P(rank k) proportional to 1 / (k + 1) ** skew
+    skew 0 is uniform, ~1 matches typical hot-user/hot-post traffic
+    """
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
 
 class EventGenerator:
-    def __init__(self, num_users: int = 1000, num_posts: int = 5000):
+    def __init__(self, num_users: int = 1000, num_posts: int = 5000, zipf_skew: float = 0.0,
+                 title_pool_size: int = 1000, session_pool_size: int = 10000,
+                 seed: Optional[int] = None):
         self.num_users = num_users
         self.num_posts = num_posts
 
@@ -26,13 +64,45 @@ class EventGenerator:
         # Tracking of "active sessions"
         self.active_sessions = {}
 
+        # Batch mode (generate_encoded_batch) draws whole columns with NumPy.
+        # Users and posts are picked by Zipf rank, so user_0/post_0 are the hottest.
+        self.zipf_skew = zipf_skew
+        self.rng = np.random.default_rng(seed)
+        self._user_cdf = zipf_cdf(num_users, zipf_skew)
+        self._post_cdf = zipf_cdf(num_posts, zipf_skew)
+        self._user_type_codes = [codec.EVENT_TYPE_CODES[t.value] for t in USER_EVENT_TYPES]
+        self._user_type_p = np.array(USER_EVENT_WEIGHTS, dtype=np.float64) / sum(USER_EVENT_WEIGHTS)
+        self._content_type_codes = [codec.EVENT_TYPE_CODES[t.value] for t in CONTENT_EVENT_TYPES]
+        self._content_type_p = np.array(CONTENT_EVENT_WEIGHTS, dtype=np.float64) / sum(CONTENT_EVENT_WEIGHTS)
+
+        # Faker is far too slow per event, titles and session ids come from pools
+        self._titles = [fake.sentence(nb_words=8) for _ in range(title_pool_size)]
+        self._session_ids = self._random_uuids(session_pool_size)
+
+        # Object arrays so a whole column is picked with one fancy-index take
+        self._pools = {name: np.array(values, dtype=object) for name, values in (
+            ('user_ids', self.user_ids),
+            ('post_ids', self.post_ids),
+            ('user_keys', [user_id.encode('utf-8') for user_id in self.user_ids]),
+            ('post_keys', [post_id.encode('utf-8') for post_id in self.post_ids]),
+            ('subreddits', self.subreddits),
+            ('device_types', self.device_types),
+            ('content_types', self.content_types),
+            ('titles', self._titles),
+            ('session_ids', self._session_ids),
+        )}
+
+        # Current session (pool index) and device of every user
+        self._user_sessions = self.rng.integers(0, session_pool_size, num_users)
+        self._user_devices = self.rng.integers(0, len(self.device_types), num_users)
+
     def generate_user_event(self) -> UserEvent:
         """Generate a random user interaction event"""
         user_id = random.choice(self.user_ids)
         post_id = random.choice(self.post_ids)
 
         # Get or create session for this user
-        if user_id not in self.active_sessions or random.random() < 0.1:
+        if user_id not in self.active_sessions or random.random() < NEW_SESSION_PROBABILITY:
             # New session (10% chance or first time)
             self.active_sessions[user_id] = {
                 'session_id': fake.uuid4(),
@@ -42,10 +112,7 @@ class EventGenerator:
         session = self.active_sessions[user_id]
 
         # Weight event types so they're more realistic
-        event_type = random.choices(
-            [EventType.USER_VIEW, EventType.USER_CLICK, EventType.USER_UPVOTE, EventType.USER_DOWNVOTE, EventType.USER_COMMENT],
-            weights=[60, 20, 10, 5, 5]
-        )[0]
+        event_type = random.choices(USER_EVENT_TYPES, weights=USER_EVENT_WEIGHTS)[0]
 
         event = UserEvent(
             event_type=event_type,
@@ -69,9 +136,7 @@ class EventGenerator:
         author_id = random.choice(self.user_ids)
 
         # Weight event types (creation is most common)
-        event_type = random.choices(
-            [EventType.POST_CREATED, EventType.POST_EDITED, EventType.POST_DELETED], weights=[70, 25, 5]
-        )[0]
+        event_type = random.choices(CONTENT_EVENT_TYPES, weights=CONTENT_EVENT_WEIGHTS)[0]
 
         content_type = random.choice(self.content_types)
 
@@ -99,4 +164,99 @@ class EventGenerator:
             else:
                 events.append(self.generate_content_event())
 
-        return events
\ No newline at end of file
+        return events
+
+    def generate_encoded_batch(self, num_events: int, user_ratio: float = 0.9,
+                               encoding: bytes = codec.ENCODING_JSON) -> EncodedBatch:
+        """
+        Generate a batch of mixed events straight to encoded payloads
+        All random draws happen once per batch as NumPy arrays and no pydantic
+        model is built, events in a batch share one timestamp
+        """
+        num_user = int(self.rng.binomial(num_events, user_ratio))
+        now = time.time()
+
+        return EncodedBatch(
+            encoding,
+            self._encoded_user_events(num_user, now, encoding),
+            self._encoded_content_events(num_events - num_user, now, encoding)
+        )
+
+    def _encoded_user_events(self, n: int, timestamp: float, encoding: bytes) -> List[Tuple[bytes, bytes]]:
+        """n user events as (key, payload) pairs"""
+        if n == 0:
+            return []
+
+        rng = self.rng
+        users = self._zipf_sample(self._user_cdf, n)
+        posts = self._zipf_sample(self._post_cdf, n)
+        event_types = rng.choice(self._user_type_codes, size=n, p=self._user_type_p)
+
+        # Start new sessions (and devices) before looking sessions up
+        new_session = users[rng.random(n) < NEW_SESSION_PROBABILITY]
+        self._user_sessions[new_session] = rng.integers(0, len(self._session_ids), len(new_session))
+        self._user_devices[new_session] = rng.integers(0, len(self.device_types), len(new_session))
+
+        # Log-normal view duration (most short, some longer), None for other types
+        durations = np.maximum(1.0, rng.lognormal(2.0, 1.5, n)).astype(object)
+        durations[event_types != codec.USER_VIEW] = None
+
+        payloads = codec.encode_records(codec.UserEventRecord, [
+            self._random_uuids(n),
+            event_types.tolist(),
+            [timestamp] * n,
+            self._pools['user_ids'][users].tolist(),
+            self._pools['post_ids'][posts].tolist(),
+            self._pools['subreddits'][rng.integers(0, len(self.subreddits), n)].tolist(),
+            self._pools['session_ids'][self._user_sessions[users]].tolist(),
+            self._pools['device_types'][self._user_devices[users]].tolist(),
+            durations.tolist(),
+        ], encoding)
+
+        return list(zip(self._pools['user_keys'][users].tolist(), payloads))
+
+    def _encoded_content_events(self, n: int, timestamp: float, encoding: bytes) -> List[Tuple[bytes, bytes]]:
+        """n content events as (key, payload) pairs"""
+        if n == 0:
+            return []
+
+        rng = self.rng
+        posts = self._zipf_sample(self._post_cdf, n)
+        authors = self._zipf_sample(self._user_cdf, n)
+        content_types = rng.integers(0, len(self.content_types), n)
+
+        # Word count only for text posts
+        word_counts = rng.integers(10, 2001, n).astype(object)
+        word_counts[content_types != self.content_types.index("text")] = None
+
+        payloads = codec.encode_records(codec.ContentEventRecord, [
+            self._random_uuids(n),
+            rng.choice(self._content_type_codes, size=n, p=self._content_type_p).tolist(),
+            [timestamp] * n,
+            self._pools['post_ids'][posts].tolist(),
+            self._pools['user_ids'][authors].tolist(),
+            self._pools['subreddits'][rng.integers(0, len(self.subreddits), n)].tolist(),
+            self._pools['titles'][rng.integers(0, len(self._titles), n)].tolist(),
+            self._pools['content_types'][content_types].tolist(),
+            word_counts.tolist(),
+        ], encoding)
+
+        return list(zip(self._pools['post_keys'][posts].tolist(), payloads))
+
+    def _zipf_sample(self, cdf: np.ndarray, n: int) -> np.ndarray:
+        """n ranks drawn from a zipf_cdf"""
+        ranks = np.searchsorted(cdf, self.rng.random(n), side='right')
+        return np.minimum(ranks, len(cdf) - 1)
+
+    def _random_uuids(self, n: int) -> List[str]:
+        """n random (version 4) UUID strings, formatted as one NumPy block"""
+        raw = self.rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+
+        hex_digits = np.frombuffer(raw.tobytes().hex().encode('ascii'), dtype=np.uint8).reshape(n, 32)
+        text = np.full((n, 36), ord('-'), dtype=np.uint8)
+        text[:, UUID_HEX_COLUMNS] = hex_digits
+
+        block = text.tobytes().decode('ascii')
+        return [block[i:i + 36] for i in range(0, 36 * n, 36)]
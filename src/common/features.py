@@ -1,6 +1,7 @@
 from enum import Enum
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional, Tuple
+from src.common.events import EventType
 
 
 class FeatureType(str, Enum):
@@ -9,37 +10,141 @@ class FeatureType(str, Enum):
     BATCH = "batch"                   # Updated daily
     STATIC = "static"                 # Rarely changes
 
+class Aggregation(str, Enum):
+    COUNT = "count"   # Number of source events
+    SUM = "sum"       # Sum of value_field over source events
+    RATIO = "ratio"   # Numerator events / all source events
+    RATE = "rate"     # Source events per rate_seconds, averaged over the window
+    DISTINCT = "distinct" # Distinct values of value_field, estimated (HyperLogLog)
+    TOP_K = "top_k"   # Most frequent values of value_field, [[value, count], ...] (space-saving + Count-Min)
+
+# Hash key prefix per entity_key, for the hash-per-entity Redis layout (src.storage.key_layout)
+ENTITY_HASH_PREFIXES = {
+    "user_id": "u",
+    "post_id": "p",
+    "subreddit": "s"
+}
+
+
+def entity_hash_key(entity_key: str, entity_id: str) -> str:
+    """Redis hash holding every feature of an entity in the hash layout"""
+    return f"h:{ENTITY_HASH_PREFIXES[entity_key]}:{entity_id}"
+
+
 @dataclass
 class FeatureDefinition:
     name: str
     feature_type: FeatureType
     description: str
     ttl_seconds: Optional[int] = None # Time to live in Redis
+    window_seconds: Optional[int] = None # Sliding window length for windowed aggregations
+    window_buckets: int = 60 # Number of time buckets the window is split into
+
+    # Stream computation (src.streaming.feature_engine). A feature either
+    # aggregates source_events over its window (or all time without one), or
+    # is derived as a weighted sum of other features in the same registry.
+    entity_key: str = "user_id" # Event field holding the entity id
+    source_events: Tuple[EventType, ...] = ()
+    aggregation: Optional[Aggregation] = None
+    value_field: Optional[str] = None # SUM: event field that is summed, DISTINCT/TOP_K: field counted
+    numerator_events: Tuple[EventType, ...] = () # RATIO: subset of source_events counted on top
+    rate_seconds: float = 60.0 # RATE: unit of time the rate is expressed per
+    derived_from: Optional[Dict[str, float]] = None # {feature_name: weight}
+    # DISTINCT/TOP_K sketch sizes per window bucket, see src.streaming.sketches for error bounds
+    sketch_precision: int = 10 # DISTINCT: 2^p HyperLogLog registers (1 KB, 3.25% error at 10)
+    top_k: int = 10 # TOP_K: values reported
+    top_k_capacity: int = 64 # TOP_K: space-saving counters, values more frequent than 1/capacity are kept
+
+    # Field in the entity's hash in the hash key layout, unique per entity_key and never reused.
+    # Mirrored in feature-api/internal/storage/key_layout.go for the Go reader.
+    field_code: Optional[str] = None
+
+    def __post_init__(self):
+        if self.aggregation and self.derived_from:
+            raise ValueError(f"Feature {self.name} can't both aggregate events and be derived")
+        if self.aggregation and not self.source_events:
+            raise ValueError(f"Feature {self.name} aggregates but has no source_events")
+        if self.aggregation == Aggregation.SUM and not self.value_field:
+            raise ValueError(f"Feature {self.name} sums but has no value_field")
+        if self.aggregation == Aggregation.RATIO and \
+                not set(self.numerator_events) <= set(self.source_events):
+            raise ValueError(f"Feature {self.name} numerator_events must be a subset of source_events")
+        if self.aggregation == Aggregation.RATE and not self.window_seconds:
+            raise ValueError(f"Feature {self.name} is a rate but has no window")
+        if self.aggregation in (Aggregation.DISTINCT, Aggregation.TOP_K):
+            if not self.value_field:
+                raise ValueError(f"Feature {self.name} counts values but has no value_field")
+            if not self.window_seconds:
+                raise ValueError(f"Feature {self.name} is a sketch but has no window")
+            if self.top_k > self.top_k_capacity:
+                raise ValueError(f"Feature {self.name} top_k exceeds top_k_capacity")
 
     def get_redis_key(self, entity_id: str) -> str:
         """Generate Redis key for this feature"""
         return f"feature:{self.name}:{entity_id}"
+
+    def get_redis_hash_key(self, entity_id: str) -> str:
+        """Generate the Redis hash key this feature is a field of in the hash layout"""
+        return entity_hash_key(self.entity_key, entity_id)
+
+    @property
+    def bucket_seconds(self) -> float:
+        """Width of one window bucket (the window's time granularity)"""
+        if not self.window_seconds:
+            raise ValueError(f"Feature {self.name} is not windowed")
+        return self.window_seconds / self.window_buckets
     
 
+# user_engagement_score = sum(weight * counter value)
+ENGAGEMENT_SCORE_WEIGHTS = {
+    "user_views_1h": 1,
+    "user_clicks_1h": 3
+}
+
 # Features
 USER_FEATURES = {
     "user_clicks_1h": FeatureDefinition(
         name="user_clicks_1h",
         feature_type=FeatureType.REAL_TIME,
         description="Number of clicks by user in last 1 hour",
-        ttl_seconds=3600
+        ttl_seconds=3600,
+        window_seconds=3600,
+        source_events=(EventType.USER_CLICK,),
+        aggregation=Aggregation.COUNT,
+        field_code="c1h"
     ),
     "user_views_1h": FeatureDefinition(
         name="user_views_1h",
         feature_type=FeatureType.REAL_TIME,
         description="Number of post views by user in the last 1 hour",
-        ttl_seconds=3600
+        ttl_seconds=3600,
+        window_seconds=3600,
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.COUNT,
+        field_code="v1h"
+    ),
+    # Few distinct values per user, so this is mostly linear counting and close to exact.
+    # 4 buckets x 256 B of registers per cached user.
+    "user_distinct_subreddits_1h": FeatureDefinition(
+        name="user_distinct_subreddits_1h",
+        feature_type=FeatureType.REAL_TIME,
+        description="Number of distinct subreddits viewed by user in the last 1 hour",
+        ttl_seconds=3600,
+        window_seconds=3600,
+        window_buckets=4,
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.DISTINCT,
+        value_field="subreddit",
+        sketch_precision=8,
+        field_code="ds1h"
     ),
     "user_engagement_score": FeatureDefinition(
         name="user_engagement_score",
         feature_type=FeatureType.REAL_TIME,
         description="Weighted engagement score (views, clicks, votes)",
-        ttl_seconds=3600
+        ttl_seconds=3600,
+        derived_from=ENGAGEMENT_SCORE_WEIGHTS,
+        field_code="es"
     )
 }
 
@@ -48,18 +153,75 @@ CONTENT_FEATURES = {
         name="post_views_10m",
         feature_type=FeatureType.REAL_TIME,
         description="Number of views for post in the last 10 minutes",
-        ttl_seconds=600
+        ttl_seconds=600,
+        window_seconds=600,
+        entity_key="post_id",
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.COUNT,
+        field_code="v10m"
     ),
     "post_velocity": FeatureDefinition(
         name="post_velocity",
         feature_type=FeatureType.REAL_TIME,
         description="Rate of engagement (views per minute)",
-        ttl_seconds=600
+        ttl_seconds=600,
+        window_seconds=600,
+        entity_key="post_id",
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.RATE,
+        rate_seconds=60,
+        field_code="vel"
+    ),
+    # 5 buckets x 1 KB of registers per post held in process
+    "post_unique_viewers_10m": FeatureDefinition(
+        name="post_unique_viewers_10m",
+        feature_type=FeatureType.REAL_TIME,
+        description="Number of distinct users who viewed post in the last 10 minutes",
+        ttl_seconds=600,
+        window_seconds=600,
+        window_buckets=5,
+        entity_key="post_id",
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.DISTINCT,
+        value_field="user_id",
+        sketch_precision=10,
+        field_code="uv10m"
     ),
     "post_upvote_ratio": FeatureDefinition(
         name="post_upvote_ratio",
         feature_type=FeatureType.REAL_TIME,
         description="Upvotes / (Upvotes + Downvotes)",
-        ttl_seconds = 3600
+        ttl_seconds = 3600,
+        entity_key="post_id",
+        source_events=(EventType.USER_UPVOTE, EventType.USER_DOWNVOTE),
+        numerator_events=(EventType.USER_UPVOTE,),
+        aggregation=Aggregation.RATIO,
+        field_code="ur"
+    )
+}
+
+SUBREDDIT_FEATURES = {
+    # About 90 KB per subreddit held in process: 6 buckets x (4 KB Count-Min + 64 counters)
+    "subreddit_trending_posts_1h": FeatureDefinition(
+        name="subreddit_trending_posts_1h",
+        feature_type=FeatureType.REAL_TIME,
+        description="Most viewed posts in subreddit in the last 1 hour, [[post_id, views], ...]",
+        ttl_seconds=3600,
+        window_seconds=3600,
+        window_buckets=6,
+        entity_key="subreddit",
+        source_events=(EventType.USER_VIEW,),
+        aggregation=Aggregation.TOP_K,
+        value_field="post_id",
+        top_k=10,
+        top_k_capacity=64,
+        field_code="tp1h"
     )
-}
\ No newline at end of file
+}
+
+# Registry per entity type, as named in offline rows and feature API requests
+ENTITY_FEATURES = {
+    "user": USER_FEATURES,
+    "post": CONTENT_FEATURES,
+    "subreddit": SUBREDDIT_FEATURES
+}
@@ -0,0 +1,86 @@
+import math
+import numpy as np
+from typing import Any, Dict, Sequence
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram, values in seconds
+    Buckets grow by 2 ** (1 / buckets_per_octave), so with the default of 8 a
+    percentile is within ~5% of the true value. Histograms with the same
+    bounds merge by adding counts, e.g. across producer processes.
+    """
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 100.0, buckets_per_octave: int = 8):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.buckets_per_octave = buckets_per_octave
+        self._scale = buckets_per_octave / math.log(2)
+        self._num_buckets = int(math.ceil(math.log(max_value / min_value) * self._scale)) + 1
+        self.counts = np.zeros(self._num_buckets, dtype=np.int64)
+
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """Add one observation"""
+        if seconds <= self.min_value:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(seconds / self.min_value) * self._scale), self._num_buckets - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_many(self, values: Sequence[float]):
+        """Add many observations at once"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+
+        ratios = np.maximum(values / self.min_value, 1.0)
+        buckets = np.minimum((np.log(ratios) * self._scale).astype(np.int64), self._num_buckets - 1)
+        self.counts += np.bincount(buckets, minlength=self._num_buckets)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's observations (bounds must match)"""
+        if len(other.counts) != len(self.counts) or other.min_value != self.min_value:
+            raise ValueError("Cannot merge histograms with different bounds")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """Approximate p-th percentile (0-100), the geometric middle of its bucket"""
+        if not self.count:
+            return 0.0
+
+        rank = max(1, int(math.ceil(self.count * p / 100.0)))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        lower = self.min_value * math.exp(bucket / self._scale)
+        return min(lower * math.exp(0.5 / self._scale), self.max)
+
+    def reset(self):
+        """Drop all observations"""
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, p50/p95/p99 and max, latencies in milliseconds"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
@@ -1,32 +1,74 @@
-import json
+import threading
+import time
 import structlog
 from confluent_kafka import Producer, KafkaError
-from typing import List
+from typing import Dict, List, Tuple
 from src.common.events import BaseEvent
+from src.common import codec
+from src.common.event_generator import EncodedBatch
+from src.common.metrics import LatencyHistogram
 
 logger = structlog.get_logger()
 
 
 class EventProducer:
-    def __init__(self, bootstrap_servers: str, user_topic: str, content_topic: str):
+    """
+    Pipelined Kafka producer
+    produce() only enqueues, delivery reports are served by a background poll
+    thread, and nothing flushes until flush()/close(). When max_in_flight
+    messages are unacknowledged (or librdkafka's own queue is full) producing
+    blocks for up to backpressure_timeout_seconds, then drops and counts the message.
+    """
+
+    def __init__(self, bootstrap_servers: str, user_topic: str, content_topic: str,
+                 wire_format: str = "json", linger_ms: int = 10, batch_size: int = 16384,
+                 batch_num_messages: int = 10000, compression_type: str = "snappy",
+                 acks: str = "all", queue_buffering_max_messages: int = 100000,
+                 queue_buffering_max_kbytes: int = 1048576, max_in_flight: int = 100000,
+                 backpressure_timeout_seconds: float = 30.0, poll_interval_ms: int = 100):
         self.bootstrap_servers = bootstrap_servers
         self.user_topic = user_topic
         self.content_topic = content_topic
+        self.max_in_flight = max_in_flight
+        self.backpressure_timeout = backpressure_timeout_seconds
+        self.poll_interval = poll_interval_ms / 1000.0
+
+        # Payload encoding, announced per message in the encoding header so
+        # JSON and binary producers can share a topic
+        if wire_format not in codec.ENCODINGS:
+            raise ValueError(f"Unknown wire format {wire_format!r}, expected one of {list(codec.ENCODINGS)}")
+        self.wire_format = wire_format
+        self.encoding = codec.ENCODINGS[wire_format]
+
+        # Delivery tracking, updated by the poll thread and read by producing threads
+        self._cond = threading.Condition()
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.backpressure_waits = 0
+        self.latency = LatencyHistogram()
         
         # Kafka producer config
         conf = {
             'bootstrap.servers': bootstrap_servers,
             'client.id': 'feature-store-producer',
-            'compression.type': 'snappy',
-            'linger.ms': 10,
-            'batch.size': 16384,
+            'compression.type': compression_type,
+            'linger.ms': linger_ms,
+            'batch.size': batch_size,
+            'batch.num.messages': batch_num_messages,
+            'acks': acks,
+            'queue.buffering.max.messages': queue_buffering_max_messages,
+            'queue.buffering.max.kbytes': queue_buffering_max_kbytes,
             'socket.timeout.ms': 10000,
             'api.version.request': True,
         }
         
         try:
             self.producer = Producer(conf)
-            logger.info("Kafka producer initialized", servers=bootstrap_servers)
+            logger.info("Kafka producer initialized", servers=bootstrap_servers,
+                       linger_ms=linger_ms, batch_size=batch_size, max_in_flight=max_in_flight)
             
             # Test connection by getting metadata
             metadata = self.producer.list_topics(timeout=5)
@@ -36,18 +78,35 @@ class EventProducer:
         except Exception as e:
             logger.error("Failed to initialize Kafka producer", error=str(e))
             raise
+
+        self._closed = threading.Event()
+        self._poll_thread = threading.Thread(target=self._poll_loop, name="kafka-producer-poll", daemon=True)
+        self._poll_thread.start()
     
-    def delivery_callback(self, err, msg):
-        """Callback for message delivery confirmation"""
+    def _poll_loop(self):
+        """Serve delivery reports until close()"""
+        while not self._closed.is_set():
+            self.producer.poll(self.poll_interval)
+    
+    def _on_delivery(self, err, msg):
+        """Delivery report callback, runs on the poll thread (or inside flush)"""
+        # Time from produce() to the broker ack (or failure), measured by librdkafka
+        latency = msg.latency() if msg is not None else None
+
+        with self._cond:
+            self.in_flight -= 1
+            if err:
+                self.failed += 1
+            else:
+                self.delivered += 1
+            if latency is not None:
+                self.latency.record(latency)
+            self._cond.notify_all()
+
         if err:
             logger.error("Message delivery failed", 
                         error=str(err),
                         topic=msg.topic() if msg else None)
-        else:
-            logger.debug("Message delivered",
-                        topic=msg.topic(),
-                        partition=msg.partition(),
-                        offset=msg.offset())
     
     def send_event(self, event: BaseEvent):
         """Send a single event to appropriate Kafka topic"""
@@ -64,48 +123,125 @@ class EventProducer:
             logger.error("Unknown event type", event_type=type(event))
             return
         
-        # Serialize event to JSON
-        value = json.dumps(event.model_dump(), default=str)
-        
+        # Serialize event in the configured wire format
+        encoding = self.encoding
         try:
-            # Send to Kafka
-            self.producer.produce(
-                topic=topic,
-                key=key.encode('utf-8'),
-                value=value.encode('utf-8'),
-                callback=self.delivery_callback
-            )
-            
-            # Trigger callbacks (non-blocking)
-            self.producer.poll(0)
-        except BufferError:
-            logger.warning("Local producer queue is full, waiting...")
-            self.producer.flush()
-            # Retry
-            self.producer.produce(
-                topic=topic,
-                key=key.encode('utf-8'),
-                value=value.encode('utf-8'),
-                callback=self.delivery_callback
-            )
-        except Exception as e:
-            logger.error("Failed to produce message", error=str(e), topic=topic)
+            value = codec.encode_event(event, encoding)
+        except ValueError as e:
+            # Not representable in binary (e.g. non-UUID event_id), JSON always works
+            logger.warning("Falling back to JSON encoding", error=str(e), event_id=event.event_id)
+            encoding = codec.ENCODING_JSON
+            value = codec.encode_event(event, encoding)
+        
+        self._produce(topic, key.encode('utf-8'), value, [(codec.ENCODING_HEADER, encoding)])
+    
+    def _reserve(self) -> bool:
+        """
+        Count one more message in flight
+        Blocks while max_in_flight are unacknowledged, False once backpressure_timeout passes
+        """
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                self.backpressure_waits += 1
+                deadline = time.monotonic() + self.backpressure_timeout
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        return False
+                    self._cond.wait(remaining)
+            self.in_flight += 1
+            self.produced += 1
+            return True
+    
+    def _release_dropped(self):
+        """Undo _reserve for a message librdkafka never accepted"""
+        with self._cond:
+            self.in_flight -= 1
+            self.produced -= 1
+            self.dropped += 1
+            self._cond.notify_all()
+    
+    def _produce(self, topic: str, key: bytes, value: bytes, headers: List[Tuple[str, bytes]]):
+        """Enqueue one encoded message, blocking (bounded) under backpressure"""
+        if not self._reserve():
+            logger.warning("Dropped message, too many in flight",
+                          topic=topic, in_flight=self.in_flight, timeout=self.backpressure_timeout)
+            return
+
+        deadline = None
+        while True:
+            try:
+                self.producer.produce(
+                    topic=topic,
+                    key=key,
+                    value=value,
+                    headers=headers,
+                    callback=self._on_delivery
+                )
+                return
+            except BufferError:
+                # librdkafka's queue is full: wait for the poll thread to serve
+                # delivery reports instead of flushing here
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.backpressure_timeout
+                    with self._cond:
+                        self.backpressure_waits += 1
+                if now >= deadline:
+                    self._release_dropped()
+                    logger.warning("Dropped message, local producer queue is full",
+                                  topic=topic, timeout=self.backpressure_timeout)
+                    return
+                with self._cond:
+                    self._cond.wait(min(deadline - now, self.poll_interval))
+            except Exception as e:
+                self._release_dropped()
+                logger.error("Failed to produce message", error=str(e), topic=topic)
+                return
     
     def send_batch(self, events: List[BaseEvent]):
-        """Send a batch of events"""
+        """Enqueue a batch of events (no flush, see flush())"""
         for event in events:
             self.send_event(event)
-        
-        # Flush to ensure all messages are sent
-        remaining = self.producer.flush(timeout=10)
-        if remaining > 0:
-            logger.warning("Failed to flush all messages", remaining=remaining)
-        else:
-            logger.info("Batch sent", num_events=len(events))
+    
+    def send_encoded_batch(self, batch: EncodedBatch):
+        """Enqueue a batch of pre-encoded events from EventGenerator.generate_encoded_batch"""
+        headers = [(codec.ENCODING_HEADER, batch.encoding)]
+        for key, value in batch.user_events:
+            self._produce(self.user_topic, key, value, headers)
+        for key, value in batch.content_events:
+            self._produce(self.content_topic, key, value, headers)
+    
+    def stats(self) -> Dict[str, int]:
+        """Cumulative produced/delivered/failed/dropped counts and current in-flight"""
+        with self._cond:
+            return {
+                'produced': self.produced,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'in_flight': self.in_flight,
+                'backpressure_waits': self.backpressure_waits,
+            }
+    
+    def take_latency(self) -> LatencyHistogram:
+        """Delivery latency since the last call, then start a new histogram"""
+        with self._cond:
+            latency = self.latency
+            self.latency = LatencyHistogram()
+        return latency
+    
+    def flush(self, timeout: float = 10) -> int:
+        """Wait up to timeout seconds for everything in flight, returns how many are left"""
+        return self.producer.flush(timeout=timeout)
     
     def close(self):
-        """Close the producer and flush remaining messages"""
-        remaining = self.producer.flush(timeout=10)
+        """Deliver remaining messages and stop the poll thread"""
+        remaining = self.flush(timeout=10)
         if remaining > 0:
             logger.warning("Some messages were not delivered", count=remaining)
-        logger.info("Kafka producer closed")
\ No newline at end of file
+
+        self._closed.set()
+        self._poll_thread.join(timeout=self.poll_interval + 1)
+        logger.info("Kafka producer closed", **self.stats())
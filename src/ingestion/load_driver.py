@@ -0,0 +1,275 @@
+import argparse
+import os
+import queue
+import signal
+import time
+import multiprocessing
+import structlog
+from typing import Any, Dict, List
+from src.common.config import Config
+from src.common.event_generator import EventGenerator
+from src.common.metrics import LatencyHistogram
+from src.ingestion.kafka_producer import EventProducer
+
+logger = structlog.get_logger()
+
+
+class TokenBucket:
+    """
+    Token bucket for open-loop pacing
+    Tokens accrue at rate per second up to burst, independent of how fast
+    anything downstream acknowledges, so a slow broker can't lower the offered load
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float) -> float:
+        """Seconds until n tokens are available, 0 if they are now"""
+        self._refill()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        """Spend n tokens (call after wait_time returned 0)"""
+        self.tokens -= n
+
+
+def _driver_main(worker_id: int, rate: float, duration_seconds: float, batch_size: int,
+                 report_interval_seconds: float, generator_kwargs: Dict[str, Any],
+                 producer_kwargs: Dict[str, Any], user_ratio: float, report_queue, stop_event):
+    """Entry point of one load process: generate and enqueue at a fixed rate, never flush"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent owns Ctrl-C
+
+    generator = EventGenerator(**generator_kwargs)
+    producer = EventProducer(**producer_kwargs)
+    bucket = TokenBucket(rate, burst=batch_size)
+    last = producer.stats()
+
+    def report(final: bool = False):
+        # The producer's counters are cumulative, reports carry this interval's share
+        nonlocal last
+        stats = producer.stats()
+        interval = {key: stats[key] - last[key] for key in ('produced', 'delivered', 'failed', 'dropped')}
+        last = stats
+        report_queue.put({'worker_id': worker_id, 'pid': os.getpid(), 'final': final,
+                          'in_flight': stats['in_flight'], 'latency': producer.take_latency(),
+                          **interval})
+
+    start = time.monotonic()
+    deadline = start + duration_seconds
+    next_report = start + report_interval_seconds
+
+    while not stop_event.is_set():
+        now = time.monotonic()
+        if now >= deadline:
+            break
+
+        if now >= next_report:
+            report()
+            next_report += report_interval_seconds
+
+        wait = bucket.wait_time(batch_size)
+        if wait > 0:
+            # Delivery reports are served by the producer's poll thread meanwhile
+            time.sleep(min(wait, 0.05))
+            continue
+
+        bucket.take(batch_size)
+        batch = generator.generate_encoded_batch(batch_size, user_ratio=user_ratio,
+                                                 encoding=producer.encoding)
+        producer.send_encoded_batch(batch)
+
+    # Drain what's in flight so its latency is counted, then send the last report
+    producer.flush(30)
+    report(final=True)
+    producer.close()
+
+
+class LoadDriver:
+    """
+    Open-loop load generator: N processes, each paced by its own token bucket
+    Offered load is target_rate regardless of broker speed, and the parent
+    merges per-process reports into achieved rate and delivery latency percentiles
+    """
+
+    def __init__(self, target_rate: float, num_processes: int, duration_seconds: float,
+                 batch_size: int, report_interval_seconds: float,
+                 generator_kwargs: Dict[str, Any], producer_kwargs: Dict[str, Any],
+                 user_ratio: float = 0.9):
+        self.target_rate = target_rate
+        self.num_processes = num_processes
+        self.duration_seconds = duration_seconds
+        self.batch_size = batch_size
+        self.report_interval_seconds = report_interval_seconds
+        self.generator_kwargs = generator_kwargs
+        self.producer_kwargs = producer_kwargs
+        self.user_ratio = user_ratio
+
+        # Spawn so no Kafka state leaks from the parent into workers
+        self.ctx = multiprocessing.get_context("spawn")
+        self.report_queue = self.ctx.Queue()
+        self.stop_event = self.ctx.Event()
+        self.processes: List[multiprocessing.Process] = []
+
+        # Totals over the whole run
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.latency = LatencyHistogram()
+
+    def run(self) -> Dict[str, Any]:
+        """Run the load test and return the overall summary"""
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        rate_per_process = self.target_rate / self.num_processes
+        logger.info("Starting load driver",
+                   target_rate=self.target_rate,
+                   num_processes=self.num_processes,
+                   duration_seconds=self.duration_seconds,
+                   batch_size=self.batch_size)
+
+        for worker_id in range(self.num_processes):
+            process = self.ctx.Process(
+                target=_driver_main,
+                args=(worker_id, rate_per_process, self.duration_seconds, self.batch_size,
+                      self.report_interval_seconds, self.generator_kwargs, self.producer_kwargs,
+                      self.user_ratio, self.report_queue, self.stop_event),
+                name=f"load-driver-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        start = time.monotonic()
+        finished = set()
+        interval: List[Dict[str, Any]] = []
+        last_report = start
+
+        while len(finished) < self.num_processes:
+            try:
+                report = self.report_queue.get(timeout=1.0)
+                interval.append(report)
+                if report['final']:
+                    finished.add(report['worker_id'])
+            except queue.Empty:
+                if not any(process.is_alive() for process in self.processes):
+                    logger.error("Load processes exited without a final report",
+                                finished=sorted(finished))
+                    break
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval_seconds:
+                self._log_interval(interval, now - last_report)
+                interval = []
+                last_report = now
+
+        if interval:
+            self._log_interval(interval, max(time.monotonic() - last_report, 1e-9))
+
+        for process in self.processes:
+            process.join(timeout=5)
+
+        return self._summary(time.monotonic() - start)
+
+    def stop(self):
+        """Ask every process to stop and drain"""
+        self.stop_event.set()
+
+    def _log_interval(self, reports: List[Dict[str, Any]], seconds: float):
+        """Merge one interval's reports into the totals and log it"""
+        latency = LatencyHistogram()
+        produced = delivered = failed = dropped = 0
+        in_flight: Dict[int, int] = {}
+
+        for report in reports:
+            produced += report['produced']
+            delivered += report['delivered']
+            failed += report['failed']
+            dropped += report['dropped']
+            latency.merge(report['latency'])
+            in_flight[report['worker_id']] = report['in_flight']
+
+        self.produced += produced
+        self.delivered += delivered
+        self.failed += failed
+        self.dropped += dropped
+        self.latency.merge(latency)
+
+        summary = latency.summary()
+        logger.info("Load interval",
+                   achieved_rate=round(produced / seconds),
+                   delivered_rate=round(delivered / seconds),
+                   failed=failed,
+                   dropped=dropped,
+                   in_flight=sum(in_flight.values()),
+                   p50_ms=summary['p50_ms'],
+                   p95_ms=summary['p95_ms'],
+                   p99_ms=summary['p99_ms'],
+                   max_ms=summary['max_ms'])
+
+    def _summary(self, elapsed: float) -> Dict[str, Any]:
+        """Overall achieved rate and delivery latency"""
+        summary = {
+            'target_rate': self.target_rate,
+            'elapsed_seconds': round(elapsed, 1),
+            'produced': self.produced,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'achieved_rate': round(self.produced / elapsed) if elapsed else 0,
+            'delivered_rate': round(self.delivered / elapsed) if elapsed else 0,
+            **{f"latency_{key}": value for key, value in self.latency.summary().items() if key != 'count'},
+        }
+        logger.info("Load test finished", **summary)
+        return summary
+
+
+def main():
+    config = Config()
+
+    parser = argparse.ArgumentParser(description="Open-loop Kafka load driver")
+    parser.add_argument("--rate", type=int, default=config.load.target_rate,
+                        help="Target events per second across all processes")
+    parser.add_argument("--processes", type=int, default=config.load.num_processes)
+    parser.add_argument("--duration", type=float, default=config.load.duration_seconds)
+    parser.add_argument("--batch-size", type=int, default=config.load.batch_size)
+    parser.add_argument("--wire-format", default=config.kafka.wire_format, choices=["json", "binary"])
+    args = parser.parse_args()
+
+    driver = LoadDriver(
+        target_rate=args.rate,
+        num_processes=args.processes,
+        duration_seconds=args.duration,
+        batch_size=args.batch_size,
+        report_interval_seconds=config.load.report_interval_seconds,
+        generator_kwargs=dict(
+            num_users=config.generator.num_users,
+            num_posts=config.generator.num_posts,
+            zipf_skew=config.generator.zipf_skew
+        ),
+        producer_kwargs=dict(
+            bootstrap_servers=config.kafka.bootstrap_servers,
+            user_topic=config.kafka.user_events_topic,
+            content_topic=config.kafka.content_events_topic,
+            wire_format=args.wire_format,
+            **config.producer.model_dump()
+        ),
+        user_ratio=config.generator.user_event_ratio
+    )
+    driver.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,13 +25,16 @@ def main():
     # Initialize generator and producer
     generator = EventGenerator(
         num_users=config.generator.num_users,
-        num_posts=config.generator.num_posts
+        num_posts=config.generator.num_posts,
+        zipf_skew=config.generator.zipf_skew
     )
     
     producer = EventProducer(
         bootstrap_servers=config.kafka.bootstrap_servers,
         user_topic=config.kafka.user_events_topic,
-        content_topic=config.kafka.content_events_topic
+        content_topic=config.kafka.content_events_topic,
+        wire_format=config.kafka.wire_format,
+        **config.producer.model_dump()
     )
     
     try:
@@ -43,25 +46,26 @@ def main():
         batch_num = 0
         
         while True:
-            # Generate and send batch
-            events = generator.generate_batch(
+            # Generate (already encoded) and send batch
+            batch = generator.generate_encoded_batch(
                 batch_size,
-                user_ratio=config.generator.user_event_ratio
+                user_ratio=config.generator.user_event_ratio,
+                encoding=producer.encoding
             )
             
             logger.info("Generated events batch", 
                        batch_num=batch_num,
-                       num_events=len(events),
-                       user_events=sum(1 for e in events if hasattr(e, 'user_id')),
-                       content_events=sum(1 for e in events if hasattr(e, 'author_id')))
+                       num_events=len(batch),
+                       user_events=len(batch.user_events),
+                       content_events=len(batch.content_events))
             
-            producer.send_batch(events)
+            producer.send_encoded_batch(batch)
             
-            event_count += len(events)
+            event_count += len(batch)
             batch_num += 1
             
             if event_count % 100 == 0:
-                logger.info("Events produced", total=event_count, batches=batch_num)
+                logger.info("Events produced", total=event_count, batches=batch_num, **producer.stats())
             
             time.sleep(sleep_time)
             
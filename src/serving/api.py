@@ -0,0 +1,142 @@
+import asyncio
+import time
+import structlog
+import uvicorn
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel
+from src.common.config import Config
+from src.storage.async_redis_client import AsyncRedisClient
+from src.storage.async_postgres_client import AsyncPostgresClient
+from src.storage.redis_client import decode_value
+from src.serving.feature_service import FeatureBatcher, resolve_features
+
+logger = structlog.get_logger()
+
+
+# Same request and response shapes as the Go feature-api
+class FeatureRequest(BaseModel):
+    entity_id: str
+    entity_type: str  # "user" or "post"
+    features: List[str]
+
+class FeatureResponse(BaseModel):
+    entity_id: str
+    entity_type: str
+    features: Dict[str, Any]
+    timestamp: datetime
+    cache_hit: bool  # Every value came from Redis
+    cache_level: str  # "L2" (Redis) or "miss" (offline fallback needed)
+
+class BatchFeatureRequest(BaseModel):
+    requests: List[FeatureRequest]
+
+class BatchFeatureResponse(BaseModel):
+    responses: List[FeatureResponse]
+    latency_ms: float
+
+
+def create_app(config: Optional[Config] = None) -> FastAPI:
+    """The feature API, with storage clients opened and closed by the app's lifespan"""
+    config = config or Config()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        redis = AsyncRedisClient(max_connections=config.serving.redis_max_connections,
+                                 key_layout=config.redis.key_layout,
+                                 expiry_bucket_seconds=config.redis.expiry_bucket_seconds)
+        await redis.connect()
+
+        postgres = None
+        if config.serving.postgres_fallback:
+            postgres = AsyncPostgresClient()
+            await postgres.connect()
+
+        app.state.redis = redis
+        app.state.postgres = postgres
+        app.state.batcher = FeatureBatcher(redis, postgres,
+                                           max_batch_keys=config.serving.max_batch_keys,
+                                           max_wait_ms=config.serving.max_batch_wait_ms)
+        logger.info("Feature API started", port=config.serving.port,
+                   max_batch_keys=config.serving.max_batch_keys,
+                   max_batch_wait_ms=config.serving.max_batch_wait_ms,
+                   postgres_fallback=config.serving.postgres_fallback)
+        try:
+            yield
+        finally:
+            await app.state.batcher.close()
+            await redis.close()
+            if postgres is not None:
+                await postgres.close()
+
+    app = FastAPI(title="Feature API", lifespan=lifespan)
+
+    async def lookup(batcher: FeatureBatcher, req: FeatureRequest) -> FeatureResponse:
+        try:
+            feature_defs = resolve_features(req.entity_type, req.features)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        lookups = await batcher.get(feature_defs, [req.entity_id])
+        cache_hit = all(result.source == "redis" for result in lookups)
+        return FeatureResponse(
+            entity_id=req.entity_id,
+            entity_type=req.entity_type,
+            features={name: decode_value(result.value) for name, result in zip(req.features, lookups)},
+            timestamp=datetime.now(timezone.utc),
+            cache_hit=cache_hit,
+            cache_level="L2" if cache_hit else "miss"
+        )
+
+    @app.post("/api/v1/features", response_model=FeatureResponse)
+    async def get_features(req: FeatureRequest, request: Request):
+        return await lookup(request.app.state.batcher, req)
+
+    @app.post("/api/v1/features/batch", response_model=BatchFeatureResponse)
+    async def get_features_batch(req: BatchFeatureRequest, request: Request):
+        start = time.perf_counter()
+        # Every request's lookups are queued before the first await, so they share a pipeline
+        responses = await asyncio.gather(*(lookup(request.app.state.batcher, item) for item in req.requests))
+        return BatchFeatureResponse(responses=list(responses),
+                                    latency_ms=round((time.perf_counter() - start) * 1000, 3))
+
+    @app.get("/health")
+    async def health(request: Request):
+        redis_ok = True
+        try:
+            await request.app.state.redis.client.ping()
+        except Exception:
+            redis_ok = False
+
+        postgres = request.app.state.postgres
+        postgres_ok = None
+        if postgres is not None:
+            try:
+                await postgres.pool.fetchval("SELECT 1")
+                postgres_ok = True
+            except Exception:
+                postgres_ok = False
+
+        if not redis_ok:
+            raise HTTPException(status_code=503, detail="Redis unavailable")
+        return {"status": "healthy", "redis_ok": redis_ok, "postgres_ok": postgres_ok,
+                "timestamp": datetime.now(timezone.utc)}
+
+    @app.get("/stats")
+    async def stats(request: Request):
+        return request.app.state.batcher.stats()
+
+    return app
+
+
+def main():
+    config = Config()
+    # One event loop per process, run more processes behind a load balancer to scale out
+    uvicorn.run(create_app(config), host=config.serving.host, port=config.serving.port,
+                access_log=False)
+
+
+if __name__ == "__main__":
+    main()
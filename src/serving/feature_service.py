@@ -0,0 +1,199 @@
+import asyncio
+import structlog
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from src.common.features import ENTITY_FEATURES, FeatureDefinition
+from src.storage.async_redis_client import AsyncRedisClient
+from src.storage.async_postgres_client import AsyncPostgresClient
+
+logger = structlog.get_logger()
+
+# (feature_name, entity_id)
+LookupKey = Tuple[str, str]
+
+# Feature name -> entity type, for the offline fallback
+FEATURE_ENTITY_TYPES = {name: entity_type for entity_type, features in ENTITY_FEATURES.items() for name in features}
+
+
+class FeatureLookup(NamedTuple):
+    """Raw stored value of one feature and where it came from (redis, postgres, or None if neither)"""
+    value: Optional[str]
+    source: Optional[str]
+
+
+def resolve_features(entity_type: str, feature_names: List[str]) -> List[FeatureDefinition]:
+    """Definitions of the requested features, ValueError for an unknown entity type or feature"""
+    features = ENTITY_FEATURES.get(entity_type)
+    if features is None:
+        raise ValueError(f"Unknown entity_type {entity_type!r}, expected one of {sorted(ENTITY_FEATURES)}")
+    unknown = [name for name in feature_names if name not in features]
+    if unknown:
+        raise ValueError(f"Unknown {entity_type} features: {', '.join(unknown)}")
+    return [features[name] for name in feature_names]
+
+
+class FeatureBatcher:
+    """
+    Micro-batches concurrent feature lookups into shared Redis pipelines
+    Lookups arriving within max_wait_ms of the first one (or until
+    max_batch_keys are queued) are read in one pipeline, and a key that is
+    already queued or being read is shared instead of read again. Values
+    Redis doesn't have are read from latest_features, one query per entity type.
+    """
+
+    def __init__(self, redis_client: AsyncRedisClient, postgres_client: Optional[AsyncPostgresClient] = None,
+                 max_batch_keys: int = 2000, max_wait_ms: float = 1.0, chunk_size: int = 1000):
+        self.redis = redis_client
+        self.postgres = postgres_client   # Offline fallback, None disables it
+        self.max_batch_keys = max_batch_keys
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.chunk_size = chunk_size
+
+        self._queued: Dict[LookupKey, FeatureDefinition] = {}
+        self._futures: Dict[LookupKey, asyncio.Future] = {}   # Queued or being read
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+        # Counters
+        self.lookups = 0
+        self.coalesced = 0   # Lookups that shared a key already queued or in flight
+        self.batches = 0
+        self.batch_keys = 0
+        self.redis_misses = 0
+        self.postgres_hits = 0
+        self.errors = 0
+
+    async def get(self, feature_defs: List[FeatureDefinition], entity_ids: List[str]) -> List[FeatureLookup]:
+        """Lookups for entities x features, entity-major"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for entity_id in entity_ids:
+            for feature_def in feature_defs:
+                key = (feature_def.name, entity_id)
+                future = self._futures.get(key)
+                if future is None:
+                    future = self._futures[key] = loop.create_future()
+                    self._queued[key] = feature_def
+                else:
+                    self.coalesced += 1
+                futures.append(future)
+        self.lookups += len(futures)
+
+        if len(self._queued) >= self.max_batch_keys:
+            self._flush()
+        elif self._queued and self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+
+        # wait() rather than gather(), so a cancelled request doesn't cancel lookups others share
+        if futures:
+            await asyncio.wait(set(futures))
+        return [future.result() for future in futures]
+
+    def _flush(self):
+        """Start reading everything queued so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queued:
+            return
+
+        batch, self._queued = self._queued, {}
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[LookupKey, FeatureDefinition]):
+        """Read one batch and resolve its futures"""
+        self.batches += 1
+        self.batch_keys += len(batch)
+        try:
+            results = await self._read(batch)
+        except Exception as e:
+            self.errors += 1
+            logger.error("Failed to read feature batch", keys=len(batch), error=str(e))
+            for key in batch:
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in batch:
+            future = self._futures.pop(key)
+            if not future.done():
+                future.set_result(results[key])
+
+    async def _read(self, batch: Dict[LookupKey, FeatureDefinition]) -> Dict[LookupKey, FeatureLookup]:
+        """Redis values for a batch, with the offline fallback for the ones it's missing"""
+        # Entities asking for the same features share one entities x features read
+        by_entity: Dict[str, List[FeatureDefinition]] = {}
+        for (_, entity_id), feature_def in batch.items():
+            by_entity.setdefault(entity_id, []).append(feature_def)
+
+        groups: Dict[Tuple[str, ...], Tuple[List[FeatureDefinition], List[str]]] = {}
+        for entity_id, feature_defs in by_entity.items():
+            feature_defs.sort(key=lambda feature_def: feature_def.name)
+            names = tuple(feature_def.name for feature_def in feature_defs)
+            groups.setdefault(names, (feature_defs, []))[1].append(entity_id)
+
+        requests = list(groups.values())
+        results: Dict[LookupKey, FeatureLookup] = {}
+        missing: List[LookupKey] = []
+        for (feature_defs, entity_ids), values in zip(requests, await self.redis.get_raw_values_many(
+                requests, self.chunk_size)):
+            values_iter = iter(values)
+            for entity_id in entity_ids:
+                for feature_def in feature_defs:
+                    key = (feature_def.name, entity_id)
+                    value = next(values_iter)
+                    if value is None:
+                        missing.append(key)
+                        results[key] = FeatureLookup(None, None)
+                    else:
+                        results[key] = FeatureLookup(value, "redis")
+
+        self.redis_misses += len(missing)
+        if missing and self.postgres is not None:
+            for key, value in (await self._read_offline(missing)).items():
+                results[key] = FeatureLookup(value, "postgres")
+        return results
+
+    async def _read_offline(self, keys: List[LookupKey]) -> Dict[LookupKey, str]:
+        """Latest offline values, one latest_features query per entity type"""
+        by_type: Dict[str, Tuple[set, set]] = {}
+        for name, entity_id in keys:
+            entity_ids, names = by_type.setdefault(FEATURE_ENTITY_TYPES[name], (set(), set()))
+            entity_ids.add(entity_id)
+            names.add(name)
+
+        wanted = set(keys)
+        found: Dict[LookupKey, str] = {}
+        try:
+            for stored in await asyncio.gather(*(
+                    self.postgres.get_latest_offline_features(list(entity_ids), entity_type, list(names))
+                    for entity_type, (entity_ids, names) in by_type.items())):
+                for (entity_id, name), value in stored.items():
+                    if (name, entity_id) in wanted:
+                        found[(name, entity_id)] = value
+        except Exception as e:
+            # Redis values still stand, the missing ones stay missing
+            logger.error("Offline fallback failed", keys=len(keys), error=str(e))
+        self.postgres_hits += len(found)
+        return found
+
+    async def close(self):
+        """Finish the batches already started"""
+        self._flush()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup, coalescing and batching counters"""
+        return {
+            'lookups': self.lookups,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'avg_batch_keys': round(self.batch_keys / self.batches, 1) if self.batches else 0.0,
+            'redis_misses': self.redis_misses,
+            'postgres_hits': self.postgres_hits,
+            'errors': self.errors,
+            'in_flight': len(self._futures),
+        }
@@ -0,0 +1,184 @@
+import asyncpg
+import structlog
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from src.storage.postgres_client import OfflineFeatureRow
+
+logger = structlog.get_logger()
+
+
+class AsyncPostgresClient:
+    """
+    asyncio counterpart of PostgresClient, built on an asyncpg pool
+    asyncpg prepares and caches statements per connection on its own
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 5432,
+                 database: str = "featurestore", user: str = "featurestore",
+                 password: str = "featurestore", min_connections: int = 2,
+                 max_connections: int = 10):
+        self.conn_params = {
+            'host': host,
+            'port': port,
+            'database': database,
+            'user': user,
+            'password': password
+        }
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self):
+        """Create the connection pool"""
+        try:
+            self.pool = await asyncpg.create_pool(
+                min_size=self.min_connections,
+                max_size=self.max_connections,
+                **self.conn_params
+            )
+            logger.info("Async PostgreSQL client connected",
+                       host=self.conn_params['host'], database=self.conn_params['database'])
+        except Exception as e:
+            logger.error("Failed to connect to PostgreSQL", error=str(e))
+            raise
+
+    async def store_offline_feature(self, entity_id: str, entity_type: str,
+                                    feature_name: str, feature_value: str,
+                                    computed_at: Optional[datetime] = None):
+        """Store a feature value for offline access"""
+        if computed_at is None:
+            computed_at = datetime.utcnow()
+
+        query = """
+            INSERT INTO offline_features
+            (entity_id, entity_type, feature_name, feature_value, computed_at)
+            VALUES ($1, $2, $3, $4, $5)
+        """
+
+        await self.pool.execute(query, entity_id, entity_type, feature_name,
+                                str(feature_value), computed_at)
+
+    async def store_offline_features(self, rows: List[OfflineFeatureRow], skip_duplicates: bool = False):
+        """Store many feature values in one executemany call"""
+        if not rows:
+            return
+
+        query = """
+            INSERT INTO offline_features
+            (entity_id, entity_type, feature_name, feature_value, computed_at)
+            VALUES ($1, $2, $3, $4, $5)
+        """
+        if skip_duplicates:
+            query += " ON CONFLICT DO NOTHING"
+
+        await self.pool.executemany(query, [
+            (row.entity_id, row.entity_type, row.feature_name, str(row.feature_value), row.computed_at)
+            for row in rows
+        ])
+
+    async def copy_offline_features(self, rows: List[OfflineFeatureRow]):
+        """Bulk load feature values with COPY (all rows or none)"""
+        if not rows:
+            return
+
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                'offline_features',
+                records=[(row.entity_id, row.entity_type, row.feature_name,
+                          str(row.feature_value), row.computed_at) for row in rows],
+                columns=['entity_id', 'entity_type', 'feature_name', 'feature_value', 'computed_at']
+            )
+
+    async def get_offline_feature(self, entity_id: str, entity_type: str,
+                                  feature_name: str,
+                                  timestamp: Optional[datetime] = None) -> Optional[str]:
+        """
+        Get offline feature value at a specific point in time
+        If no timestamp provided, gets the latest value
+        """
+        if timestamp:
+            # Same shape as PostgresClient's select_offline_feature_as_of
+            query = """
+                (SELECT feature_value
+                 FROM latest_features
+                 WHERE entity_id = $1
+                   AND entity_type = $2
+                   AND feature_name = $3
+                   AND computed_at <= $4)
+                UNION ALL
+                (SELECT feature_value
+                 FROM offline_features
+                 WHERE entity_id = $1
+                   AND entity_type = $2
+                   AND feature_name = $3
+                   AND computed_at <= $4
+                 ORDER BY computed_at DESC
+                 LIMIT 1)
+                LIMIT 1
+            """
+            params = (entity_id, entity_type, feature_name, timestamp)
+        else:
+            query = """
+                SELECT feature_value
+                FROM latest_features
+                WHERE entity_id = $1
+                  AND entity_type = $2
+                  AND feature_name = $3
+            """
+            params = (entity_id, entity_type, feature_name)
+
+        return await self.pool.fetchval(query, *params)
+
+    async def get_latest_offline_features(self, entity_ids: List[str], entity_type: str,
+                                          feature_names: List[str]) -> Dict[tuple, str]:
+        """
+        Latest offline value of every (entity, feature) pair in one query, see PostgresClient
+        Returns {(entity_id, feature_name): feature_value}, missing pairs are absent
+        """
+        if not entity_ids or not feature_names:
+            return {}
+
+        query = """
+            SELECT entity_id, feature_name, feature_value
+            FROM latest_features
+            WHERE entity_type = $1
+              AND entity_id = ANY($2::text[])
+              AND feature_name = ANY($3::text[])
+        """
+
+        rows = await self.pool.fetch(query, entity_type, list(entity_ids), list(feature_names))
+        return {(row['entity_id'], row['feature_name']): row['feature_value'] for row in rows}
+
+    async def record_consistency_check(self, entity_id: str, entity_type: str,
+                                       feature_name: str, online_value: Any,
+                                       offline_value: Any, is_consistent: bool,
+                                       difference: Optional[str] = None):
+        """Record the result of an online/offline consistency check"""
+        query = """
+            INSERT INTO consistency_checks
+            (check_time, entity_id, entity_type, feature_name,
+             online_value, offline_value, is_consistent, difference)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        """
+
+        await self.pool.execute(query, datetime.utcnow(), entity_id, entity_type, feature_name,
+                                str(online_value), str(offline_value), is_consistent, difference)
+
+    async def get_consistency_stats(self, hours: int = 24) -> Dict[str, Any]:
+        """Get consistency check statistics for the last N hours"""
+        query = """
+            SELECT
+                COUNT(*) as total_checks,
+                SUM(CASE WHEN is_consistent THEN 1 ELSE 0 END) as consistent_checks,
+                AVG(CASE WHEN is_consistent THEN 1.0 ELSE 0.0 END) as consistency_rate
+            FROM consistency_checks
+            WHERE check_time > NOW() - make_interval(hours => $1)
+        """
+
+        return dict(await self.pool.fetchrow(query, hours))
+
+    async def close(self):
+        """Close the connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+        logger.info("Async PostgreSQL client closed")
@@ -0,0 +1,183 @@
+import time
+import structlog
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, NoScriptError
+from typing import Optional, Dict, Any, List, Tuple
+from src.common.features import FeatureDefinition
+from src.storage.key_layout import FeaturesWithTTL, make_key_layout
+from src.storage.redis_client import (
+    SCRIPTS, FeatureMatrix, build_update_calls, parse_update_results, decode_value, build_feature_matrix,
+    queue_distinct_updates
+)
+
+logger = structlog.get_logger()
+
+
+class AsyncRedisClient:
+    """
+    asyncio counterpart of RedisClient, built on redis.asyncio
+    Same key layout and scripts, so sync and async writers can share a Redis
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 max_connections: int = 50, key_layout: str = "string",
+                 expiry_bucket_seconds: int = 60):
+        self.host = host
+        self.port = port
+        self.client = aioredis.Redis(
+            host=host,
+            port=port,
+            db=db,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_keepalive=True,
+            max_connections=max_connections
+        )
+        self.key_layout = make_key_layout(key_layout, expiry_bucket_seconds)
+        self.script_shas: Dict[str, str] = {}
+
+    async def connect(self):
+        """Check the connection and load server-side scripts"""
+        try:
+            await self.client.ping()
+            logger.info("Async Redis client connected", host=self.host, port=self.port)
+        except RedisConnectionError as e:
+            logger.error("Failed to connect to Redis", error=str(e))
+            raise
+
+        await self._load_scripts()
+
+    async def _load_scripts(self):
+        """Load Lua scripts into the Redis script cache"""
+        for name, script in SCRIPTS.items():
+            self.script_shas[name] = await self.client.script_load(script)
+
+    async def set_feature(self, feature_def: FeatureDefinition, entity_id: str, value: Any,
+                          ttl: Optional[int] = None):
+        """Set a feature value in Redis"""
+        await self.set_features([(feature_def, entity_id, value)], ttl=ttl)
+
+    async def set_features(self, updates: List[Tuple[FeatureDefinition, str, Any]],
+                           ttl: Optional[int] = None):
+        """Set many feature values in a single pipelined round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_set(pipeline, updates, time.time(), ttl=ttl)
+
+        try:
+            await pipeline.execute()
+        except Exception as e:
+            logger.error("Failed to set features", count=len(updates), error=str(e))
+
+    async def get_feature(self, feature_def: FeatureDefinition, entity_id: str) -> Optional[Any]:
+        """Get a feature value from Redis"""
+        try:
+            return decode_value((await self.get_raw_values([feature_def], [entity_id]))[0])
+        except Exception as e:
+            logger.error("Failed to get feature",
+                        feature=feature_def.name,
+                        entity_id=entity_id,
+                        error=str(e))
+            return None
+
+    async def get_multiple_features(self, feature_defs: List[FeatureDefinition],
+                                    entity_id: str) -> Dict[str, Any]:
+        """Get multiple features in one call"""
+        values = await self.get_raw_values(feature_defs, [entity_id])
+        return {feature_def.name: decode_value(value) for feature_def, value in zip(feature_defs, values)}
+
+    async def get_features_with_ttl(self, feature_defs: List[FeatureDefinition],
+                                    entity_ids: List[str]) -> FeaturesWithTTL:
+        """Get raw values and remaining TTLs for several entities in one pipelined call"""
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_get_with_ttl(pipeline, feature_defs, entity_ids)
+        return self.key_layout.parse_get_with_ttl(await pipeline.execute(), feature_defs, entity_ids, time.time())
+
+    async def get_feature_matrix(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                                 chunk_size: int = 1000) -> FeatureMatrix:
+        """Get several numeric features for many entities as a dense float matrix, see RedisClient"""
+        return build_feature_matrix(feature_defs, entity_ids,
+                                    await self.get_raw_values(feature_defs, entity_ids, chunk_size))
+
+    async def get_raw_values(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                             chunk_size: int = 1000) -> List[Optional[str]]:
+        """Raw values for entities x features, entity-major, in one pipelined round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_get(pipeline, feature_defs, entity_ids, chunk_size)
+        return self.key_layout.parse_get(await pipeline.execute(), feature_defs, entity_ids, time.time())
+
+    async def get_raw_values_many(self, requests: List[Tuple[List[FeatureDefinition], List[str]]],
+                                  chunk_size: int = 1000) -> List[List[Optional[str]]]:
+        """
+        Raw values for several (features, entity_ids) requests in one pipelined round trip
+        Returns entity-major values per request, as get_raw_values would
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        bounds = []
+        for feature_defs, entity_ids in requests:
+            start = len(pipeline)
+            self.key_layout.queue_get(pipeline, feature_defs, entity_ids, chunk_size)
+            bounds.append((start, len(pipeline)))
+
+        results = await pipeline.execute()
+        now = time.time()
+        return [self.key_layout.parse_get(results[start:end], feature_defs, entity_ids, now)
+                for (feature_defs, entity_ids), (start, end) in zip(requests, bounds)]
+
+    async def update_features_scripted_many(self, updates: List[Tuple[str, List[Tuple[FeatureDefinition, int]]]],
+                                            derived: Optional[List[Tuple[FeatureDefinition, Dict[str, float]]]] = None,
+                                            event_time: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run the update_features script for many entities in one pipelined round trip"""
+        if self.key_layout.name != "string":
+            raise ValueError(f"update_features_scripted_many needs the string key layout, not {self.key_layout.name}")
+        derived = derived or []
+        now = event_time if event_time is not None else time.time()
+
+        calls = build_update_calls(updates, derived, now)
+        results = await self._evalsha_many("update_features", calls)
+        return parse_update_results(updates, derived, results)
+
+    async def update_distinct_many(self, updates: List[Tuple[FeatureDefinition, str, List[str]]],
+                                   event_time: Optional[float] = None) -> List[int]:
+        """PFADD values into per-bucket HyperLogLogs and PFCOUNT each window, one round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        queue_distinct_updates(pipeline, updates, event_time if event_time is not None else time.time())
+        results = await pipeline.execute()
+        return [int(count) for count in results[len(results) - len(updates):]]
+
+    async def _evalsha_many(self, script_name: str, calls: List[Tuple[List[str], List[Any]]]) -> List[Any]:
+        """Pipeline EVALSHA calls, reloading scripts once on NOSCRIPT"""
+        for attempt in range(2):
+            sha = self.script_shas[script_name]
+            pipeline = self.client.pipeline(transaction=False)
+            for keys, args in calls:
+                pipeline.evalsha(sha, len(keys), *keys, *args)
+
+            try:
+                return await pipeline.execute()
+            except NoScriptError:
+                if attempt:
+                    raise
+                logger.warning("Redis script missing, reloading", script=script_name)
+                await self._load_scripts()
+
+        return []
+
+    async def set_entity_states(self, entity_type: str, states: Dict[str, bytes], ttl: Optional[int]):
+        """Store serialized streaming state for many entities in one pipelined round trip (no expiry if ttl is None)"""
+        pipeline = self.client.pipeline(transaction=False)
+        for entity_id, state in states.items():
+            pipeline.set(f"state:{entity_type}:{entity_id}", state, ex=ttl)
+        await pipeline.execute()
+
+    async def get_entity_states(self, entity_type: str, entity_ids: List[str]) -> Dict[str, str]:
+        """Serialized streaming state stored by set_entity_states, removed as it's read (GETDEL)"""
+        pipeline = self.client.pipeline(transaction=False)
+        for entity_id in entity_ids:
+            pipeline.getdel(f"state:{entity_type}:{entity_id}")
+        return {entity_id: state for entity_id, state in zip(entity_ids, await pipeline.execute())
+                if state is not None}
+
+    async def close(self):
+        """Close Redis connections"""
+        await self.client.aclose()
+        logger.info("Async Redis client closed")
@@ -0,0 +1,285 @@
+import math
+import threading
+import time
+import structlog
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from src.common.features import FeatureDefinition
+from src.storage.redis_client import FeatureMatrix, RedisClient, build_feature_matrix, decode_value
+
+logger = structlog.get_logger()
+
+# (feature_name, entity_id)
+CacheKey = Tuple[str, str]
+
+# RedisClient attributes served straight from Redis: uncached reads and writes
+# to keys the cache never holds (update samples, spilled streaming state)
+PASSTHROUGH = frozenset({
+    "key_layout", "get_features_with_ttl", "add_update_sample", "get_update_sample",
+    "set_entity_states", "get_entity_states", "close",
+})
+
+
+class _Fetch:
+    """A Redis read in flight for some keys, awaited by other threads that miss on them"""
+
+    __slots__ = ("done", "values", "error", "stale")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.values: Dict[CacheKey, Optional[str]] = {}
+        self.error: Optional[Exception] = None
+        self.stale = False   # Invalidated while in flight, so the result isn't cached
+
+
+class FeatureCache:
+    """
+    Read-through, in-process cache of online feature values in front of RedisClient
+    Stands in for the client: get_feature, get_multiple_features,
+    get_features_many and get_feature_matrix are served from the cache, misses
+    for the same key across threads share one Redis read, and the methods in
+    PASSTHROUGH go straight to Redis. Feature writes made through the cache
+    invalidate what they overwrite, any other client attribute is an error.
+
+    A value is cached for at most max_staleness_seconds, and never longer than
+    its feature's ttl_seconds. Missing values are cached too. Entries are
+    evicted least recently used beyond max_entries.
+    """
+
+    def __init__(self, redis_client: RedisClient, max_entries: int = 100000,
+                 max_staleness_seconds: float = 5.0):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.max_staleness_seconds = max_staleness_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[Optional[str], float]]" = OrderedDict()  # (raw value, expires at)
+        self._fetches: Dict[CacheKey, _Fetch] = {}
+        self._feature_names: set = set()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0   # Misses served by another thread's read
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # Only what can't touch a cached value is forwarded, so a new feature
+        # write can't skip invalidation by being left out here
+        if name in PASSTHROUGH:
+            return getattr(self.redis, name)
+        raise AttributeError(f"{type(self).__name__} does not support {name!r}")
+
+    def get_feature(self, feature_def: FeatureDefinition, entity_id: str) -> Optional[Any]:
+        """Get a feature value, from the cache if fresh"""
+        try:
+            return decode_value(self.get_raw_values([feature_def], [entity_id])[0])
+        except Exception as e:
+            logger.error("Failed to get feature",
+                        feature=feature_def.name,
+                        entity_id=entity_id,
+                        error=str(e))
+            return None
+
+    def get_multiple_features(self, feature_defs: List[FeatureDefinition], entity_id: str) -> Dict[str, Any]:
+        """Get multiple features of one entity, misses in one Redis read"""
+        values = self.get_raw_values(feature_defs, [entity_id])
+        return {feature_def.name: decode_value(value) for feature_def, value in zip(feature_defs, values)}
+
+    def get_features_many(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                          chunk_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+        """Get several features for many entities, misses in one Redis read"""
+        values = iter(self.get_raw_values(feature_defs, entity_ids, chunk_size))
+        return {entity_id: {feature_def.name: decode_value(next(values)) for feature_def in feature_defs}
+                for entity_id in entity_ids}
+
+    def get_feature_matrix(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                           chunk_size: int = 1000) -> FeatureMatrix:
+        """Get several numeric features for many entities as a dense float matrix"""
+        return build_feature_matrix(feature_defs, entity_ids,
+                                    self.get_raw_values(feature_defs, entity_ids, chunk_size))
+
+    def get_raw_values(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                       chunk_size: int = 1000) -> List[Optional[str]]:
+        """
+        Raw values for entities x features, entity-major
+        Fresh entries are used as is, keys another thread is already reading
+        are waited for, and the rest are read from Redis together
+        """
+        keys = [(feature_def.name, entity_id) for entity_id in entity_ids for feature_def in feature_defs]
+        values: Dict[CacheKey, Optional[str]] = {}
+        leading: Dict[CacheKey, FeatureDefinition] = {}
+        waiting: Dict[CacheKey, _Fetch] = {}
+        fetch = _Fetch()
+        now = time.monotonic()
+
+        with self._lock:
+            for entity_id in entity_ids:
+                for feature_def in feature_defs:
+                    key = (feature_def.name, entity_id)
+                    if key in values or key in leading or key in waiting:
+                        continue
+
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[1] > now:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        values[key] = entry[0]
+                        continue
+
+                    self.misses += 1
+                    in_flight = self._fetches.get(key)
+                    if in_flight is not None:
+                        self.coalesced += 1
+                        waiting[key] = in_flight
+                    else:
+                        self._fetches[key] = fetch
+                        leading[key] = feature_def
+
+        if leading:
+            self._fetch(fetch, leading, chunk_size)
+            values.update(fetch.values)
+
+        for key, in_flight in waiting.items():
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            values[key] = in_flight.values[key]
+
+        return [values[key] for key in keys]
+
+    def _fetch(self, fetch: _Fetch, leading: Dict[CacheKey, FeatureDefinition], chunk_size: int):
+        """Read the keys this thread leads from Redis, cache them and wake any waiters"""
+        feature_defs = list({feature_def.name: feature_def for feature_def in leading.values()}.values())
+        entity_ids = list(dict.fromkeys(entity_id for _, entity_id in leading))
+        started = time.monotonic()
+
+        try:
+            # Entities x features covering every missed key, a few extra keys at most
+            raw = iter(self.redis.get_raw_values(feature_defs, entity_ids, chunk_size))
+            fetched = {(feature_def.name, entity_id): next(raw)
+                       for entity_id in entity_ids for feature_def in feature_defs}
+            fetch.values = {key: fetched[key] for key in leading}
+        except Exception as e:
+            fetch.error = e
+
+        with self._lock:
+            for key, feature_def in leading.items():
+                del self._fetches[key]
+                if fetch.error is None and not fetch.stale:
+                    self._put(key, fetch.values[key], started + self._lifetime(feature_def))
+        fetch.done.set()
+
+        if fetch.error is not None:
+            raise fetch.error
+
+    def _lifetime(self, feature_def: FeatureDefinition) -> float:
+        """How long a value of this feature may be served from the cache"""
+        return min(self.max_staleness_seconds, feature_def.ttl_seconds or math.inf)
+
+    def _put(self, key: CacheKey, value: Optional[str], expires_at: float):
+        """Insert an entry, evicting the least recently used ones if full (lock held)"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        self._feature_names.add(key[0])
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, entity_ids: List[str], feature_names: Optional[List[str]] = None):
+        """
+        Drop cached values of these entities (all features, or just feature_names),
+        e.g. after the local stream processor updated them. Reads in flight for
+        them still return, but their result isn't cached.
+        """
+        with self._lock:
+            # Features being read for the first time aren't in _feature_names yet
+            names = feature_names if feature_names is not None else \
+                self._feature_names | {name for name, _ in self._fetches}
+            for entity_id in entity_ids:
+                for name in names:
+                    self._drop((name, entity_id))
+
+    def clear(self):
+        """Drop every cached value"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            for in_flight in self._fetches.values():
+                in_flight.stale = True
+
+    def set_feature(self, feature_def: FeatureDefinition, entity_id: str, value: Any, ttl: Optional[int] = None):
+        """Set a feature value in Redis and drop the cached one"""
+        self.redis.set_feature(feature_def, entity_id, value, ttl)
+        self.invalidate([entity_id], [feature_def.name])
+
+    def set_features(self, updates: List[Tuple[FeatureDefinition, str, Any]]):
+        """Set many feature values in Redis and drop the cached ones"""
+        self.redis.set_features(updates)
+        with self._lock:
+            for feature_def, entity_id, _ in updates:
+                self._drop((feature_def.name, entity_id))
+
+    def increment_counter(self, feature_def: FeatureDefinition, entity_id: str, amount: int = 1) -> int:
+        """Increment a counter feature in Redis and drop the cached value"""
+        try:
+            return self.redis.increment_counter(feature_def, entity_id, amount)
+        finally:
+            self.invalidate([entity_id], [feature_def.name])
+
+    def update_features_scripted(self, entity_id: str,
+                                 counters: List[Tuple[FeatureDefinition, int]],
+                                 derived: Optional[List[Tuple[FeatureDefinition, Dict[str, float]]]] = None,
+                                 event_time: Optional[float] = None) -> Dict[str, Any]:
+        """Run the scripted update for one entity and drop its cached values"""
+        return self.update_features_scripted_many([(entity_id, counters)], derived, event_time)[0]
+
+    def update_features_scripted_many(self, updates: List[Tuple[str, List[Tuple[FeatureDefinition, int]]]],
+                                      derived: Optional[List[Tuple[FeatureDefinition, Dict[str, float]]]] = None,
+                                      event_time: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run the scripted update for many entities and drop the cached counters and derived values"""
+        try:
+            return self.redis.update_features_scripted_many(updates, derived, event_time)
+        finally:
+            derived_names = [feature_def.name for feature_def, _ in derived or []]
+            with self._lock:
+                for entity_id, counters in updates:
+                    for feature_def, _ in counters:
+                        self._drop((feature_def.name, entity_id))
+                    for name in derived_names:
+                        self._drop((name, entity_id))
+
+    def update_distinct_many(self, updates: List[Tuple[FeatureDefinition, str, List[str]]],
+                             event_time: Optional[float] = None) -> List[int]:
+        """Add values to DISTINCT features' sketches in Redis and drop the cached values"""
+        try:
+            return self.redis.update_distinct_many(updates, event_time)
+        finally:
+            with self._lock:
+                for feature_def, entity_id, _ in updates:
+                    self._drop((feature_def.name, entity_id))
+
+    def _drop(self, key: CacheKey):
+        """Remove an entry and keep an in-flight read of it from being cached (lock held)"""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+        in_flight = self._fetches.get(key)
+        if in_flight is not None:
+            in_flight.stale = True
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss/coalesced/eviction/invalidation counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
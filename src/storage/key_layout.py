@@ -0,0 +1,200 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+from src.common.features import FeatureDefinition, entity_hash_key
+
+# (feature, entity_id, value) writes, as taken by RedisClient.set_features
+FeatureUpdate = Tuple[FeatureDefinition, str, Any]
+
+# (feature, entity_id, value, ttl seconds) writes with their own TTL, 0 for none
+FeatureUpdateWithTTL = Tuple[FeatureDefinition, str, Any, int]
+
+# {entity_id: {feature_name: (raw value, remaining ttl seconds)}}, ttl is -1 for no expiry, -2 if missing
+FeaturesWithTTL = Dict[str, Dict[str, Tuple[Optional[str], int]]]
+
+
+def feature_keys(feature_defs: List[FeatureDefinition], entity_ids: List[str]) -> List[str]:
+    """Redis keys for entities x features, entity-major"""
+    return [feature_def.get_redis_key(entity_id) for entity_id in entity_ids for feature_def in feature_defs]
+
+
+def chunked(items: List[Any], chunk_size: int) -> List[List[Any]]:
+    """items split into lists of at most chunk_size"""
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+
+def encode_value(value: Any) -> Any:
+    """Feature value as stored, JSON for dicts and lists"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class StringKeyLayout:
+    """
+    One string key per feature and entity, feature:{name}:{entity_id}
+    Expiry is the key's own TTL
+    """
+
+    name = "string"
+
+    def queue_set(self, pipeline, updates: List[FeatureUpdate], now: float, ttl: Optional[int] = None):
+        """Queue writes of feature values, ttl overrides the features' own"""
+        self.queue_set_with_ttl(pipeline, [(feature_def, entity_id, value, ttl or feature_def.ttl_seconds or 0)
+                                           for feature_def, entity_id, value in updates], now)
+
+    def queue_set_with_ttl(self, pipeline, updates: List[FeatureUpdateWithTTL], now: float,
+                           if_missing: bool = False):
+        """Queue writes of feature values that each carry their TTL, if_missing keeps existing values"""
+        for feature_def, entity_id, value, ttl in updates:
+            pipeline.set(feature_def.get_redis_key(entity_id), encode_value(value), ex=ttl or None, nx=if_missing)
+
+    def queue_get(self, pipeline, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                  chunk_size: int = 1000):
+        """Queue MGETs of at most chunk_size keys for entities x features"""
+        for chunk in chunked(feature_keys(feature_defs, entity_ids), chunk_size):
+            pipeline.mget(chunk)
+
+    def parse_get(self, results: List[Any], feature_defs: List[FeatureDefinition],
+                  entity_ids: List[str], now: float) -> List[Optional[str]]:
+        """Raw values queued by queue_get, entity-major, None where missing"""
+        return [value for values in results for value in values]
+
+    def queue_get_with_ttl(self, pipeline, feature_defs: List[FeatureDefinition], entity_ids: List[str]):
+        """Queue a GET and a TTL per key"""
+        for key in feature_keys(feature_defs, entity_ids):
+            pipeline.get(key)
+            pipeline.ttl(key)
+
+    def parse_get_with_ttl(self, results: List[Any], feature_defs: List[FeatureDefinition],
+                           entity_ids: List[str], now: float) -> FeaturesWithTTL:
+        """Values and remaining TTLs queued by queue_get_with_ttl"""
+        pairs = iter(zip(results[::2], results[1::2]))
+        features: FeaturesWithTTL = {}
+        for entity_id in entity_ids:
+            entity_features = features.setdefault(entity_id, {})
+            for feature_def in feature_defs:
+                value, ttl = next(pairs)
+                entity_features[feature_def.name] = (value, int(ttl))
+        return features
+
+
+class HashKeyLayout:
+    """
+    One hash per entity, h:{u|p}:{entity_id}, with a short field per feature
+    (FeatureDefinition.field_code). Small hashes are stored as listpacks, so an
+    entity costs one key's overhead instead of one per feature, and all of its
+    features are read with one HMGET and written with one HSET.
+
+    Redis can't expire single hash fields (before 7.4), so each field is stored
+    as "{expiry bucket}|{value}": the bucket is the expiry time in units of
+    expiry_bucket_seconds, rounded up, and readers treat a field past it as
+    missing. The hash itself expires with its longest-lived field.
+    """
+
+    name = "hash"
+
+    def __init__(self, expiry_bucket_seconds: int = 60):
+        self.expiry_bucket_seconds = expiry_bucket_seconds
+
+    def encode_field(self, value: Any, ttl: int, now: float) -> str:
+        """Field value with its expiry bucket"""
+        return f"{math.ceil((now + ttl) / self.expiry_bucket_seconds)}|{encode_value(value)}"
+
+    def decode_field(self, raw: Optional[str], now: float) -> Tuple[Optional[str], int]:
+        """(value, remaining ttl seconds) of a stored field, (None, -2) if it's missing or expired"""
+        if raw is None:
+            return None, -2
+        bucket, _, value = raw.partition("|")
+        remaining = int(bucket) * self.expiry_bucket_seconds - now
+        if remaining <= 0:
+            return None, -2
+        return value, int(remaining)
+
+    def _fields(self, feature_defs: List[FeatureDefinition]) -> Dict[str, List[Tuple[int, str]]]:
+        """Per entity_key (i.e. hash), (position in feature_defs, field code) of each feature"""
+        groups: Dict[str, List[Tuple[int, str]]] = {}
+        for position, feature_def in enumerate(feature_defs):
+            if not feature_def.field_code:
+                raise ValueError(f"Feature {feature_def.name} has no field_code for the hash layout")
+            groups.setdefault(feature_def.entity_key, []).append((position, feature_def.field_code))
+        return groups
+
+    def queue_set(self, pipeline, updates: List[FeatureUpdate], now: float, ttl: Optional[int] = None):
+        """Queue one HSET per entity, ttl overrides the features' own"""
+        self.queue_set_with_ttl(pipeline, [(feature_def, entity_id, value, ttl or feature_def.ttl_seconds or 0)
+                                           for feature_def, entity_id, value in updates], now)
+
+    def queue_set_with_ttl(self, pipeline, updates: List[FeatureUpdateWithTTL], now: float,
+                           if_missing: bool = False):
+        """
+        Queue one HSET per entity, then extend the hash's expiry to its longest-lived field
+        if_missing keeps existing fields (one HSETNX per field instead)
+        """
+        hashes: Dict[str, Dict[str, str]] = {}
+        hash_ttls: Dict[str, int] = {}
+        for feature_def, entity_id, value, feature_ttl in updates:
+            if not feature_ttl:
+                raise ValueError(f"Feature {feature_def.name} needs a TTL for the hash layout")
+            if not feature_def.field_code:
+                raise ValueError(f"Feature {feature_def.name} has no field_code for the hash layout")
+
+            key = feature_def.get_redis_hash_key(entity_id)
+            hashes.setdefault(key, {})[feature_def.field_code] = self.encode_field(value, feature_ttl, now)
+            hash_ttls[key] = max(hash_ttls.get(key, 0), feature_ttl + self.expiry_bucket_seconds)
+
+        for key, fields in hashes.items():
+            if if_missing:
+                for field, value in fields.items():
+                    pipeline.hsetnx(key, field, value)
+            else:
+                pipeline.hset(key, mapping=fields)
+            # NX covers a new hash, GT only ever extends an existing one
+            pipeline.expire(key, hash_ttls[key], nx=True)
+            pipeline.expire(key, hash_ttls[key], gt=True)
+
+    def queue_get(self, pipeline, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                  chunk_size: int = 1000):
+        """Queue one HMGET per entity (and entity_key, if features of several are mixed)"""
+        groups = self._fields(feature_defs)
+        for entity_id in entity_ids:
+            for entity_key, fields in groups.items():
+                pipeline.hmget(entity_hash_key(entity_key, entity_id), [code for _, code in fields])
+
+    def parse_get(self, results: List[Any], feature_defs: List[FeatureDefinition],
+                  entity_ids: List[str], now: float) -> List[Optional[str]]:
+        """Raw values queued by queue_get, entity-major, None where missing or expired"""
+        return [value for value, _ in self._parse(results, feature_defs, entity_ids, now)]
+
+    def queue_get_with_ttl(self, pipeline, feature_defs: List[FeatureDefinition], entity_ids: List[str]):
+        """Queue one HMGET per entity, the TTLs are in the fields"""
+        self.queue_get(pipeline, feature_defs, entity_ids)
+
+    def parse_get_with_ttl(self, results: List[Any], feature_defs: List[FeatureDefinition],
+                           entity_ids: List[str], now: float) -> FeaturesWithTTL:
+        """Values and remaining TTLs queued by queue_get_with_ttl"""
+        decoded = iter(self._parse(results, feature_defs, entity_ids, now))
+        return {entity_id: {feature_def.name: next(decoded) for feature_def in feature_defs}
+                for entity_id in entity_ids}
+
+    def _parse(self, results: List[Any], feature_defs: List[FeatureDefinition],
+               entity_ids: List[str], now: float) -> List[Tuple[Optional[str], int]]:
+        """Decoded (value, ttl) per entity x feature, entity-major"""
+        groups = list(self._fields(feature_defs).values())
+        num_features = len(feature_defs)
+        decoded: List[Tuple[Optional[str], int]] = [(None, -2)] * (len(entity_ids) * num_features)
+        replies = iter(results)
+        for row in range(0, len(decoded), num_features):
+            for fields in groups:
+                for (position, _), raw in zip(fields, next(replies)):
+                    decoded[row + position] = self.decode_field(raw, now)
+        return decoded
+
+
+def make_key_layout(name: str = "string", expiry_bucket_seconds: int = 60):
+    """Key layout by name, string or hash"""
+    if name == HashKeyLayout.name:
+        return HashKeyLayout(expiry_bucket_seconds)
+    if name == StringKeyLayout.name:
+        return StringKeyLayout()
+    raise ValueError(f"Unknown Redis key layout {name!r}, expected 'string' or 'hash'")
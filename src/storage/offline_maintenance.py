@@ -0,0 +1,69 @@
+import time
+import structlog
+from datetime import datetime
+from typing import Any, Dict
+from src.storage.postgres_client import PostgresClient
+
+logger = structlog.get_logger()
+
+
+class OfflineFeatureMaintenance:
+    """
+    Partition upkeep for offline_features
+    Each pass creates the next days_ahead daily partitions (and any missed
+    ones, moving their rows out of the default partition), drops partitions
+    past retention_days, and compacts partitions older than compact_after_days
+    down to one value per entity, feature and compaction_interval_seconds
+    """
+
+    def __init__(self, postgres_client: PostgresClient, days_ahead: int = 7,
+                 retention_days: int = 90, compact_after_days: int = 7,
+                 compaction_interval_seconds: int = 3600):
+        self.postgres = postgres_client
+        self.days_ahead = days_ahead
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days   # 0 disables compaction
+        self.compaction_interval_seconds = compaction_interval_seconds
+
+    def run_once(self) -> Dict[str, Any]:
+        """One maintenance pass, returns what it did"""
+        created = self.postgres.create_offline_partitions(days_back=1, days_ahead=self.days_ahead)
+        dropped = self.postgres.drop_offline_partitions(self.retention_days)
+
+        compacted = {}
+        if self.compact_after_days > 0:
+            today = datetime.utcnow().date()
+            for partition in self.postgres.list_offline_partitions():
+                if (today - partition['day']).days <= self.compact_after_days:
+                    continue
+                if partition['compacted_interval_seconds'] == self.compaction_interval_seconds:
+                    continue
+
+                start = time.perf_counter()
+                counts = self.postgres.compact_offline_partition(partition['partition_name'],
+                                                                 self.compaction_interval_seconds)
+                compacted[partition['partition_name']] = counts['rows_after']
+                logger.info("Compacted offline partition",
+                           partition=partition['partition_name'],
+                           duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                           **counts)
+
+        summary = {'created': created, 'dropped': dropped, 'compacted': compacted}
+        logger.info("Offline feature maintenance complete",
+                   created=created, dropped=len(dropped), compacted=len(compacted))
+        return summary
+
+    def run(self, interval_seconds: float = 3600.0):
+        """Run maintenance passes until interrupted"""
+        logger.info("Starting offline feature maintenance", interval=interval_seconds,
+                   retention_days=self.retention_days,
+                   compact_after_days=self.compact_after_days)
+        try:
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error("Offline feature maintenance failed", error=str(e))
+                time.sleep(interval_seconds)
+        except KeyboardInterrupt:
+            logger.info("Stopping offline feature maintenance")
@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+import structlog
+import psycopg2
+from typing import List, Dict, Any, Optional
+from src.storage.postgres_client import PostgresClient, OfflineFeatureRow
+
+logger = structlog.get_logger()
+
+
+class OfflineFeatureWriter:
+    """
+    Background writer for the offline_features history table
+    Rows are buffered in a bounded queue and flushed with COPY when either
+    flush_rows are waiting or flush_interval_ms has passed since the last flush
+    """
+
+    def __init__(self, postgres_client: PostgresClient, max_queue_size: int = 100000,
+                 flush_rows: int = 5000, flush_interval_ms: int = 1000,
+                 put_timeout: Optional[float] = None, max_retries: int = 3):
+        self.postgres = postgres_client
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.put_timeout = put_timeout   # None = block until there is room
+        self.max_retries = max_retries
+
+        # Bounded so a slow database pushes back on the stream processor
+        self.queue: "queue.Queue[OfflineFeatureRow]" = queue.Queue(maxsize=max_queue_size)
+
+        self._stop = threading.Event()
+        self._flush_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Counters
+        self._stats_lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.backpressure_waits = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        logger.info("OfflineFeatureWriter initialized",
+                   max_queue_size=max_queue_size,
+                   flush_rows=flush_rows,
+                   flush_interval_ms=flush_interval_ms)
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="offline-feature-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row: OfflineFeatureRow):
+        """Queue a row, blocking while the queue is full"""
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self.backpressure_waits += 1
+            self._flush_requested.set()
+            # Raises queue.Full if put_timeout expires
+            self.queue.put(row, timeout=self.put_timeout)
+
+        # Size threshold reached, don't wait for the interval
+        if self.queue.qsize() >= self.flush_rows:
+            self._flush_requested.set()
+
+    def write_many(self, rows: List[OfflineFeatureRow]):
+        """Queue several rows, blocking while the queue is full"""
+        for row in rows:
+            self.write(row)
+
+    def flush(self, wait: bool = False, timeout: float = 30.0) -> bool:
+        """
+        Ask the background thread to flush now instead of waiting for a threshold
+        With wait, block until every row queued so far is written (or dropped
+        after retries), returns False if that took longer than timeout.
+        """
+        self._flush_requested.set()
+        if not wait:
+            return True
+        if self._thread is None:
+            self._drain()
+            return True
+
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Offline writer flush timed out", queue_depth=self.queue.qsize())
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Stop the writer, flushing everything still queued"""
+        self._stop.set()
+        self._flush_requested.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Offline writer did not finish flushing", queue_depth=self.queue.qsize())
+            self._thread = None
+        else:
+            # Never started, so drain on the caller's thread
+            self._drain()
+
+        logger.info("OfflineFeatureWriter closed", **self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth and flush counters"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'rows_written': self.rows_written,
+                'rows_dropped': self.rows_dropped,
+                'flushes': self.flush_count,
+                'failed_flushes': self.failed_flushes,
+                'backpressure_waits': self.backpressure_waits,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'max_flush_ms': round(self.max_flush_ms, 2),
+                'avg_flush_ms': round(self.total_flush_ms / self.flush_count, 2) if self.flush_count else 0.0,
+            }
+
+    def _run(self):
+        """Flush loop, exits once stopped and the queue is empty"""
+        while True:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+
+            stopping = self._stop.is_set()
+            self._drain()
+
+            if stopping and self.queue.empty():
+                return
+
+    def _drain(self):
+        """Flush queued rows in chunks of at most flush_rows"""
+        while True:
+            rows = self._take(self.flush_rows)
+            if not rows:
+                return
+
+            self._flush(rows)
+
+            # A partial chunk means the queue is drained for now
+            if len(rows) < self.flush_rows:
+                return
+
+    def _take(self, max_rows: int) -> List[OfflineFeatureRow]:
+        """Pop up to max_rows without blocking"""
+        rows = []
+        while len(rows) < max_rows:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _flush(self, rows: List[OfflineFeatureRow]):
+        """Write rows with COPY, retrying with backoff before giving up on them"""
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                try:
+                    self.postgres.copy_offline_features(rows)
+                except psycopg2.IntegrityError:
+                    # COPY is all-or-nothing, so fall back to an INSERT that skips duplicates
+                    self.postgres.store_offline_features(rows, skip_duplicates=True)
+
+                flush_ms = (time.perf_counter() - start) * 1000
+                with self._stats_lock:
+                    self.rows_written += len(rows)
+                    self.flush_count += 1
+                    self.last_flush_ms = flush_ms
+                    self.max_flush_ms = max(self.max_flush_ms, flush_ms)
+                    self.total_flush_ms += flush_ms
+
+                logger.debug("Flushed offline features", rows=len(rows), duration_ms=round(flush_ms, 2))
+                self._done(rows)
+                return
+
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed_flushes += 1
+                logger.error("Failed to flush offline features",
+                            rows=len(rows), attempt=attempt, error=str(e))
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt * 0.1, 5.0))
+
+        with self._stats_lock:
+            self.rows_dropped += len(rows)
+        logger.error("Dropped offline feature rows after retries", rows=len(rows))
+        self._done(rows)
+
+    def _done(self, rows: List[OfflineFeatureRow]):
+        """Mark rows taken from the queue as handled, for flush(wait=True)"""
+        for _ in rows:
+            self.queue.task_done()
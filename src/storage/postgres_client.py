@@ -1,17 +1,94 @@
+import csv
+import io
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import weakref
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from typing import List, Dict, Any, Optional, NamedTuple, Set
 import structlog
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 
 logger = structlog.get_logger()
 
 
+class OfflineFeatureRow(NamedTuple):
+    """One row of the offline_features history table"""
+    entity_id: str
+    entity_type: str
+    feature_name: str
+    feature_value: str
+    computed_at: datetime
+
+
+class ConsistencyCheckRow(NamedTuple):
+    """One row of the consistency_checks table"""
+    check_time: datetime
+    entity_id: str
+    entity_type: str
+    feature_name: str
+    online_value: Optional[str]
+    offline_value: Optional[str]
+    is_consistent: bool
+    difference: Optional[str]
+
+
+# Hot-path statements, prepared server-side once per pooled connection
+PREPARED_STATEMENTS = {
+    "insert_offline_feature": """
+        PREPARE insert_offline_feature (text, text, text, text, timestamp) AS
+        INSERT INTO offline_features 
+        (entity_id, entity_type, feature_name, feature_value, computed_at)
+        VALUES ($1, $2, $3, $4, $5)
+    """,
+    "select_latest_offline_feature": """
+        PREPARE select_latest_offline_feature (text, text, text) AS
+        SELECT feature_value, computed_at
+        FROM latest_features
+        WHERE entity_id = $1 
+          AND entity_type = $2 
+          AND feature_name = $3
+    """,
+    # The latest value answers most as-of reads by primary key. Otherwise partitions
+    # after $4 are pruned and the rest are scanned newest first until one has a row.
+    "select_offline_feature_as_of": """
+        PREPARE select_offline_feature_as_of (text, text, text, timestamp) AS
+        (SELECT feature_value, computed_at
+         FROM latest_features
+         WHERE entity_id = $1
+           AND entity_type = $2
+           AND feature_name = $3
+           AND computed_at <= $4)
+        UNION ALL
+        (SELECT feature_value, computed_at 
+         FROM offline_features
+         WHERE entity_id = $1 
+           AND entity_type = $2 
+           AND feature_name = $3
+           AND computed_at <= $4
+         ORDER BY computed_at DESC
+         LIMIT 1)
+        LIMIT 1
+    """,
+    "insert_consistency_check": """
+        PREPARE insert_consistency_check (timestamp, text, text, text, text, text, boolean, text) AS
+        INSERT INTO consistency_checks
+        (check_time, entity_id, entity_type, feature_name, 
+         online_value, offline_value, is_consistent, difference)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    """,
+}
+
+
 class PostgresClient:
     def __init__(self, host: str = "localhost", port: int = 5432, 
                  database: str = "featurestore", user: str = "featurestore", 
-                 password: str = "featurestore"):
+                 password: str = "featurestore",
+                 min_connections: int = 2, max_connections: int = 10,
+                 health_check_interval: float = 30.0):
         self.conn_params = {
             'host': host,
             'port': port,
@@ -20,6 +97,24 @@ class PostgresClient:
             'password': password
         }
         
+        self.health_check_interval = health_check_interval
+        
+        # ThreadedConnectionPool raises when exhausted, so callers wait on this instead
+        self._pool_slots = threading.BoundedSemaphore(max_connections)
+        
+        # Per-connection bookkeeping, dropped automatically once a connection is gone
+        self._last_used: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+        self._prepared: "weakref.WeakKeyDictionary[Any, Set[str]]" = weakref.WeakKeyDictionary()
+        
+        # Thread-safe connection pool shared by every caller of get_connection
+        # (min_connections are kept open when idle, extra ones are closed on release)
+        try:
+            self.pool = ThreadedConnectionPool(min_connections, max_connections,
+                                               **self.conn_params)
+        except Exception as e:
+            logger.error("Failed to create PostgreSQL connection pool", error=str(e))
+            raise
+        
         # Test connection
         try:
             with self.get_connection() as conn:
@@ -33,17 +128,88 @@ class PostgresClient:
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = psycopg2.connect(**self.conn_params)
+        """Context manager for pooled database connections"""
+        conn = self._acquire_connection()
+        broken = False
         try:
             yield conn
             conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # Connection-level failure, so don't hand this connection out again
+            broken = True
+            logger.error("Database connection error", error=str(e))
+            raise
         except Exception as e:
             conn.rollback()
             logger.error("Database error", error=str(e))
             raise
         finally:
-            conn.close()
+            self._release_connection(conn, discard=broken or bool(conn.closed))
+    
+    def _acquire_connection(self):
+        """Borrow a healthy connection from the pool, reconnecting if needed"""
+        self._pool_slots.acquire()
+        try:
+            # Every idle connection may be stale (e.g. after a server restart),
+            # so keep discarding until the pool has to open a fresh one
+            for attempt in range(self.pool.minconn + 1):
+                conn = self.pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                
+                logger.warning("Discarding unhealthy pooled connection", attempt=attempt)
+                self._forget_connection(conn)
+                self.pool.putconn(conn, close=True)
+            
+            raise psycopg2.OperationalError("Could not obtain a healthy PostgreSQL connection")
+        except Exception:
+            self._pool_slots.release()
+            raise
+    
+    def _release_connection(self, conn, discard: bool = False):
+        """Return a connection to the pool, or close it"""
+        try:
+            if discard:
+                self._forget_connection(conn)
+                self.pool.putconn(conn, close=True)
+            else:
+                self._last_used[conn] = time.monotonic()
+                self.pool.putconn(conn)
+        finally:
+            self._pool_slots.release()
+    
+    def _is_healthy(self, conn) -> bool:
+        """Check a pooled connection, pinging it only if it has been idle a while"""
+        if conn.closed:
+            return False
+        
+        last_used = self._last_used.get(conn)
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning("PostgreSQL health check failed", error=str(e))
+            return False
+    
+    def _forget_connection(self, conn):
+        """Drop bookkeeping for a connection that is being closed"""
+        self._last_used.pop(conn, None)
+        self._prepared.pop(conn, None)
+    
+    def _execute_prepared(self, cur, name: str, params: tuple):
+        """Execute a hot-path statement, preparing it on this connection first if needed"""
+        prepared = self._prepared.setdefault(cur.connection, set())
+        if name not in prepared:
+            cur.execute(PREPARED_STATEMENTS[name])
+            prepared.add(name)
+        
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
     
     def store_offline_feature(self, entity_id: str, entity_type: str,
                               feature_name: str, feature_value: str,
@@ -52,17 +218,52 @@ class PostgresClient:
         if computed_at is None:
             computed_at = datetime.utcnow()
         
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                self._execute_prepared(cur, "insert_offline_feature",
+                                       (entity_id, entity_type, feature_name,
+                                        str(feature_value), computed_at))
+    
+    def store_offline_features(self, rows: List[OfflineFeatureRow], page_size: int = 1000,
+                               skip_duplicates: bool = False):
+        """Store many feature values in a single multi-row INSERT and commit"""
+        if not rows:
+            return
+
         query = """
             INSERT INTO offline_features 
             (entity_id, entity_type, feature_name, feature_value, computed_at)
-            VALUES (%s, %s, %s, %s, %s)
+            VALUES %s
         """
-        
+        if skip_duplicates:
+            query += " ON CONFLICT DO NOTHING"
+
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(query, (entity_id, entity_type, feature_name, 
-                                   str(feature_value), computed_at))
-    
+                execute_values(cur, query, rows, page_size=page_size)
+
+    def copy_offline_features(self, rows: List[OfflineFeatureRow]):
+        """Bulk load feature values with COPY (all rows or none)"""
+        if not rows:
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow((row.entity_id, row.entity_type, row.feature_name,
+                             str(row.feature_value), row.computed_at.isoformat()))
+        buffer.seek(0)
+
+        query = """
+            COPY offline_features 
+            (entity_id, entity_type, feature_name, feature_value, computed_at)
+            FROM STDIN WITH (FORMAT csv)
+        """
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.copy_expert(query, buffer)
+
     def get_offline_feature(self, entity_id: str, entity_type: str,
                            feature_name: str, 
                            timestamp: Optional[datetime] = None) -> Optional[str]:
@@ -71,50 +272,204 @@ class PostgresClient:
         If no timestamp provided, gets the latest value
         """
         if timestamp:
-            query = """
-                SELECT feature_value, computed_at 
-                FROM offline_features
-                WHERE entity_id = %s 
-                  AND entity_type = %s 
-                  AND feature_name = %s
-                  AND computed_at <= %s
-                ORDER BY computed_at DESC
-                LIMIT 1
-            """
+            name = "select_offline_feature_as_of"
             params = (entity_id, entity_type, feature_name, timestamp)
         else:
-            query = """
-                SELECT feature_value, computed_at
-                FROM offline_features
-                WHERE entity_id = %s 
-                  AND entity_type = %s 
-                  AND feature_name = %s
-                ORDER BY computed_at DESC
-                LIMIT 1
-            """
+            name = "select_latest_offline_feature"
             params = (entity_id, entity_type, feature_name)
         
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query, params)
+                self._execute_prepared(cur, name, params)
                 result = cur.fetchone()
                 return result['feature_value'] if result else None
     
+    def get_latest_offline_features(self, entity_ids: List[str], entity_type: str,
+                                    feature_names: List[str]) -> Dict[tuple, str]:
+        """
+        Latest offline value of every (entity, feature) pair in one query
+        Primary-key lookups on latest_features, one per pair
+        Returns {(entity_id, feature_name): feature_value}, missing pairs are absent
+        """
+        if not entity_ids or not feature_names:
+            return {}
+
+        query = """
+            SELECT entity_id, feature_name, feature_value
+            FROM latest_features
+            WHERE entity_type = %s
+              AND entity_id = ANY(%s)
+              AND feature_name = ANY(%s)
+        """
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, (entity_type, list(entity_ids), list(feature_names)))
+                return {(entity_id, feature_name): value
+                        for entity_id, feature_name, value in cur.fetchall()}
+
+    def rebuild_latest_features(self, entity_type: Optional[str] = None) -> int:
+        """
+        Recompute latest_features from the offline_features history
+        Runs in one transaction, readers keep seeing the old rows until it commits,
+        and values written concurrently by the trigger are kept if they're newer.
+        Returns the number of latest values written.
+        """
+        where = "WHERE entity_type = %s" if entity_type else ""
+        params = (entity_type,) if entity_type else ()
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"DELETE FROM latest_features {where}", params)
+                cur.execute(f"""
+                    INSERT INTO latest_features
+                    (entity_type, entity_id, feature_name, feature_value, computed_at)
+                    SELECT DISTINCT ON (entity_type, entity_id, feature_name)
+                        entity_type, entity_id, feature_name, feature_value, computed_at
+                    FROM offline_features
+                    {where}
+                    ORDER BY entity_type, entity_id, feature_name, computed_at DESC
+                    ON CONFLICT (entity_type, entity_id, feature_name) DO UPDATE
+                        SET feature_value = EXCLUDED.feature_value,
+                            computed_at = EXCLUDED.computed_at
+                        WHERE latest_features.computed_at <= EXCLUDED.computed_at
+                """, params)
+                rebuilt = cur.rowcount
+
+        logger.info("Rebuilt latest_features", entity_type=entity_type, rows=rebuilt)
+        return rebuilt
+
+    def get_offline_feature_history(self, entity_ids: List[str], entity_type: str,
+                                    feature_names: List[str],
+                                    start: Optional[datetime] = None,
+                                    end: Optional[datetime] = None,
+                                    itersize: int = 10000) -> List[tuple]:
+        """
+        Every stored value of the given features for the given entities, in bulk
+        Rows are (entity_id, feature_name, feature_value, computed_at), streamed
+        from a server-side cursor itersize rows at a time so the result set is
+        never materialized twice. start/end bound computed_at (both inclusive).
+        """
+        if not entity_ids or not feature_names:
+            return []
+
+        query = """
+            SELECT entity_id, feature_name, feature_value, computed_at
+            FROM offline_features
+            WHERE entity_type = %s
+              AND entity_id = ANY(%s)
+              AND feature_name = ANY(%s)
+        """
+        params: List[Any] = [entity_type, list(entity_ids), list(feature_names)]
+        if start is not None:
+            query += " AND computed_at >= %s"
+            params.append(start)
+        if end is not None:
+            query += " AND computed_at <= %s"
+            params.append(end)
+
+        rows: List[tuple] = []
+        with self.get_connection() as conn:
+            # Named cursor = server-side, closed (and its portal freed) on exit
+            with conn.cursor(name="offline_feature_history") as cur:
+                cur.itersize = itersize
+                cur.execute(query, params)
+                while True:
+                    batch = cur.fetchmany(itersize)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+        return rows
+
+    def create_offline_partitions(self, days_back: int = 1, days_ahead: int = 7) -> int:
+        """Make sure daily offline_features partitions exist around today, returns how many were created"""
+        today = datetime.utcnow().date()
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT create_offline_feature_partitions(%s, %s)",
+                            (today - timedelta(days=days_back), today + timedelta(days=days_ahead)))
+                return cur.fetchone()[0]
+
+    def drop_offline_partitions(self, retention_days: int) -> List[str]:
+        """Drop daily partitions older than retention_days, returns the dropped partition names"""
+        before = datetime.utcnow().date() - timedelta(days=retention_days)
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT drop_offline_feature_partitions(%s)", (before,))
+                return [row[0] for row in cur.fetchall()]
+
+    def list_offline_partitions(self) -> List[Dict[str, Any]]:
+        """Daily offline_features partitions, oldest first, with whether they're compacted"""
+        query = """
+            SELECT c.relname AS partition_name,
+                   to_date(substring(c.relname from 19), 'YYYYMMDD') AS day,
+                   oc.interval_seconds AS compacted_interval_seconds
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            LEFT JOIN offline_feature_compactions oc ON oc.partition_name = c.relname
+            WHERE i.inhparent = 'offline_features'::regclass
+              AND c.relname ~ '^offline_features_p[0-9]{8}$'
+            ORDER BY c.relname
+        """
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query)
+                return [dict(row) for row in cur.fetchall()]
+
+    def compact_offline_partition(self, partition_name: str, interval_seconds: int) -> Dict[str, int]:
+        """
+        Downsample one partition to the last value per entity, feature and interval
+        Keeping the last value of each interval means as-of reads at interval
+        boundaries are unchanged. The partition is rewritten in one transaction,
+        directly rather than through offline_features, so latest_features isn't touched.
+        """
+        partition = sql.Identifier(partition_name)
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(partition))
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(partition))
+                rows_before = cur.fetchone()[0]
+
+                cur.execute(sql.SQL("""
+                    CREATE TEMP TABLE compacted_features ON COMMIT DROP AS
+                    SELECT DISTINCT ON (entity_id, entity_type, feature_name, bucket)
+                        entity_id, entity_type, feature_name, feature_value, computed_at
+                    FROM (
+                        SELECT *, floor(extract(epoch FROM computed_at) / %s) AS bucket
+                        FROM {}
+                    ) history
+                    ORDER BY entity_id, entity_type, feature_name, bucket, computed_at DESC
+                """).format(partition), (interval_seconds,))
+                rows_after = cur.rowcount
+
+                cur.execute(sql.SQL("TRUNCATE {}").format(partition))
+                cur.execute(sql.SQL("""
+                    INSERT INTO {}
+                    (entity_id, entity_type, feature_name, feature_value, computed_at)
+                    SELECT entity_id, entity_type, feature_name, feature_value, computed_at
+                    FROM compacted_features
+                """).format(partition))
+                cur.execute("""
+                    INSERT INTO offline_feature_compactions
+                    (partition_name, interval_seconds, rows_before, rows_after)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (partition_name) DO UPDATE
+                        SET interval_seconds = EXCLUDED.interval_seconds,
+                            rows_before = EXCLUDED.rows_before,
+                            rows_after = EXCLUDED.rows_after,
+                            compacted_at = CURRENT_TIMESTAMP
+                """, (partition_name, interval_seconds, rows_before, rows_after))
+
+        return {'rows_before': rows_before, 'rows_after': rows_after}
+
     def record_consistency_check(self, entity_id: str, entity_type: str,
                                  feature_name: str, online_value: Any,
                                  offline_value: Any, is_consistent: bool,
                                  difference: Optional[str] = None):
         """Record the result of an online/offline consistency check"""
-        query = """
-            INSERT INTO consistency_checks
-            (check_time, entity_id, entity_type, feature_name, 
-             online_value, offline_value, is_consistent, difference)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(query, (
+                self._execute_prepared(cur, "insert_consistency_check", (
                     datetime.utcnow(),
                     entity_id,
                     entity_type,
@@ -125,6 +480,22 @@ class PostgresClient:
                     difference
                 ))
     
+    def record_consistency_checks(self, rows: List[ConsistencyCheckRow], page_size: int = 1000):
+        """Record many consistency check results in a single multi-row INSERT and commit"""
+        if not rows:
+            return
+
+        query = """
+            INSERT INTO consistency_checks
+            (check_time, entity_id, entity_type, feature_name,
+             online_value, offline_value, is_consistent, difference)
+            VALUES %s
+        """
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, query, rows, page_size=page_size)
+
     def get_consistency_stats(self, hours: int = 24) -> Dict[str, Any]:
         """Get consistency check statistics for the last N hours"""
         query = """
@@ -139,4 +510,11 @@ class PostgresClient:
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (hours,))
-                return dict(cur.fetchone())
\ No newline at end of file
+                return dict(cur.fetchone())
+    
+    def close(self):
+        """Close all pooled PostgreSQL connections"""
+        self.pool.closeall()
+        self._last_used.clear()
+        self._prepared.clear()
+        logger.info("PostgreSQL client closed")
@@ -1,14 +1,231 @@
 import redis
 import json
+import math
+import time
 import structlog
-from typing import Optional, Dict, Any
+import numpy as np
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple
 from src.common.features import FeatureDefinition
+from src.storage.key_layout import FeaturesWithTTL, make_key_layout
 
 logger = structlog.get_logger()
 
 
+# Atomic multi-feature update, run with EVALSHA
+# KEYS: per counter (value key, bucket hash key), then one key per derived feature
+# ARGV: now, n_counters, n_derived,
+#       per counter (amount, ttl, bucket_seconds, num_buckets),
+#       per derived (ttl, n_terms, (counter_index, weight) * n_terms)
+# Windowed counters (bucket_seconds > 0) keep one hash field per time bucket and
+# store the window total in the value key, so readers still see a plain string.
+# Returns the new value of every counter then every derived feature, as strings.
+UPDATE_FEATURES_SCRIPT = """
+local now = tonumber(ARGV[1])
+local n_counters = tonumber(ARGV[2])
+local n_derived = tonumber(ARGV[3])
+local argi = 4
+local values = {}
+
+for i = 1, n_counters do
+    local amount = tonumber(ARGV[argi])
+    local ttl = tonumber(ARGV[argi + 1])
+    local bucket_seconds = tonumber(ARGV[argi + 2])
+    local num_buckets = tonumber(ARGV[argi + 3])
+    argi = argi + 4
+
+    local value_key = KEYS[2 * i - 1]
+    local bucket_key = KEYS[2 * i]
+    local total = 0
+
+    if bucket_seconds > 0 then
+        local head = math.floor(now / bucket_seconds)
+        local oldest = head - num_buckets + 1
+        if amount ~= 0 then
+            redis.call('HINCRBY', bucket_key, head, amount)
+        end
+        local buckets = redis.call('HGETALL', bucket_key)
+        for j = 1, #buckets, 2 do
+            if tonumber(buckets[j]) < oldest then
+                redis.call('HDEL', bucket_key, buckets[j])
+            else
+                total = total + tonumber(buckets[j + 1])
+            end
+        end
+        if ttl > 0 then
+            redis.call('EXPIRE', bucket_key, ttl)
+            redis.call('SET', value_key, total, 'EX', ttl)
+        else
+            redis.call('SET', value_key, total)
+        end
+    elseif amount ~= 0 then
+        total = redis.call('INCRBY', value_key, amount)
+        if ttl > 0 then
+            redis.call('EXPIRE', value_key, ttl)
+        end
+    else
+        total = tonumber(redis.call('GET', value_key) or '0') or 0
+    end
+
+    values[i] = total
+end
+
+for d = 1, n_derived do
+    local ttl = tonumber(ARGV[argi])
+    local n_terms = tonumber(ARGV[argi + 1])
+    argi = argi + 2
+
+    local score = 0
+    for t = 1, n_terms do
+        score = score + values[tonumber(ARGV[argi])] * tonumber(ARGV[argi + 1])
+        argi = argi + 2
+    end
+
+    local key = KEYS[2 * n_counters + d]
+    if ttl > 0 then
+        redis.call('SET', key, tostring(score), 'EX', ttl)
+    else
+        redis.call('SET', key, tostring(score))
+    end
+    values[n_counters + d] = score
+end
+
+for i = 1, #values do
+    values[i] = tostring(values[i])
+end
+return values
+"""
+
+SCRIPTS = {
+    "update_features": UPDATE_FEATURES_SCRIPT,
+}
+
+
+def build_update_calls(updates: List[Tuple[str, List[Tuple[FeatureDefinition, int]]]],
+                       derived: List[Tuple[FeatureDefinition, Dict[str, float]]],
+                       now: float) -> List[Tuple[List[str], List[Any]]]:
+    """KEYS and ARGV for one update_features call per entity"""
+    calls = []
+    for entity_id, counters in updates:
+        keys = []
+        args: List[Any] = [now, len(counters), len(derived)]
+        counter_index = {}
+
+        for i, (feature_def, amount) in enumerate(counters):
+            value_key = feature_def.get_redis_key(entity_id)
+            keys.extend([value_key, f"{value_key}:buckets"])
+            args.extend([
+                amount,
+                feature_def.ttl_seconds or 0,
+                feature_def.bucket_seconds if feature_def.window_seconds else 0,
+                feature_def.window_buckets,
+            ])
+            counter_index[feature_def.name] = i + 1   # Lua is 1-indexed
+
+        for feature_def, weights in derived:
+            keys.append(feature_def.get_redis_key(entity_id))
+            args.extend([feature_def.ttl_seconds or 0, len(weights)])
+            for counter_name, weight in weights.items():
+                args.extend([counter_index[counter_name], weight])
+
+        calls.append((keys, args))
+
+    return calls
+
+
+def parse_update_results(updates: List[Tuple[str, List[Tuple[FeatureDefinition, int]]]],
+                         derived: List[Tuple[FeatureDefinition, Dict[str, float]]],
+                         results: List[Any]) -> List[Dict[str, Any]]:
+    """Map update_features replies back to {feature_name: value} per entity"""
+    features = []
+    for (entity_id, counters), values in zip(updates, results):
+        names = [feature_def.name for feature_def, _ in counters] + \
+                [feature_def.name for feature_def, _ in derived]
+        features.append({name: parse_number(value) for name, value in zip(names, values)})
+    return features
+
+
+def queue_distinct_updates(pipeline, updates: List[Tuple[FeatureDefinition, str, List[str]]], now: float):
+    """
+    Queue PFADD of each entity's new values into its current window bucket's
+    HyperLogLog, then one PFCOUNT per update over the window's bucket keys
+    (the count of their union). The PFCOUNT replies come last, in order.
+    """
+    counted = []
+    for feature_def, entity_id, values in updates:
+        prefix = f"{feature_def.get_redis_key(entity_id)}:hll:"
+        head = int(now // feature_def.bucket_seconds)
+        if values:
+            key = f"{prefix}{head}"
+            pipeline.pfadd(key, *values)
+            # A bucket is read until it leaves the window
+            pipeline.expire(key, int(math.ceil(feature_def.window_seconds + feature_def.bucket_seconds)))
+        counted.append([f"{prefix}{bucket}" for bucket in range(head - feature_def.window_buckets + 1, head + 1)])
+
+    for keys in counted:
+        pipeline.pfcount(*keys)
+
+
+class FeatureMatrix(NamedTuple):
+    """Feature values for entities x features, row i is entity_ids[i], column j is feature_names[j]"""
+    entity_ids: List[str]
+    feature_names: List[str]
+    values: np.ndarray   # float64, NaN where missing
+    missing: np.ndarray  # bool, True where the key is absent or not a number
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """{feature_name: column of values}, views into values"""
+        return {name: self.values[:, j] for j, name in enumerate(self.feature_names)}
+
+
+def build_feature_matrix(feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                         raw_values: List[Optional[str]]) -> FeatureMatrix:
+    """Parse entity-major raw values (as read by a key layout) into a FeatureMatrix"""
+    shape = (len(entity_ids), len(feature_defs))
+    raw = np.array(raw_values, dtype=object)
+    missing = np.equal(raw, None)
+    raw[missing] = "nan"
+
+    try:
+        # Every stored value is numeric text in the common case, parsed in one call
+        values = raw.astype(np.str_).astype(np.float64)
+    except ValueError:
+        values = np.array([_parse_float(value) for value in raw], dtype=np.float64)
+        missing |= np.isnan(values)
+
+    return FeatureMatrix(list(entity_ids), [feature_def.name for feature_def in feature_defs],
+                         values.reshape(shape), missing.reshape(shape))
+
+
+def _parse_float(value: str) -> float:
+    """value as a float, NaN if it isn't a number (e.g. a JSON object)"""
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def parse_number(value: Any) -> Any:
+    """Parse a script reply as int or float where possible"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def decode_value(value: Optional[str]) -> Any:
+    """Decode a stored feature value, parsing JSON where possible"""
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+
+
 class RedisClient:
-    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0):
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 key_layout: str = "string", expiry_bucket_seconds: int = 60):
         self.client = redis.Redis(
             host=host,
             port=port,
@@ -27,22 +244,28 @@ class RedisClient:
             logger.error("Failed to connect to Redis", error=str(e))
             raise
 
+        # Where feature values live: a key per feature, or a hash per entity (src.storage.key_layout)
+        self.key_layout = make_key_layout(key_layout, expiry_bucket_seconds)
+
+        # Server-side scripts are loaded once and run by SHA afterwards
+        self.script_shas: Dict[str, str] = {}
+        self._load_scripts()
+
+    def _load_scripts(self):
+        """Load Lua scripts into the Redis script cache"""
+        for name, script in SCRIPTS.items():
+            self.script_shas[name] = self.client.script_load(script)
+        logger.debug("Redis scripts loaded", scripts=list(self.script_shas))
+
     def set_feature(self, feature_def: FeatureDefinition, entity_id: str, value: Any, ttl: Optional[int] = None):
         """Set a feature value in Redis"""
-        key = feature_def.get_redis_key(entity_id)
-
-        # Use feature's TTL if not specified
-        ttl = ttl or feature_def.ttl_seconds
+        pipeline = self.client.pipeline(transaction=False)
 
-        # Convert value to JSON if its complex
-        if isinstance(value, (dict, list)):
-            value = json.dumps(value)
+        # ttl overrides the feature's TTL
+        self.key_layout.queue_set(pipeline, [(feature_def, entity_id, value)], time.time(), ttl=ttl)
 
         try:
-            if ttl:
-                self.client.setex(key, ttl, value)
-            else:
-                self.client.set(key, value)
+            pipeline.execute()
             logger.debug("Feature set", feature=feature_def.name, entity_id=entity_id)
         
         except Exception as e:
@@ -53,21 +276,10 @@ class RedisClient:
 
     def get_feature(self, feature_def: FeatureDefinition, entity_id: str) -> Optional[Any]:
         """Get a feature value from Redis"""
-        key = feature_def.get_redis_key(entity_id)
-
         try:
-            value = self.client.get(key)
-            if value is None:
-                return None
-            
             # Value is already a string because decode_responses=True
-            # Try to parse as JSON
-            try:
-                return json.loads(value)  # type: ignore
-            
-            except (json.JSONDecodeError, TypeError):
-                return value
-        
+            return decode_value(self.get_raw_values([feature_def], [entity_id])[0])
+
         except Exception as e:
             logger.error("Failed to get feature",
                         feature=feature_def.name,
@@ -76,7 +288,8 @@ class RedisClient:
             return None
         
     def increment_counter(self, feature_def: FeatureDefinition, entity_id: str, amount: int = 1) -> int:
-        """Increment a counter feature"""
+        """Increment a counter feature (string key layout only)"""
+        self._require_string_layout("increment_counter")
         key = feature_def.get_redis_key(entity_id)
 
         try:
@@ -94,33 +307,181 @@ class RedisClient:
             
             return 0
             
-    def get_multiple_features(self, feature_defs: list[FeatureDefinition], entity_id: str) -> Dict[str, Any]:
-        """Get multiple features in one call"""
-        pipeline = self.client.pipeline()
+    def set_features(self, updates: List[Tuple[FeatureDefinition, str, Any]]):
+        """Set many feature values in a single pipelined round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_set(pipeline, updates, time.time())
 
+        try:
+            pipeline.execute()
+        except Exception as e:
+            logger.error("Failed to set features",
+                        count=len(updates),
+                        error=str(e))
 
-        # Queue all gets
-        for feature_def in feature_defs:
-            key = feature_def.get_redis_key(entity_id)
-            pipeline.get(key)
+    def get_features_with_ttl(self, feature_defs: List[FeatureDefinition],
+                              entity_ids: List[str]) -> FeaturesWithTTL:
+        """
+        Get raw values and remaining TTLs for several entities in one pipelined call
+        Returns {entity_id: {feature_name: (value, ttl_seconds)}}, ttl is -1 for no expiry
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_get_with_ttl(pipeline, feature_defs, entity_ids)
+        return self.key_layout.parse_get_with_ttl(pipeline.execute(), feature_defs, entity_ids, time.time())
 
-        # Execute Pipeline
+    def get_features_many(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                          chunk_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+        """
+        Get several features for many entities in one pipelined round trip
+        (MGETs of chunk_size keys, or an HMGET per entity in the hash layout)
+        Returns {entity_id: {feature_name: value}}, None where the key is missing
+        """
+        values = iter(self.get_raw_values(feature_defs, entity_ids, chunk_size))
+        return {entity_id: {feature_def.name: decode_value(next(values)) for feature_def in feature_defs}
+                for entity_id in entity_ids}
+
+    def get_feature_matrix(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                           chunk_size: int = 1000) -> FeatureMatrix:
+        """
+        Get several numeric features for many entities as a dense float matrix
+        One pipelined round trip of MGETs of at most chunk_size keys (or an HMGET
+        per entity), so no single command holds Redis for long. Missing or
+        non-numeric values are NaN and flagged in the mask.
+        """
+        return build_feature_matrix(feature_defs, entity_ids, self.get_raw_values(feature_defs, entity_ids, chunk_size))
+
+    def get_raw_values(self, feature_defs: List[FeatureDefinition], entity_ids: List[str],
+                       chunk_size: int = 1000) -> List[Optional[str]]:
+        """Raw values for entities x features, entity-major, in one pipelined round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        self.key_layout.queue_get(pipeline, feature_defs, entity_ids, chunk_size)
+        return self.key_layout.parse_get(pipeline.execute(), feature_defs, entity_ids, time.time())
+
+    def _require_string_layout(self, operation: str):
+        """Counters and the update script work on per-feature string keys"""
+        if self.key_layout.name != "string":
+            raise ValueError(f"{operation} needs the string key layout, not {self.key_layout.name}")
+
+    def add_update_sample(self, entity_type: str, interval: int,
+                          samples: Dict[str, Tuple[List[str], int]], ttl: int):
+        """
+        Merge one process's recently-updated sample into the shared interval keys
+        samples: {stratum: (sampled entity ids, updates seen)}
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for stratum, (entity_ids, seen) in samples.items():
+            key = f"update_sample:{entity_type}:{stratum}:{interval}"
+            if entity_ids:
+                pipeline.sadd(key, *entity_ids)
+                pipeline.expire(key, ttl)
+            if seen:
+                pipeline.incrby(f"{key}:seen", seen)
+                pipeline.expire(f"{key}:seen", ttl)
+        pipeline.execute()
+
+    def get_update_sample(self, entity_type: str, interval: int, strata: List[str],
+                          count: int) -> Dict[str, Tuple[List[str], int]]:
+        """
+        Up to count random sampled entities per stratum for an interval, in one round trip
+        Returns {stratum: (entity ids, updates seen)}
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for stratum in strata:
+            key = f"update_sample:{entity_type}:{stratum}:{interval}"
+            pipeline.srandmember(key, count)
+            pipeline.get(f"{key}:seen")
         results = pipeline.execute()
 
-        # Build response dict
-        features = {}
-        for feature_def, value in zip(feature_defs, results):
-            if value is not None:
-                try:
-                    features[feature_def.name] = json.loads(value)
-                
-                except (json.JSONDecodeError, TypeError):
-                    features[feature_def.name] = value
+        return {stratum: (results[2 * i] or [], int(results[2 * i + 1] or 0))
+                for i, stratum in enumerate(strata)}
 
+    def set_entity_states(self, entity_type: str, states: Dict[str, bytes], ttl: Optional[int]):
+        """Store serialized streaming state for many entities in one pipelined round trip (no expiry if ttl is None)"""
+        pipeline = self.client.pipeline(transaction=False)
+        for entity_id, state in states.items():
+            pipeline.set(f"state:{entity_type}:{entity_id}", state, ex=ttl)
+        pipeline.execute()
+
+    def get_entity_states(self, entity_type: str, entity_ids: List[str],
+                          delete: bool = True) -> Dict[str, str]:
+        """
+        Serialized streaming state stored by set_entity_states, for the entities that have one
+        With delete the keys are removed too (GETDEL), so a stale copy can't be loaded twice
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for entity_id in entity_ids:
+            key = f"state:{entity_type}:{entity_id}"
+            if delete:
+                pipeline.getdel(key)
             else:
-                features[feature_def.name] = None
+                pipeline.get(key)
+        return {entity_id: state for entity_id, state in zip(entity_ids, pipeline.execute())
+                if state is not None}
+
+    def update_features_scripted(self, entity_id: str,
+                                 counters: List[Tuple[FeatureDefinition, int]],
+                                 derived: Optional[List[Tuple[FeatureDefinition, Dict[str, float]]]] = None,
+                                 event_time: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Atomically update an entity's counters and derived features in a single EVALSHA
+        counters: (feature, amount) pairs, an amount of 0 just refreshes the value
+        derived: (feature, {counter_name: weight}) pairs computed from the new counter values
+        Returns the new value of every feature by name
+        """
+        return self.update_features_scripted_many([(entity_id, counters)], derived, event_time)[0]
+
+    def update_features_scripted_many(self, updates: List[Tuple[str, List[Tuple[FeatureDefinition, int]]]],
+                                      derived: Optional[List[Tuple[FeatureDefinition, Dict[str, float]]]] = None,
+                                      event_time: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Run the scripted update for many entities in one pipelined round trip
+        updates: (entity_id, counters) pairs, derived applies to every entity
+        Returns one {feature_name: value} dict per entry in updates
+        """
+        self._require_string_layout("update_features_scripted_many")
+        derived = derived or []
+        now = event_time if event_time is not None else time.time()
+
+        calls = build_update_calls(updates, derived, now)
+        results = self._evalsha_many("update_features", calls)
+        return parse_update_results(updates, derived, results)
 
-        return features
+    def update_distinct_many(self, updates: List[Tuple[FeatureDefinition, str, List[str]]],
+                             event_time: Optional[float] = None) -> List[int]:
+        """
+        Add values to DISTINCT features kept as per-bucket HyperLogLogs in Redis,
+        in one pipelined round trip. updates: (feature, entity_id, values) triples.
+        Returns each update's distinct count over its window; the feature values
+        themselves are left to set_features.
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        queue_distinct_updates(pipeline, updates, event_time if event_time is not None else time.time())
+        results = pipeline.execute()
+        return [int(count) for count in results[len(results) - len(updates):]]
+
+    def _evalsha_many(self, script_name: str, calls: List[Tuple[List[str], List[Any]]]) -> List[Any]:
+        """Pipeline EVALSHA calls, reloading scripts once if Redis lost them (NOSCRIPT)"""
+        for attempt in range(2):
+            sha = self.script_shas[script_name]
+            pipeline = self.client.pipeline(transaction=False)
+            for keys, args in calls:
+                pipeline.evalsha(sha, len(keys), *keys, *args)
+
+            try:
+                return pipeline.execute()
+            except redis.exceptions.NoScriptError:
+                if attempt:
+                    raise
+                # Script cache was flushed (restart, failover, SCRIPT FLUSH), nothing was applied
+                logger.warning("Redis script missing, reloading", script=script_name)
+                self._load_scripts()
+
+        return []
+
+    def get_multiple_features(self, feature_defs: list[FeatureDefinition], entity_id: str) -> Dict[str, Any]:
+        """Get multiple features in one call"""
+        results = self.get_raw_values(feature_defs, [entity_id])
+        return {feature_def.name: decode_value(value) for feature_def, value in zip(feature_defs, results)}
 
     def close(self):
         """Close Redis connection"""
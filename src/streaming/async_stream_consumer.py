@@ -0,0 +1,225 @@
+import asyncio
+import time
+import zlib
+import structlog
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from confluent_kafka import Consumer, KafkaError, KafkaException
+from src.common.config import Config
+from src.storage.async_redis_client import AsyncRedisClient
+from src.storage.async_postgres_client import AsyncPostgresClient
+from src.common.codec import UserEventRecord
+from src.streaming.async_user_engagement_processor import AsyncUserEngagementProcessor
+from src.streaming.stream_consumer import decode_user_message
+
+logger = structlog.get_logger()
+
+
+class AsyncStreamConsumer:
+    """
+    asyncio variant of StreamConsumer
+    User events are split into `concurrency` shards by message key (user_id).
+    Each shard is drained by one task, so a user's updates stay in order while
+    Redis and PostgreSQL I/O for different shards overlaps.
+    Only user engagement features are computed: content and subreddit features
+    need StreamConsumer, so content-events isn't subscribed to here.
+    """
+
+    def __init__(self, bootstrap_servers: str, group_id: str, topics: list,
+                 batch_size: int = 500, linger_ms: int = 100, concurrency: int = 8,
+                 max_cached_users: int = 100000, server_side_state: bool = False,
+                 shard_queue_size: int = 4, redis_key_layout: str = "string",
+                 redis_expiry_bucket_seconds: int = 60):
+        if 'content-events' in topics:
+            logger.warning("Content features are not supported in async mode, not subscribing",
+                           topic='content-events')
+            topics = [topic for topic in topics if topic != 'content-events']
+
+        self.topics = topics
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self.concurrency = concurrency
+
+        # Kafka consumer config
+        conf = {
+            'bootstrap.servers': bootstrap_servers,
+            'group.id': group_id,
+            'auto.offset.reset': 'earliest',
+            'enable.auto.commit': True,
+            'auto.commit.interval.ms': 5000,
+        }
+
+        self.consumer = Consumer(conf)
+        self.consumer.subscribe(topics, on_revoke=self._on_revoke)
+
+        # librdkafka calls block, so they run on one dedicated thread
+        self._kafka_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-consume")
+
+        self.redis = AsyncRedisClient(key_layout=redis_key_layout,
+                                      expiry_bucket_seconds=redis_expiry_bucket_seconds)
+        self.postgres = AsyncPostgresClient()
+        self.user_processor = AsyncUserEngagementProcessor(self.redis, self.postgres,
+                                                           max_cached_users=max_cached_users,
+                                                           server_side_state=server_side_state)
+
+        # Bounded per-shard queues push back on consume() when storage falls behind
+        self.shard_queue_size = shard_queue_size
+        self.queues: List[asyncio.Queue] = []
+        self.message_count = 0
+        self._running = True
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        logger.info("Async stream consumer initialized",
+                   bootstrap_servers=bootstrap_servers,
+                   group_id=group_id,
+                   topics=topics,
+                   batch_size=batch_size,
+                   concurrency=concurrency)
+
+    async def run(self):
+        """Start consuming and processing messages"""
+        await self.redis.connect()
+        await self.postgres.connect()
+
+        self.queues = [asyncio.Queue(maxsize=self.shard_queue_size) for _ in range(self.concurrency)]
+        workers = [asyncio.create_task(self._shard_worker(i)) for i in range(self.concurrency)]
+
+        loop = self._loop = asyncio.get_running_loop()
+        timeout = self.linger_ms / 1000.0
+
+        logger.info("Starting async stream processing...")
+
+        try:
+            batch_count = 0
+
+            while self._running:
+                msgs = await loop.run_in_executor(
+                    self._kafka_executor, lambda: self.consumer.consume(num_messages=self.batch_size, timeout=timeout))
+
+                if not msgs:
+                    continue
+
+                batch_start = time.perf_counter()
+                shards: List[List[UserEventRecord]] = [[] for _ in range(self.concurrency)]
+
+                for msg in msgs:
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            logger.debug("Reached end of partition")
+                        else:
+                            logger.error("Consumer error", error=msg.error())
+                        continue
+
+                    if msg.topic() == 'user-events':
+                        event = decode_user_message(msg)
+                        if event:
+                            shards[self._shard(msg.key())].append(event)
+
+                for shard, events in enumerate(shards):
+                    if events:
+                        await self.queues[shard].put(events)
+
+                self.message_count += len(msgs)
+                batch_count += 1
+
+                logger.info("Dispatched batch",
+                           batch=batch_count,
+                           size=len(msgs),
+                           dispatch_ms=round((time.perf_counter() - batch_start) * 1000, 2),
+                           queued=sum(q.qsize() for q in self.queues),
+                           total=self.message_count)
+
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            logger.info("Shutting down async stream consumer")
+        finally:
+            # Finish everything already dispatched before closing
+            await self._join_queues()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.close()
+
+    def _shard(self, key) -> int:
+        """Shard for a message key, stable across processes"""
+        if not key:
+            return 0
+        return zlib.crc32(key) % self.concurrency
+
+    async def _shard_worker(self, shard: int):
+        """Process one shard's batches strictly in order"""
+        queue = self.queues[shard]
+
+        while True:
+            events = await queue.get()
+            try:
+                start = time.perf_counter()
+                await self.user_processor.process_batch(events)
+                logger.debug("Processed shard batch", shard=shard, size=len(events),
+                            duration_ms=round((time.perf_counter() - start) * 1000, 2))
+            finally:
+                queue.task_done()
+
+    def _on_revoke(self, consumer, partitions):
+        """
+        Rebalance callback, runs on the Kafka thread inside consume()
+        Batches already dispatched are finished and cached user state spilled on
+        the event loop, then offsets are committed (see StreamConsumer._on_revoke)
+        """
+        spilled = 0
+        if self._loop is not None:
+            spilled = asyncio.run_coroutine_threadsafe(self._release_states(), self._loop).result()
+        try:
+            consumer.commit(asynchronous=False)
+        except KafkaException as e:
+            logger.debug("No offsets committed on revoke", error=str(e))
+
+        logger.info("Partitions revoked", partitions=len(partitions), spilled_users=spilled)
+
+    async def _release_states(self) -> int:
+        """Finish dispatched batches, then spill and forget every cached user"""
+        await self._join_queues()
+        return await self.user_processor.spill_states()
+
+    async def _join_queues(self):
+        await asyncio.gather(*(q.join() for q in self.queues))
+
+    def stop(self):
+        """Ask the run loop to exit after the current batch"""
+        self._running = False
+
+    async def close(self):
+        """Spill cached user state, then close the Kafka consumer and storage clients"""
+        spilled = await self.user_processor.spill_states()
+        logger.info("Spilled cached state", spilled_users=spilled)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._kafka_executor, self.consumer.close)
+        self._kafka_executor.shutdown()
+        await self.redis.close()
+        await self.postgres.close()
+        logger.info("Async stream consumer closed")
+
+
+def main():
+    config = Config()
+
+    consumer = AsyncStreamConsumer(
+        bootstrap_servers=config.kafka.bootstrap_servers,
+        group_id=config.stream.group_id,
+        topics=[config.kafka.user_events_topic, config.kafka.content_events_topic],
+        batch_size=config.stream.batch_size,
+        linger_ms=config.stream.linger_ms,
+        concurrency=config.stream.async_concurrency,
+        max_cached_users=config.stream.max_cached_users,
+        server_side_state=config.stream.server_side_state,
+        redis_key_layout=config.redis.key_layout,
+        redis_expiry_bucket_seconds=config.redis.expiry_bucket_seconds
+    )
+
+    try:
+        asyncio.run(consumer.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
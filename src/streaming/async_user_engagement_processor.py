@@ -0,0 +1,136 @@
+import asyncio
+import structlog
+import asyncpg
+from typing import Any, Dict, List
+from src.storage.async_redis_client import AsyncRedisClient
+from src.storage.async_postgres_client import AsyncPostgresClient
+from src.storage.postgres_client import OfflineFeatureRow
+from src.streaming.feature_engine import EntityFeatures
+from src.streaming.user_engagement_processor import UserEngagementProcessor, UserEventInput
+
+logger = structlog.get_logger()
+
+
+class AsyncUserEngagementProcessor(UserEngagementProcessor):
+    """
+    asyncio variant of UserEngagementProcessor
+    Feature logic and state are shared with the sync processor, only the
+    Redis and PostgreSQL I/O is awaited so batches for different users overlap
+    """
+
+    def __init__(self, redis_client: AsyncRedisClient, postgres_client: AsyncPostgresClient,
+                 max_cached_users: int = 100000, server_side_state: bool = False):
+        super().__init__(redis_client, postgres_client,  # type: ignore[arg-type]
+                         max_cached_users=max_cached_users,
+                         server_side_state=server_side_state)
+
+        # Spills being written, so a shard warming one of them meanwhile doesn't miss it
+        self._spilling: Dict[str, bytes] = {}
+
+    async def process_event(self, event_json: UserEventInput):
+        """Process a single user event"""
+        await self.process_batch([event_json])
+
+    async def process_batch(self, event_jsons: List[UserEventInput]):
+        """Process a batch of user events (callers keep a user's batches in order)"""
+        parsed = self._parse_events(event_jsons)
+        if not parsed:
+            return
+
+        try:
+            if self.server_side_state:
+                event_time = max(event.timestamp for _, event in parsed)
+                updates = self._scripted_updates(self._count_events(parsed))
+                results = await self.redis.update_features_scripted_many(
+                    updates, self.scripted_derived, event_time)
+                offline_rows = self._scripted_offline_rows(updates, results)
+
+                if self.scripted_distinct:
+                    distinct = self._distinct_updates(parsed)
+                    online_updates, distinct_rows = self._distinct_writes(
+                        distinct, await self.redis.update_distinct_many(distinct, event_time))
+                    await self.redis.set_features(online_updates)
+                    offline_rows.extend(distinct_rows)
+
+                await self._store_offline_rows(offline_rows)
+                return
+
+            # Cold users enter the cache empty and are restored before any event is applied
+            cold: Dict[str, EntityFeatures] = {}
+            batch_time = max(event.timestamp for _, event in parsed)
+            states = self.state.get_many([user_id for user_id, _ in parsed], warmer=cold.update)
+            if cold:
+                await self._restore_cold(cold, batch_time)
+            online_updates, offline_rows = self._feature_writes(self._apply_events(parsed, states))
+
+            # Online and offline writes don't depend on each other
+            await asyncio.gather(
+                self.redis.set_features(online_updates),
+                self._store_offline_rows(offline_rows)
+            )
+
+        except Exception as e:
+            logger.error("Failed to process batch", error=str(e), num_events=len(event_jsons))
+        finally:
+            await self._flush_spills()
+
+    async def _restore_cold(self, cold: Dict[str, EntityFeatures], event_time: float):
+        """
+        Restore cold users from spilled state, else seed them from stored totals
+        Other shards spill concurrently, so spills not yet written (or being
+        written) are claimed before the first await, after which a cold user's
+        spill can only be in Redis.
+        """
+        spilled: Dict[str, Any] = {}
+        unread = []
+        for user_id, state in cold.items():
+            pending = self._spills.pop(user_id, None)
+            if pending is not None:
+                self.engine.load_state(state, self.engine.dump_state(pending))
+            elif user_id in self._spilling:
+                spilled[user_id] = self._spilling[user_id]
+            else:
+                unread.append(user_id)
+
+        stored: Dict[str, Dict] = {}
+        if unread:
+            spilled.update(await self.redis.get_entity_states(self.ENTITY_TYPE, unread))
+            unspilled = [user_id for user_id in unread if user_id not in spilled]
+            if unspilled:
+                stored = await self.redis.get_features_with_ttl(self.warm_features, unspilled)
+
+        self._restore_states({user_id: cold[user_id] for user_id in list(spilled) + unread},
+                             spilled, stored, event_time)
+
+    async def _flush_spills(self):
+        """Write spilled state to Redis in one pipeline"""
+        payloads = self._take_spills()
+        if not payloads:
+            return
+
+        self._spilling.update(payloads)
+        try:
+            await self.redis.set_entity_states(self.ENTITY_TYPE, payloads, self.spill_ttl)
+            self.spilled += len(payloads)
+        except Exception as e:
+            logger.error("Failed to spill state", entity_type=self.ENTITY_TYPE,
+                         count=len(payloads), error=str(e))
+        finally:
+            for user_id, payload in payloads.items():
+                if self._spilling.get(user_id) is payload:
+                    del self._spilling[user_id]
+
+    async def spill_states(self) -> int:
+        """Spill every cached user to Redis and forget it, returns how many were held"""
+        states = self.state.clear()
+        self._spills.update(states)
+        await self._flush_spills()
+        return len(states)
+
+    async def _store_offline_rows(self, rows: List[OfflineFeatureRow]):
+        """Bulk load offline rows with COPY"""
+        try:
+            await self.postgres.copy_offline_features(rows)
+        except asyncpg.UniqueViolationError:
+            # COPY is all-or-nothing, fall back to an INSERT that skips duplicates
+            await self.postgres.store_offline_features(rows, skip_duplicates=True)
@@ -0,0 +1,61 @@
+import structlog
+from typing import Dict, Optional, Union
+from src.common import codec
+from src.common.features import CONTENT_FEATURES
+from src.storage.redis_client import RedisClient
+from src.storage.postgres_client import PostgresClient
+from src.storage.offline_writer import OfflineFeatureWriter
+from src.streaming.feature_engine import EntityFeatures, FeatureEngine
+from src.streaming.state_store import EntityStateStore
+from src.streaming.user_engagement_processor import UserEngagementProcessor
+
+logger = structlog.get_logger()
+
+# Any decoded event carrying a post_id (user events drive views and votes)
+ContentEventInput = Union[bytes, str, codec.UserEventRecord, codec.ContentEventRecord]
+
+# CONTENT_FEATURES compiled once, shared by every processor in the process
+CONTENT_ENGINE = FeatureEngine(CONTENT_FEATURES)
+
+
+class ContentFeatureProcessor(UserEngagementProcessor):
+    """
+    Computes per-post features (views, velocity, upvote ratio) from the event stream
+    Post state is held under a hard memory budget: the least recently used
+    posts are evicted once max_state_mb worth of accumulators is held, and
+    spilled to Redis at the end of the batch, to be reloaded if they come
+    back. Every post still held is spilled when partitions are revoked and
+    on shutdown (StreamConsumer). Cost per batch is one pipelined load for cold posts, one for spills
+    and the usual feature writes, so it grows with events, not distinct posts.
+
+    Counts are only correct when one process sees all of a post's events, i.e.
+    a single consumer (ConsumerSupervisor refuses more than one worker).
+    """
+
+    ENTITY_TYPE = "post"
+
+    def __init__(self, redis_client: RedisClient, postgres_client: PostgresClient,
+                 offline_writer: Optional[OfflineFeatureWriter] = None,
+                 max_state_mb: int = 256, engine: FeatureEngine = CONTENT_ENGINE):
+        super().__init__(redis_client, postgres_client, offline_writer=offline_writer, engine=engine)
+
+        self.state_bytes = engine.state_size_bytes()
+        self.max_cached_posts = max(1, max_state_mb * 1024 * 1024 // self.state_bytes)
+        self.state = EntityStateStore(self.max_cached_posts, engine.new_state,
+                                      warmer=self._warm_states, on_evict=self._spill)
+
+        logger.info("ContentFeatureProcessor initialized",
+                   max_state_mb=max_state_mb,
+                   max_cached_posts=self.max_cached_posts,
+                   state_bytes_per_post=self.state_bytes)
+
+    def _decode(self, event_json: ContentEventInput):
+        """Decoded event, JSON payloads are decoded as user events"""
+        if isinstance(event_json, (codec.UserEventRecord, codec.ContentEventRecord)):
+            return event_json
+        return codec.decode_user_event(event_json)
+
+    def _warm_states(self, states: Dict[str, EntityFeatures], event_time: Optional[float] = None):
+        """Reload cold posts that were spilled earlier, the rest start empty"""
+        spilled = self.redis.get_entity_states(self.ENTITY_TYPE, list(states))
+        self._restore_states(states, spilled, {}, event_time)
@@ -0,0 +1,288 @@
+import sys
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+from src.common import codec
+from src.common.features import Aggregation, FeatureDefinition
+from src.streaming.sketches import SlidingWindowDistinct, SlidingWindowTopK
+from src.streaming.windows import RunningTotal, SlidingWindowCounter
+
+# Accumulators shared by every feature with the same (event codes, value_field, window, buckets, sketch),
+# sketch being None for counts and sums, else (aggregation, its size parameters)
+SlotKey = Tuple[FrozenSet[int], Optional[str], Optional[int], int, Optional[Tuple]]
+
+
+class EntityFeatures:
+    """Accumulator slots for one entity, laid out by its FeatureEngine"""
+
+    __slots__ = ("slots",)
+
+    def __init__(self, slots: List[Any]):
+        self.slots = slots
+
+    def is_empty(self, timestamp: float) -> bool:
+        """True once every accumulator is back to zero (windows fully aged out)"""
+        for slot in self.slots:
+            if not slot.is_empty(timestamp):
+                return False
+        return True
+
+
+class FeatureEngine:
+    """
+    Computes a feature registry from decoded events
+    The registry is compiled once into accumulator slots (deduplicated, so
+    e.g. a view count and a view rate over the same window share one ring),
+    a dispatch table from event type code to the slots it updates, and the
+    features each event type changes, derived features included. An event
+    type no feature uses costs one dict lookup.
+    """
+
+    def __init__(self, features: Dict[str, FeatureDefinition]):
+        self.features = features
+
+        entity_keys = {feature.entity_key for feature in features.values()}
+        if len(entity_keys) != 1:
+            raise ValueError(f"Features must share one entity_key, got {sorted(entity_keys)}")
+        self.entity_key = entity_keys.pop()
+
+        self._slot_keys: List[SlotKey] = []
+        self._slot_ids: Dict[SlotKey, int] = {}
+        self._feature_slots: Dict[str, Tuple[int, ...]] = {}
+        self._compute: Dict[str, Callable[[List[Any], float, Dict[str, Any]], Any]] = {}
+
+        for feature in features.values():
+            if feature.aggregation:
+                self._compile_aggregate(feature)
+            elif feature.derived_from:
+                self._compile_derived(feature)
+            else:
+                raise ValueError(f"Feature {feature.name} has neither an aggregation nor derived_from")
+
+        # Dependencies before dependents
+        self.order = self._evaluation_order()
+
+        # Event type code -> [(slot, value_field)] it updates
+        self._dispatch: Dict[int, List[Tuple[int, Optional[str]]]] = {}
+        for slot, (codes, value_field, _, _, _) in enumerate(self._slot_keys):
+            for code in codes:
+                self._dispatch.setdefault(code, []).append((slot, value_field))
+
+        # Event type code -> features it changes, derived ones included
+        self._affected: Dict[int, FrozenSet[str]] = {
+            code: self._with_dependents({name for name, slots in self._feature_slots.items()
+                                         if any(slot in slots for slot, _ in updates)})
+            for code, updates in self._dispatch.items()
+        }
+
+        # Changed feature set -> (features to evaluate, features to emit), built on first use
+        self._plans: Dict[FrozenSet[str], Tuple[List[str], List[str]]] = {}
+
+    def _slot(self, codes, value_field: Optional[str], feature: FeatureDefinition,
+              sketch: Optional[Tuple] = None) -> int:
+        """Index of the accumulator for these events, adding it if it's new"""
+        key = (frozenset(codec.EVENT_TYPE_CODES[event_type.value] for event_type in codes),
+               value_field, feature.window_seconds, feature.window_buckets, sketch)
+        if key not in self._slot_ids:
+            self._slot_ids[key] = len(self._slot_keys)
+            self._slot_keys.append(key)
+        return self._slot_ids[key]
+
+    def _compile_aggregate(self, feature: FeatureDefinition):
+        """Slots and value function for an event aggregation"""
+        if feature.aggregation == Aggregation.DISTINCT:
+            slot = self._slot(feature.source_events, feature.value_field, feature,
+                              (Aggregation.DISTINCT, feature.sketch_precision))
+        elif feature.aggregation == Aggregation.TOP_K:
+            slot = self._slot(feature.source_events, feature.value_field, feature,
+                              (Aggregation.TOP_K, feature.top_k, feature.top_k_capacity))
+        else:
+            value_field = feature.value_field if feature.aggregation == Aggregation.SUM else None
+            slot = self._slot(feature.source_events, value_field, feature)
+
+        if feature.aggregation == Aggregation.RATIO:
+            numerator = self._slot(feature.numerator_events, None, feature)
+            self._feature_slots[feature.name] = (numerator, slot)
+
+            def ratio(slots, timestamp, values):
+                total = slots[slot].value(timestamp)
+                return slots[numerator].value(timestamp) / total if total else 0.0
+            self._compute[feature.name] = ratio
+            return
+
+        self._feature_slots[feature.name] = (slot,)
+        if feature.aggregation == Aggregation.RATE:
+            per_window = feature.window_seconds / feature.rate_seconds
+            self._compute[feature.name] = lambda slots, timestamp, values: \
+                slots[slot].value(timestamp) / per_window
+        else:
+            self._compute[feature.name] = lambda slots, timestamp, values: slots[slot].value(timestamp)
+
+    def _compile_derived(self, feature: FeatureDefinition):
+        """Value function for a weighted sum of other features"""
+        for name in feature.derived_from:
+            if name not in self.features:
+                raise ValueError(f"Feature {feature.name} is derived from unknown feature {name}")
+
+        weights = list(feature.derived_from.items())
+        self._compute[feature.name] = lambda slots, timestamp, values: \
+            sum(weight * values[name] for name, weight in weights)
+
+    def _evaluation_order(self) -> List[str]:
+        """Features ordered so each derived feature follows what it's derived from"""
+        order: List[str] = []
+        visiting = set()
+
+        def visit(name: str):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Feature {name} is derived from itself")
+            visiting.add(name)
+            for dependency in self.features[name].derived_from or ():
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.features:
+            visit(name)
+        return order
+
+    def _with_dependents(self, names) -> FrozenSet[str]:
+        """names plus every derived feature that depends on them, transitively"""
+        changed = set(names)
+        for name in self.order:
+            derived_from = self.features[name].derived_from
+            if derived_from and any(dependency in changed for dependency in derived_from):
+                changed.add(name)
+        return frozenset(changed)
+
+    def _plan(self, changed: FrozenSet[str]) -> Tuple[List[str], List[str]]:
+        """Features to evaluate (changed ones plus their inputs) and to emit, in order"""
+        plan = self._plans.get(changed)
+        if plan is None:
+            needed = set(changed)
+            for name in reversed(self.order):
+                if name in needed:
+                    needed.update(self.features[name].derived_from or ())
+            plan = ([name for name in self.order if name in needed],
+                    [name for name in self.order if name in changed])
+            self._plans[changed] = plan
+        return plan
+
+    def new_state(self) -> EntityFeatures:
+        """Empty accumulators for one entity"""
+        slots = []
+        for _, _, window_seconds, window_buckets, sketch in self._slot_keys:
+            if sketch is not None:
+                if sketch[0] == Aggregation.DISTINCT:
+                    slots.append(SlidingWindowDistinct(window_seconds / window_buckets, window_buckets, sketch[1]))
+                else:
+                    slots.append(SlidingWindowTopK(window_seconds / window_buckets, window_buckets,
+                                                   sketch[1], sketch[2]))
+            elif window_seconds:
+                slots.append(SlidingWindowCounter(window_seconds / window_buckets, window_buckets))
+            else:
+                slots.append(RunningTotal())
+        return EntityFeatures(slots)
+
+    def dump_state(self, state: EntityFeatures) -> list:
+        """JSON-serializable snapshot of an entity's accumulators"""
+        return [slot.snapshot() for slot in state.slots]
+
+    def load_state(self, state: EntityFeatures, snapshot: list):
+        """Restore accumulators from dump_state, ignored if the registry layout changed since"""
+        if len(snapshot) != len(state.slots):
+            return
+        for slot, slot_snapshot in zip(state.slots, snapshot):
+            slot.restore(slot_snapshot)
+
+    def state_size_bytes(self) -> int:
+        """Approximate memory held by one entity's accumulators"""
+        state = self.new_state()
+        size = sys.getsizeof(state) + sys.getsizeof(state.slots)
+        for slot in state.slots:
+            size += sys.getsizeof(slot)
+            if hasattr(slot, "size_bytes"):
+                # Sketches are fixed-size arrays
+                size += slot.size_bytes()
+                continue
+            counts = getattr(slot, "counts", None)
+            if counts is not None:
+                # Bucket counts become distinct int objects once they're non-zero
+                size += sys.getsizeof(counts) + len(counts) * sys.getsizeof(2 ** 20)
+        return size
+
+    def entity_id(self, event) -> Optional[str]:
+        """The id of the entity this engine's features describe, from a decoded event"""
+        return getattr(event, self.entity_key)
+
+    def handles(self, event_type: int) -> bool:
+        """True if any feature uses this event type code"""
+        return event_type in self._dispatch
+
+    def apply(self, state: EntityFeatures, event) -> Optional[FrozenSet[str]]:
+        """
+        Add one event to an entity's accumulators, returns the features it changed (None if none)
+        Counts add 1, sums add the value_field amount and sketches add the value_field value.
+        """
+        updates = self._dispatch.get(event.event_type)
+        if updates is None:
+            return None
+
+        slots = state.slots
+        timestamp = event.timestamp
+        for slot, value_field in updates:
+            if value_field is None:
+                slots[slot].add(timestamp)
+            else:
+                amount = getattr(event, value_field)
+                if amount:
+                    slots[slot].add(timestamp, amount)
+        return self._affected[event.event_type]
+
+    def compute(self, state: EntityFeatures, changed: FrozenSet[str],
+                timestamp: float) -> List[Tuple[str, Any]]:
+        """(name, value) of each changed feature as of timestamp"""
+        needed, emitted = self._plan(changed)
+        slots = state.slots
+        values: Dict[str, Any] = {}
+        for name in needed:
+            values[name] = self._compute[name](slots, timestamp, values)
+        return [(name, values[name]) for name in emitted]
+
+    def seedable_features(self) -> List[FeatureDefinition]:
+        """COUNT and SUM features, whose stored value can seed their accumulator directly"""
+        return [feature for feature in self.features.values()
+                if feature.aggregation in (Aggregation.COUNT, Aggregation.SUM)]
+
+    def seed(self, state: EntityFeatures, feature_name: str, timestamp: float, amount: Any):
+        """Add a previously stored value of a COUNT or SUM feature to its accumulator"""
+        self._slot_value(state, feature_name).add(timestamp, amount)
+
+    def _slot_value(self, state: EntityFeatures, feature_name: str):
+        return state.slots[self._feature_slots[feature_name][0]]
+
+    def scripted_spec(self) -> Tuple[List[Tuple[FeatureDefinition, FrozenSet[int]]],
+                                     List[Tuple[FeatureDefinition, Dict[str, float]]],
+                                     List[Tuple[FeatureDefinition, FrozenSet[int]]]]:
+        """
+        Counters (with the event type codes they count) and derived features
+        for RedisClient.update_features_scripted_many, which only handles
+        COUNT features and weighted sums of them, plus DISTINCT features (with
+        their event type codes) for RedisClient.update_distinct_many
+        """
+        counters = []
+        derived = []
+        distinct = []
+        for name in self.order:
+            feature = self.features[name]
+            if feature.aggregation == Aggregation.COUNT:
+                counters.append((feature, self._slot_keys[self._feature_slots[name][0]][0]))
+            elif feature.derived_from and all(
+                    self.features[dependency].aggregation == Aggregation.COUNT
+                    for dependency in feature.derived_from):
+                derived.append((feature, dict(feature.derived_from)))
+            elif feature.aggregation == Aggregation.DISTINCT:
+                distinct.append((feature, self._slot_keys[self._feature_slots[name][0]][0]))
+            else:
+                raise ValueError(f"Feature {name} can't be computed by the Redis update script")
+        return counters, derived, distinct
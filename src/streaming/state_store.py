@@ -0,0 +1,116 @@
+import structlog
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, List, Optional, TypeVar, Any
+
+logger = structlog.get_logger()
+
+S = TypeVar("S")
+
+
+class EntityStateStore(Generic[S]):
+    """
+    Bounded LRU store of per-entity streaming state
+    Cold entities are created with factory and warmed in bulk by warmer,
+    and the least recently used entity is dropped once max_entities is reached
+    """
+
+    def __init__(self, max_entities: int, factory: Callable[[], S],
+                 warmer: Optional[Callable[[Dict[str, S]], None]] = None,
+                 on_evict: Optional[Callable[[str, S], None]] = None):
+        self.max_entities = max_entities
+        self.factory = factory
+        self.warmer = warmer
+        self.on_evict = on_evict   # Called with each LRU-evicted entity, e.g. to spill it
+        self._states: "OrderedDict[str, S]" = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, entity_id: str) -> S:
+        """State for one entity, warming it on a miss"""
+        return self.get_many([entity_id])[entity_id]
+
+    def get_many(self, entity_ids: List[str],
+                 warmer: Optional[Callable[[Dict[str, S]], None]] = None) -> Dict[str, S]:
+        """
+        State for several entities, warming all misses in a single call
+        warmer overrides the store's own warmer for this call
+        """
+        warmer = warmer or self.warmer
+        found: Dict[str, S] = {}
+        cold: Dict[str, S] = {}
+
+        for entity_id in entity_ids:
+            if entity_id in found or entity_id in cold:
+                continue
+
+            state = self._states.get(entity_id)
+            if state is not None:
+                self._states.move_to_end(entity_id)
+                self.hits += 1
+                found[entity_id] = state
+            else:
+                self.misses += 1
+                cold[entity_id] = self.factory()
+
+        if cold:
+            if warmer:
+                try:
+                    warmer(cold)
+                except Exception as e:
+                    # Cold state still works, it just starts empty
+                    logger.error("Failed to warm entity state", count=len(cold), error=str(e))
+
+            for entity_id, state in cold.items():
+                self._put(entity_id, state)
+                found[entity_id] = state
+
+        return found
+
+    def missing(self, entity_ids: List[str]) -> List[str]:
+        """Entities not currently held, e.g. to fetch their warm-up data asynchronously"""
+        return [entity_id for entity_id in dict.fromkeys(entity_ids) if entity_id not in self._states]
+
+    def prune(self, is_expired: Callable[[S], bool]) -> List[str]:
+        """Drop entities whose state is expired and return their ids"""
+        expired = [entity_id for entity_id, state in self._states.items() if is_expired(state)]
+        for entity_id in expired:
+            del self._states[entity_id]
+        return expired
+
+    def clear(self) -> Dict[str, S]:
+        """Drop every entity without calling on_evict and return what was held"""
+        states = dict(self._states)
+        self._states.clear()
+        return states
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._states),
+            'max_entities': self.max_entities,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _put(self, entity_id: str, state: S):
+        """Insert state, evicting the least recently used entity if full"""
+        self._states[entity_id] = state
+        self._states.move_to_end(entity_id)
+
+        while len(self._states) > self.max_entities:
+            evicted_id, evicted = self._states.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(evicted_id, evicted)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._states
+
+    def __len__(self) -> int:
+        return len(self._states)
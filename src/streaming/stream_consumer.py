@@ -1,15 +1,44 @@
+import time
 import structlog
-from confluent_kafka import Consumer, KafkaError
+from typing import Any, Callable, Dict, Optional
+from confluent_kafka import Consumer, KafkaError, KafkaException
+from src.common import codec
+from src.common.config import Config
 from src.storage.redis_client import RedisClient
 from src.storage.postgres_client import PostgresClient
+from src.storage.offline_writer import OfflineFeatureWriter
 from src.streaming.user_engagement_processor import UserEngagementProcessor
+from src.streaming.content_feature_processor import ContentFeatureProcessor
+from src.streaming.subreddit_feature_processor import SubredditFeatureProcessor
+from src.streaming.update_sampler import UpdateSampler
 
 logger = structlog.get_logger()
 
 
 class StreamConsumer:
-    def __init__(self, bootstrap_servers: str, group_id: str, topics: list):
+    def __init__(self, bootstrap_servers: str, group_id: str, topics: list,
+                 batch_size: int = 1, linger_ms: int = 100, max_cached_users: int = 100000,
+                 server_side_state: bool = False,
+                 offline_writer_enabled: bool = False, offline_queue_size: int = 100000,
+                 offline_flush_rows: int = 5000, offline_flush_interval_ms: int = 1000,
+                 update_sample_size: int = 0, update_sample_interval_seconds: float = 60.0,
+                 update_sample_feature: Optional[str] = "user_engagement_score",
+                 content_features_enabled: bool = False, content_state_mb: int = 256,
+                 subreddit_features_enabled: bool = False, subreddit_state_mb: int = 64,
+                 redis_key_layout: str = "string", redis_expiry_bucket_seconds: int = 60,
+                 on_stats: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 stats_interval_seconds: float = 10.0):
         self.topics = topics
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        
+        # Progress counters, reported to on_stats every stats_interval_seconds
+        self.message_count = 0
+        self.on_stats = on_stats
+        self.stats_interval_seconds = stats_interval_seconds
+        self._last_stats = time.monotonic()
+        self._last_stats_count = 0
+        self._running = True
         
         # Kafka consumer config
         conf = {
@@ -21,27 +50,76 @@ class StreamConsumer:
         }
         
         self.consumer = Consumer(conf)
-        self.consumer.subscribe(topics)
         
         # Initialize Redis and PostgreSQL
-        self.redis = RedisClient()
+        self.redis = RedisClient(key_layout=redis_key_layout,
+                                 expiry_bucket_seconds=redis_expiry_bucket_seconds)
         self.postgres = PostgresClient()
-        self.user_processor = UserEngagementProcessor(self.redis, self.postgres)
+        
+        # Optional background writer that bulk-loads offline rows off the hot path
+        self.offline_writer = None
+        if offline_writer_enabled:
+            self.offline_writer = OfflineFeatureWriter(
+                self.postgres,
+                max_queue_size=offline_queue_size,
+                flush_rows=offline_flush_rows,
+                flush_interval_ms=offline_flush_interval_ms
+            )
+            self.offline_writer.start()
+        
+        # Optional reservoir sample of updated users, published for the consistency checker
+        self.update_sampler = None
+        if update_sample_size > 0:
+            self.update_sampler = UpdateSampler(self.redis,
+                                                sample_size=update_sample_size,
+                                                interval_seconds=update_sample_interval_seconds)
+        
+        self.user_processor = UserEngagementProcessor(self.redis, self.postgres,
+                                                      offline_writer=self.offline_writer,
+                                                      max_cached_users=max_cached_users,
+                                                      server_side_state=server_side_state,
+                                                      update_sampler=self.update_sampler,
+                                                      sample_feature=update_sample_feature)
+        
+        # Optional per-post features, fed by user events (views, votes) and content events
+        self.content_processor = None
+        if content_features_enabled:
+            self.content_processor = ContentFeatureProcessor(self.redis, self.postgres,
+                                                             offline_writer=self.offline_writer,
+                                                             max_state_mb=content_state_mb)
+
+        # Optional per-subreddit features (trending posts), fed by user events
+        self.subreddit_processor = None
+        if subreddit_features_enabled:
+            self.subreddit_processor = SubredditFeatureProcessor(self.redis, self.postgres,
+                                                                 offline_writer=self.offline_writer,
+                                                                 max_state_mb=subreddit_state_mb)
+        
+        # Idle users' expired windows are dropped periodically
+        self.prune_interval_seconds = 60.0
+        self._last_prune = time.monotonic()
+        
+        # Rebalance callbacks run inside poll()/consume(), between batches
+        self.consumer.subscribe(topics, on_revoke=self._on_revoke)
         
         logger.info("Stream consumer initialized with dual storage",
                    bootstrap_servers=bootstrap_servers,
                    group_id=group_id,
-                   topics=topics)
+                   topics=topics,
+                   batch_size=batch_size,
+                   linger_ms=linger_ms,
+                   offline_writer_enabled=offline_writer_enabled,
+                   content_features_enabled=content_features_enabled,
+                   subreddit_features_enabled=subreddit_features_enabled)
     
     def run(self):
         """Start consuming and processing messages"""
         logger.info("Starting stream processing...")
         
         try:
-            message_count = 0
-            
-            while True:
+            while self._running:
                 msg = self.consumer.poll(timeout=1.0)
+                self._maybe_report_stats()
                 
                 if msg is None:
                     continue
@@ -55,33 +133,275 @@ class StreamConsumer:
                 
                 # Process the message
                 topic = msg.topic()
-                value = msg.value().decode('utf-8')
                 
                 if topic == 'user-events':
-                    self.user_processor.process_event(value)
+                    event = decode_user_message(msg)
+                    if event:
+                        self.user_processor.process_event(event)
+                        if self.content_processor:
+                            self.content_processor.process_event(event)
+                        if self.subreddit_processor:
+                            self.subreddit_processor.process_event(event)
                 elif topic == 'content-events':
-                    # We'll add content processor later
-                    pass
+                    if self.content_processor:
+                        event = decode_content_message(msg)
+                        if event:
+                            self.content_processor.process_event(event)
+                
+                self.message_count += 1
                 
-                message_count += 1
+                if self.message_count % 100 == 0:
+                    logger.info("Processed messages", count=self.message_count)
                 
-                if message_count % 100 == 0:
-                    logger.info("Processed messages", count=message_count)
+                self._maybe_prune_windows()
+                self._maybe_publish_sample()
                 
         except KeyboardInterrupt:
             logger.info("Shutting down stream consumer")
         finally:
-            self.consumer.close()
-            logger.info("Stream consumer closed")
+            self.close()
 
 
-def main():
-    consumer = StreamConsumer(
-        bootstrap_servers='localhost:19092',
-        group_id='feature-store-stream-processor',
-        topics=['user-events', 'content-events']
+    def run_batch(self):
+        """
+        Start consuming in micro-batches
+        Pulls up to batch_size messages or waits up to linger_ms, then processes them together
+        """
+        logger.info("Starting batched stream processing...",
+                   batch_size=self.batch_size,
+                   linger_ms=self.linger_ms)
+        
+        timeout = self.linger_ms / 1000.0
+        
+        try:
+            batch_count = 0
+            
+            while self._running:
+                msgs = self.consumer.consume(num_messages=self.batch_size, timeout=timeout)
+                self._maybe_report_stats()
+                
+                if not msgs:
+                    continue
+                
+                batch_start = time.perf_counter()
+                user_events = []
+                content_events = []
+                
+                for msg in msgs:
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            logger.debug("Reached end of partition")
+                        else:
+                            logger.error("Consumer error", error=msg.error())
+                        continue
+                    
+                    if msg.topic() == 'user-events':
+                        event = decode_user_message(msg)
+                        if event:
+                            user_events.append(event)
+                    elif msg.topic() == 'content-events':
+                        if self.content_processor:
+                            event = decode_content_message(msg)
+                            if event:
+                                content_events.append(event)
+                
+                if user_events:
+                    self.user_processor.process_batch(user_events)
+                if self.content_processor and (user_events or content_events):
+                    self.content_processor.process_batch(user_events + content_events)
+                if self.subreddit_processor and user_events:
+                    self.subreddit_processor.process_batch(user_events)
+                
+                batch_ms = (time.perf_counter() - batch_start) * 1000
+                self.message_count += len(msgs)
+                batch_count += 1
+                
+                writer_stats = {}
+                if self.offline_writer:
+                    stats = self.offline_writer.stats()
+                    writer_stats = {
+                        'offline_queue_depth': stats['queue_depth'],
+                        'offline_last_flush_ms': stats['last_flush_ms'],
+                    }
+                
+                logger.info("Processed batch",
+                           batch=batch_count,
+                           size=len(msgs),
+                           user_events=len(user_events),
+                           content_events=len(content_events),
+                           duration_ms=round(batch_ms, 2),
+                           events_per_second=round(len(msgs) / (batch_ms / 1000), 1) if batch_ms else None,
+                           total=self.message_count,
+                           **writer_stats)
+                
+                self._maybe_prune_windows()
+                self._maybe_publish_sample()
+                
+        except KeyboardInterrupt:
+            logger.info("Shutting down stream consumer")
+        finally:
+            self.close()
+
+    
+    def _maybe_prune_windows(self):
+        """Drop expired sliding windows at most once per prune interval"""
+        if time.monotonic() - self._last_prune < self.prune_interval_seconds:
+            return
+        
+        pruned = self.user_processor.prune_windows()
+        self._last_prune = time.monotonic()
+        logger.info("User state cache", pruned=pruned, **self.user_processor.stats())
+        
+        if self.content_processor:
+            pruned = self.content_processor.prune_windows()
+            logger.info("Post state cache", pruned=pruned, **self.content_processor.stats())
+
+        if self.subreddit_processor:
+            pruned = self.subreddit_processor.prune_windows()
+            logger.info("Subreddit state cache", pruned=pruned, **self.subreddit_processor.stats())
+    
+    def _on_revoke(self, consumer, partitions):
+        """
+        Partitions are moving to another consumer (rebalance, worker restart)
+        Cached state (users, and posts and subreddits if enabled) is spilled to
+        Redis and forgotten, so the next owner reloads it, and if this process
+        gets those users back later it reloads them too instead of writing
+        counts that missed the other owner's updates. Users aren't mapped to
+        partitions here, so the whole cache goes. Offline rows are then flushed and offsets committed so the next
+        owner starts after what's been written.
+        """
+        spilled = self._spill_states()
+        if self.offline_writer:
+            self.offline_writer.flush(wait=True)
+        try:
+            consumer.commit(asynchronous=False)
+        except KafkaException as e:
+            # Nothing consumed since the last commit
+            logger.debug("No offsets committed on revoke", error=str(e))
+        
+        logger.info("Partitions revoked", partitions=len(partitions), **spilled)
+    
+    def _spill_states(self) -> Dict[str, int]:
+        """Spill every processor's cached state to Redis, returns how many entities each held"""
+        spilled = {'spilled_users': self.user_processor.spill_states()}
+        if self.content_processor:
+            spilled['spilled_posts'] = self.content_processor.spill_states()
+        if self.subreddit_processor:
+            spilled['spilled_subreddits'] = self.subreddit_processor.spill_states()
+        return spilled
+    
+    def _maybe_publish_sample(self):
+        """Publish the updated-user sample once its interval has rolled over"""
+        if self.update_sampler:
+            self.update_sampler.maybe_publish()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Throughput since the last call and consumer lag over assigned partitions"""
+        now = time.monotonic()
+        elapsed = now - self._last_stats
+        processed = self.message_count - self._last_stats_count
+        self._last_stats = now
+        self._last_stats_count = self.message_count
+        
+        lag = 0
+        partitions = 0
+        try:
+            for tp in self.consumer.position(self.consumer.assignment()):
+                # Cached high watermark comes from fetch responses, no broker round trip
+                _, high = self.consumer.get_watermark_offsets(tp, cached=True)
+                if high >= 0 and tp.offset >= 0:
+                    lag += max(0, high - tp.offset)
+                partitions += 1
+        except Exception as e:
+            logger.debug("Failed to compute consumer lag", error=str(e))
+        
+        return {
+            'messages': self.message_count,
+            'messages_per_second': round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+            'lag': lag,
+            'partitions': partitions,
+        }
+    
+    def _maybe_report_stats(self):
+        """Hand stats to on_stats at most once per stats interval"""
+        if self.on_stats is None:
+            return
+        if time.monotonic() - self._last_stats < self.stats_interval_seconds:
+            return
+        
+        try:
+            self.on_stats(self.stats())
+        except Exception as e:
+            logger.error("Failed to report consumer stats", error=str(e))
+    
+    def stop(self):
+        """Ask the run loop to exit after the current poll or batch"""
+        self._running = False
+    
+    def close(self):
+        """Spill cached state and flush pending offline rows, then close the Kafka consumer"""
+        # Post and subreddit state only reaches Redis when spilled, all-time counts included
+        spilled = self._spill_states()
+        logger.info("Spilled cached state", **spilled)
+        if self.offline_writer:
+            self.offline_writer.close()
+        self.consumer.close()
+        logger.info("Stream consumer closed")
+
+
+def decode_user_message(msg) -> Optional[codec.UserEventRecord]:
+    """Decode a user event message in the encoding named by its headers, None if it's bad"""
+    try:
+        return codec.decode_user_event(msg.value(), codec.message_encoding(msg.headers()))
+    except Exception as e:
+        logger.error("Failed to decode event", error=str(e), raw=msg.value()[:100])
+        return None
+
+
+def decode_content_message(msg) -> Optional[codec.ContentEventRecord]:
+    """Decode a content event message in the encoding named by its headers, None if it's bad"""
+    try:
+        return codec.decode_content_event(msg.value(), codec.message_encoding(msg.headers()))
+    except Exception as e:
+        logger.error("Failed to decode content event", error=str(e), raw=msg.value()[:100])
+        return None
+
+
+def consumer_kwargs(config: Config) -> Dict[str, Any]:
+    """StreamConsumer arguments taken from Config"""
+    return dict(
+        bootstrap_servers=config.kafka.bootstrap_servers,
+        group_id=config.stream.group_id,
+        topics=[config.kafka.user_events_topic, config.kafka.content_events_topic],
+        batch_size=config.stream.batch_size,
+        linger_ms=config.stream.linger_ms,
+        max_cached_users=config.stream.max_cached_users,
+        server_side_state=config.stream.server_side_state,
+        offline_writer_enabled=config.stream.offline_writer_enabled,
+        offline_queue_size=config.stream.offline_queue_size,
+        offline_flush_rows=config.stream.offline_flush_rows,
+        offline_flush_interval_ms=config.stream.offline_flush_interval_ms,
+        update_sample_size=config.stream.update_sample_size,
+        update_sample_interval_seconds=config.stream.update_sample_interval_seconds,
+        update_sample_feature=config.stream.update_sample_feature,
+        content_features_enabled=config.stream.content_features_enabled,
+        content_state_mb=config.stream.content_state_mb,
+        subreddit_features_enabled=config.stream.subreddit_features_enabled,
+        subreddit_state_mb=config.stream.subreddit_state_mb,
+        redis_key_layout=config.redis.key_layout,
+        redis_expiry_bucket_seconds=config.redis.expiry_bucket_seconds
     )
-    consumer.run()
+
+
+def main():
+    config = Config()
+    
+    consumer = StreamConsumer(**consumer_kwargs(config))
+    
+    if config.stream.batch_size > 1:
+        consumer.run_batch()
+    else:
+        consumer.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import structlog
+from typing import Optional
+from src.common.features import SUBREDDIT_FEATURES
+from src.storage.redis_client import RedisClient
+from src.storage.postgres_client import PostgresClient
+from src.storage.offline_writer import OfflineFeatureWriter
+from src.streaming.content_feature_processor import ContentFeatureProcessor
+from src.streaming.feature_engine import FeatureEngine
+
+logger = structlog.get_logger()
+
+# SUBREDDIT_FEATURES compiled once, shared by every processor in the process
+SUBREDDIT_ENGINE = FeatureEngine(SUBREDDIT_FEATURES)
+
+
+class SubredditFeatureProcessor(ContentFeatureProcessor):
+    """
+    Computes per-subreddit features (trending posts) from user events
+    State is bounded and spilled like ContentFeatureProcessor's, keyed by
+    subreddit, and likewise needs a single consumer.
+    """
+
+    ENTITY_TYPE = "subreddit"
+
+    def __init__(self, redis_client: RedisClient, postgres_client: PostgresClient,
+                 offline_writer: Optional[OfflineFeatureWriter] = None,
+                 max_state_mb: int = 64, engine: FeatureEngine = SUBREDDIT_ENGINE):
+        super().__init__(redis_client, postgres_client, offline_writer=offline_writer,
+                         max_state_mb=max_state_mb, engine=engine)
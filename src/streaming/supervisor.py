@@ -0,0 +1,204 @@
+import os
+import queue
+import signal
+import time
+import multiprocessing
+import structlog
+from typing import Any, Dict, List, Optional
+from src.common.config import Config
+from src.streaming.stream_consumer import StreamConsumer, consumer_kwargs
+
+logger = structlog.get_logger()
+
+
+def _worker_main(worker_id: int, cpu: Optional[int], kwargs: Dict[str, Any],
+                 stats_queue, stats_interval_seconds: float):
+    """Entry point of one worker process: pin to a core and run a StreamConsumer"""
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except (AttributeError, OSError) as e:
+            logger.warning("Could not pin worker to CPU", worker_id=worker_id, cpu=cpu, error=str(e))
+
+    def report(stats: Dict[str, Any]):
+        stats_queue.put({'worker_id': worker_id, 'pid': os.getpid(), 'cpu': cpu, **stats})
+
+    consumer = StreamConsumer(**kwargs, on_stats=report, stats_interval_seconds=stats_interval_seconds)
+
+    # Supervisor stops workers with SIGTERM, let the run loop exit and flush
+    signal.signal(signal.SIGTERM, lambda signum, frame: consumer.stop())
+
+    if consumer.batch_size > 1:
+        consumer.run_batch()
+    else:
+        consumer.run()
+
+
+class ConsumerSupervisor:
+    """
+    Runs N StreamConsumer processes in the same consumer group
+    Producers key events by user_id, so each user's state stays local to the worker
+    that owns its partition and workers never need to coordinate. A worker drops
+    its cached state when a rebalance takes partitions away, and whoever owns
+    them next warms up from Redis.
+    """
+
+    def __init__(self, num_workers: int, kwargs: Dict[str, Any], pin_cpus: bool = True,
+                 report_interval_seconds: float = 10.0, max_restart_backoff: float = 30.0):
+        # Post and subreddit state is only complete in a process that sees all of an
+        # entity's events. Workers split user-keyed partitions, so each would hold a
+        # partial count, overwrite the others' values and steal their spilled state.
+        if num_workers > 1:
+            per_entity = [name for name in ("content_features_enabled", "subreddit_features_enabled")
+                          if kwargs.get(name)]
+            if per_entity:
+                raise ValueError(f"{', '.join(per_entity)} needs num_workers=1, "
+                                 f"user events are partitioned by user_id")
+
+        self.num_workers = num_workers
+        self.kwargs = kwargs
+        self.report_interval_seconds = report_interval_seconds
+        self.max_restart_backoff = max_restart_backoff
+
+        # Spawn so no Kafka or socket state leaks from the parent into workers
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stats_queue = self.ctx.Queue()
+
+        self.cpus: List[Optional[int]] = [None] * num_workers
+        if pin_cpus and hasattr(os, "sched_getaffinity"):
+            available = sorted(os.sched_getaffinity(0))
+            self.cpus = [available[i % len(available)] for i in range(num_workers)]
+
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.restarts: Dict[int, int] = {i: 0 for i in range(num_workers)}
+        self.crash_streak: Dict[int, int] = {i: 0 for i in range(num_workers)}  # Backoff exponent
+        self.started_at: Dict[int, float] = {}
+        self.next_start: Dict[int, float] = {}
+        self.worker_stats: Dict[int, Dict[str, Any]] = {}
+        self._running = True
+
+    def run(self):
+        """Start all workers, restart crashed ones and log a combined summary"""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        logger.info("Starting consumer supervisor", num_workers=self.num_workers, cpus=self.cpus)
+
+        for worker_id in range(self.num_workers):
+            self._start_worker(worker_id)
+
+        last_report = time.monotonic()
+
+        try:
+            while self._running:
+                self._drain_stats(timeout=1.0)
+                self._check_workers()
+
+                if time.monotonic() - last_report >= self.report_interval_seconds:
+                    self._log_summary()
+                    last_report = time.monotonic()
+
+        except KeyboardInterrupt:
+            logger.info("Shutting down consumer supervisor")
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        """Ask the supervisor loop to exit"""
+        self._running = False
+
+    def _start_worker(self, worker_id: int):
+        """Start (or restart) one worker process"""
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.cpus[worker_id], self.kwargs, self.stats_queue,
+                  self.report_interval_seconds),
+            name=f"stream-worker-{worker_id}",
+        )
+        process.start()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = time.monotonic()
+        logger.info("Started stream worker", worker_id=worker_id, pid=process.pid,
+                   cpu=self.cpus[worker_id])
+
+    def _check_workers(self):
+        """Restart workers that died, backing off if one keeps crashing"""
+        now = time.monotonic()
+
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+
+            if worker_id not in self.next_start:
+                # A worker that stayed up longer than the backoff ceiling was healthy,
+                # so its next crash restarts quickly again
+                if now - self.started_at[worker_id] > self.max_restart_backoff:
+                    self.crash_streak[worker_id] = 0
+                self.restarts[worker_id] += 1
+                self.crash_streak[worker_id] += 1
+                backoff = min(2 ** (self.crash_streak[worker_id] - 1), self.max_restart_backoff)
+                self.next_start[worker_id] = now + backoff
+                self.worker_stats.pop(worker_id, None)
+                logger.error("Stream worker exited", worker_id=worker_id,
+                            exitcode=process.exitcode, restart_in=backoff,
+                            restarts=self.restarts[worker_id])
+
+            if now >= self.next_start[worker_id]:
+                del self.next_start[worker_id]
+                self._start_worker(worker_id)
+
+    def _drain_stats(self, timeout: float):
+        """Collect the latest stats each worker has reported"""
+        try:
+            stats = self.stats_queue.get(timeout=timeout)
+            while True:
+                self.worker_stats[stats['worker_id']] = stats
+                stats = self.stats_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _log_summary(self):
+        """Log combined throughput and lag across workers"""
+        workers = [self.worker_stats[i] for i in sorted(self.worker_stats)]
+
+        logger.info("Consumer group summary",
+                   workers_alive=sum(1 for p in self.processes.values() if p.is_alive()),
+                   workers_reporting=len(workers),
+                   messages_per_second=round(sum(w['messages_per_second'] for w in workers), 1),
+                   messages=sum(w['messages'] for w in workers),
+                   lag=sum(w['lag'] for w in workers),
+                   restarts=sum(self.restarts.values()),
+                   per_worker=[
+                       {k: w[k] for k in ('worker_id', 'cpu', 'messages_per_second', 'lag', 'partitions')}
+                       for w in workers
+                   ])
+
+    def _shutdown(self, timeout: float = 30.0):
+        """Stop all workers, giving them time to flush before killing them"""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()   # SIGTERM, handled by the worker
+
+        deadline = time.monotonic() + timeout
+        for worker_id, process in self.processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Killing stream worker", worker_id=worker_id, pid=process.pid)
+                process.kill()
+                process.join()
+
+        logger.info("Consumer supervisor stopped")
+
+
+def main():
+    config = Config()
+
+    supervisor = ConsumerSupervisor(
+        num_workers=config.stream.num_workers,
+        kwargs=consumer_kwargs(config),
+        pin_cpus=config.stream.pin_cpus
+    )
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
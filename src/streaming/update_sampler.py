@@ -0,0 +1,99 @@
+import random
+import time
+import structlog
+from typing import Dict, List, Optional, Tuple
+from src.storage.redis_client import RedisClient
+
+logger = structlog.get_logger()
+
+
+# Activity strata by engagement score, (name, exclusive upper bound), checked in order
+ACTIVITY_STRATA: List[Tuple[str, float]] = [
+    ("low", 10),
+    ("medium", 100),
+    ("high", float("inf")),
+]
+
+
+def activity_stratum(activity: float) -> str:
+    """Stratum an entity's activity level falls into"""
+    for name, upper in ACTIVITY_STRATA:
+        if activity < upper:
+            return name
+    return ACTIVITY_STRATA[-1][0]
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream (Algorithm R), plus how many items it saw"""
+
+    __slots__ = ("capacity", "items", "seen", "_rng")
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.items: List[str] = []
+        self.seen = 0
+        self._rng = rng
+
+    def add(self, item: str):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+
+        slot = self._rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.items[slot] = item
+
+
+class UpdateSampler:
+    """
+    Reservoir sample of the entities the processor updated, per activity stratum
+    Every interval_seconds the samples and update counts are added to Redis
+    under that interval's keys (shared by all consumer processes) and reset,
+    so the consistency checker can draw from what was actually updated recently.
+    An entity updated several times in an interval can be sampled more than once.
+    """
+
+    def __init__(self, redis_client: RedisClient, entity_type: str = "user",
+                 sample_size: int = 1000, interval_seconds: float = 60.0,
+                 seed: Optional[int] = None):
+        self.redis = redis_client
+        self.entity_type = entity_type
+        self.sample_size = sample_size
+        self.interval_seconds = interval_seconds
+        self._rng = random.Random(seed)
+
+        self._interval = self._current_interval()
+        self._reservoirs: Dict[str, Reservoir] = self._new_reservoirs()
+
+    def observe(self, entity_id: str, activity: float):
+        """Record one update of entity_id, whose current activity level is activity"""
+        self._reservoirs[activity_stratum(activity)].add(entity_id)
+
+    def maybe_publish(self) -> bool:
+        """Publish and reset once the interval has rolled over, True if it did"""
+        interval = self._current_interval()
+        if interval == self._interval:
+            return False
+
+        reservoirs, published = self._reservoirs, self._interval
+        self._reservoirs = self._new_reservoirs()
+        self._interval = interval
+
+        samples = {name: (reservoir.items, reservoir.seen) for name, reservoir in reservoirs.items()}
+        try:
+            self.redis.add_update_sample(self.entity_type, published, samples,
+                                         ttl=int(self.interval_seconds * 3))
+        except Exception as e:
+            logger.error("Failed to publish update sample", error=str(e))
+            return False
+
+        logger.debug("Published update sample", interval=published,
+                    **{name: seen for name, (_, seen) in samples.items()})
+        return True
+
+    def _current_interval(self) -> int:
+        return int(time.time() // self.interval_seconds)
+
+    def _new_reservoirs(self) -> Dict[str, Reservoir]:
+        return {name: Reservoir(self.sample_size, self._rng) for name, _ in ACTIVITY_STRATA}
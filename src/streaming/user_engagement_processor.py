@@ -1,121 +1,402 @@
-import json
+import time
 import structlog
 from datetime import datetime
 from collections import defaultdict
-from typing import Dict
-from src.common.events import EventType
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+from src.common import codec
 from src.common.features import USER_FEATURES
-from src.storage.redis_client import RedisClient
-from src.storage.postgres_client import PostgresClient
+from src.storage.key_layout import encode_value
+from src.storage.redis_client import RedisClient, parse_number
+from src.storage.postgres_client import PostgresClient, OfflineFeatureRow
+from src.storage.offline_writer import OfflineFeatureWriter
+from src.streaming.feature_engine import EntityFeatures, FeatureEngine
+from src.streaming.state_store import EntityStateStore
+from src.streaming.update_sampler import UpdateSampler
 
 logger = structlog.get_logger()
 
+# Raw JSON payloads, or events the consumer already decoded (any wire format)
+UserEventInput = Union[bytes, str, codec.UserEventRecord]
+
+# USER_FEATURES compiled once, shared by every processor in the process
+USER_ENGINE = FeatureEngine(USER_FEATURES)
+
 
 class UserEngagementProcessor:
     """
     Processes user events and computes real-time engagement features
+    Feature logic comes from the USER_FEATURES registry via FeatureEngine
     Writes to BOTH Redis (online) and PostgreSQL (offline)
     """
-    
-    def __init__(self, redis_client: RedisClient, postgres_client: PostgresClient):
+
+    # entity_type of the offline rows written
+    ENTITY_TYPE = "user"
+
+    def __init__(self, redis_client: RedisClient, postgres_client: PostgresClient,
+                 offline_writer: Optional[OfflineFeatureWriter] = None,
+                 max_cached_users: int = 100000, server_side_state: bool = False,
+                 update_sampler: Optional[UpdateSampler] = None,
+                 engine: FeatureEngine = USER_ENGINE, sample_feature: Optional[str] = None):
         self.redis = redis_client
         self.postgres = postgres_client
+        self.engine = engine
+
+        # Features a cold entity's accumulators are seeded from
+        self.warm_features = engine.seedable_features()
         
-        logger.info("UserEngagementProcessor initialized with dual storage")
-    
-    def process_event(self, event_json: str):
+        # When set, counters live in Redis and are updated by a Lua script
+        # instead of the in-process state store (no partition affinity needed)
+        self.server_side_state = server_side_state
+        if server_side_state:
+            if redis_client.key_layout.name != "string":
+                raise ValueError("server_side_state needs the string Redis key layout")
+            self.scripted_counters, self.scripted_derived, self.scripted_distinct = engine.scripted_spec()
+
+        # When set, offline rows are queued for bulk COPY instead of written inline
+        self.offline_writer = offline_writer
+
+        # When set, updated users are sampled for consistency checking, stratified
+        # by sample_feature's value. Sampling is off if the registry lacks it.
+        self.update_sampler = update_sampler
+        self.sample_feature = sample_feature if sample_feature in engine.features else None
+        if update_sampler and self.sample_feature is None:
+            logger.warning("Update sampling disabled, sample feature not in registry",
+                           sample_feature=sample_feature)
+            self.update_sampler = None
+
+        # Windows are bucketed by event time, so expiry is judged against the
+        # newest event seen rather than the wall clock (consumers may lag)
+        self.latest_event_time = 0.0
+
+        # Evicted (or handed-off) state is spilled to Redis and reloaded if the entity comes
+        # back, since sketches can't be rebuilt from the feature values written. Spilled state
+        # outlives every window and feature TTL so reloads are exact. All-time aggregates
+        # (e.g. an upvote ratio) never age out, so their state doesn't expire.
+        self.spill_ttl: Optional[int] = None
+        if all(f.window_seconds for f in engine.features.values() if f.aggregation):
+            self.spill_ttl = max(max(f.window_seconds or 0, f.ttl_seconds or 0)
+                                 for f in engine.features.values())
+        self._spills: Dict[str, EntityFeatures] = {}
+        self.spilled = 0
+        self.reloaded = 0
+
+        # Per-user aggregates live here, Redis is a write-through copy of them.
+        # Each cached user costs one accumulator per distinct (events, window) in the registry.
+        self.state = EntityStateStore(max_cached_users, engine.new_state,
+                                      warmer=self._warm_states, on_evict=self._spill)
+
+        logger.info("UserEngagementProcessor initialized with dual storage",
+                   max_cached_users=max_cached_users,
+                   server_side_state=server_side_state,
+                   features=engine.order)
+
+    def process_event(self, event_json: UserEventInput):
         """Process a single user event"""
+        self.process_batch([event_json])
+
+    def process_batch(self, event_jsons: List[UserEventInput]):
+        """
+        Process a batch of user events
+        Events are grouped by user so each user's features are written once per batch,
+        with all Redis updates pipelined and all offline rows written in one INSERT
+        """
+        parsed = self._parse_events(event_jsons)
+        if not parsed:
+            return
+
+        if self.server_side_state:
+            self._process_scripted(parsed, max(event.timestamp for _, event in parsed))
+            return
+
         try:
-            event_data = json.loads(event_json)
-            event_type = event_data.get('event_type')
-            user_id = event_data.get('user_id')
-            
-            if not user_id:
-                return
-            
-            # Update counters based on event type
-            if event_type == EventType.USER_CLICK.value:
-                self._process_click(user_id)
-            elif event_type == EventType.USER_VIEW.value:
-                self._process_view(user_id)
-            elif event_type in [EventType.USER_UPVOTE.value, EventType.USER_DOWNVOTE.value]:
-                self._process_vote(user_id, event_type)
-            
-            # Compute and store engagement score
-            self._compute_engagement_score(user_id)
-            
+            # Cold users are warmed from Redis together, in one pipeline, as of this batch's event time
+            batch_time = max(event.timestamp for _, event in parsed)
+            states = self.state.get_many([user_id for user_id, _ in parsed],
+                                         warmer=lambda cold: self._warm_states(cold, batch_time))
+            updates = self._apply_events(parsed, states)
+
+            # One pipeline for every online write, one bulk write for history
+            num_rows = self._store_features(updates)
+
+            logger.debug("Processed batch",
+                        num_events=len(event_jsons),
+                        num_users=len(updates),
+                        offline_rows=num_rows)
+
         except Exception as e:
-            logger.error("Failed to process event", error=str(e), event=event_json[:100])
-    
-    def _process_click(self, user_id: str):
-        """Process a click event"""
-        feature_def = USER_FEATURES["user_clicks_1h"]
-        
-        # Write to Redis (online)
-        new_value = self.redis.increment_counter(feature_def, user_id)
-        
-        # Write to PostgreSQL (offline)
-        self.postgres.store_offline_feature(
-            entity_id=user_id,
-            entity_type="user",
-            feature_name=feature_def.name,
-            feature_value=str(new_value)
-        )
-        
-        logger.debug("Processed click", user_id=user_id, value=new_value)
-    
-    def _process_view(self, user_id: str):
-        """Process a view event"""
-        feature_def = USER_FEATURES["user_views_1h"]
-        
-        # Write to Redis (online)
-        new_value = self.redis.increment_counter(feature_def, user_id)
-        
-        # Write to PostgreSQL (offline)
-        self.postgres.store_offline_feature(
-            entity_id=user_id,
-            entity_type="user",
-            feature_name=feature_def.name,
-            feature_value=str(new_value)
-        )
-        
-        logger.debug("Processed view", user_id=user_id, value=new_value)
-    
-    def _process_vote(self, user_id: str, vote_type: str):
-        """Process an upvote/downvote event"""
-        pass
-    
-    def _compute_engagement_score(self, user_id: str):
+            logger.error("Failed to process batch", error=str(e), num_events=len(event_jsons))
+        finally:
+            self._flush_spills()
+
+    def _parse_events(self, event_jsons: List[UserEventInput]) -> List[Tuple[str, codec.UserEventRecord]]:
         """
-        Compute weighted engagement score
-        Formula: (views * 1) + (clicks * 3)
+        Decode events into (user_id, event), skipping bad ones and event
+        types no feature uses
         """
-        # Get current counts from Redis
-        clicks = self.redis.get_feature(USER_FEATURES["user_clicks_1h"], user_id) or 0
-        views = self.redis.get_feature(USER_FEATURES["user_views_1h"], user_id) or 0
-        
-        # Convert to int if they're strings
-        clicks = int(clicks) if clicks else 0
-        views = int(views) if views else 0
-        
-        # Calculate weighted score
-        engagement_score = (views * 1) + (clicks * 3)
-        
-        feature_def = USER_FEATURES["user_engagement_score"]
-        
-        # Store in Redis (online)
-        self.redis.set_feature(feature_def, user_id, engagement_score)
-        
-        # Store in PostgreSQL (offline)
-        self.postgres.store_offline_feature(
-            entity_id=user_id,
-            entity_type="user",
-            feature_name=feature_def.name,
-            feature_value=str(engagement_score)
-        )
-        
-        logger.debug("Computed engagement score",
-                    user_id=user_id,
-                    score=engagement_score,
-                    views=views,
-                    clicks=clicks)
\ No newline at end of file
+        parsed = []
+        decode = self._decode
+        handles = self.engine.handles
+        entity_id = self.engine.entity_id
+        for event_json in event_jsons:
+            try:
+                event = decode(event_json)
+            except Exception as e:
+                logger.error("Failed to parse event", error=str(e), raw=event_json[:100])
+                continue
+
+            user_id = entity_id(event)
+            if not user_id or not handles(event.event_type):
+                continue
+
+            parsed.append((user_id, event))
+
+        return parsed
+
+    def _decode(self, event_json: UserEventInput) -> codec.UserEventRecord:
+        """Decoded event, JSON payloads are decoded here"""
+        if isinstance(event_json, codec.UserEventRecord):
+            return event_json
+        return codec.decode_user_event(event_json)
+
+    def _apply_events(self, parsed: List[Tuple[str, codec.UserEventRecord]],
+                      states: Dict[str, EntityFeatures]) -> Dict[str, List[Tuple[str, Any]]]:
+        """Apply parsed events to user state and return each user's changed features"""
+        # Remember which features changed and each user's latest event time
+        changed: Dict[str, FrozenSet[str]] = {}
+        user_times: Dict[str, float] = {}
+        apply = self.engine.apply
+
+        for user_id, event in parsed:
+            affected = apply(states[user_id], event)
+            previous = changed.get(user_id)
+            changed[user_id] = affected if previous is None or previous is affected else previous | affected
+
+            user_times[user_id] = max(event.timestamp, user_times.get(user_id, event.timestamp))
+
+        if user_times:
+            self.latest_event_time = max(self.latest_event_time, max(user_times.values()))
+
+        compute = self.engine.compute
+        return {user_id: compute(states[user_id], changed[user_id], event_time)
+                for user_id, event_time in user_times.items()}
+
+    def _count_events(self, parsed: List[Tuple[str, codec.UserEventRecord]]) -> Dict[str, Dict[int, int]]:
+        """Count events per user and event type code"""
+        event_counts: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        for user_id, event in parsed:
+            event_counts[user_id][event.event_type] += 1
+        return event_counts
+
+    def _process_scripted(self, parsed: List[Tuple[str, codec.UserEventRecord]], event_time: float):
+        """
+        Apply per-user event counts with the Redis update script
+        Counters, TTLs and derived features are updated in one EVALSHA per user,
+        all pipelined, and the returned values feed the offline write directly.
+        DISTINCT features are HyperLogLogs in Redis, updated in one more pipeline.
+        """
+        event_counts = self._count_events(parsed)
+        try:
+            updates = self._scripted_updates(event_counts)
+            results = self.redis.update_features_scripted_many(updates, self.scripted_derived, event_time)
+            offline_rows = self._scripted_offline_rows(updates, results)
+
+            if self.scripted_distinct:
+                distinct = self._distinct_updates(parsed)
+                online_updates, distinct_rows = self._distinct_writes(
+                    distinct, self.redis.update_distinct_many(distinct, event_time))
+                self.redis.set_features(online_updates)
+                offline_rows.extend(distinct_rows)
+
+            self._store_offline_rows(offline_rows)
+
+        except Exception as e:
+            logger.error("Failed to process scripted update", error=str(e), num_users=len(event_counts))
+
+    def _scripted_updates(self, event_counts: Dict[str, Dict[int, int]]) -> List[Tuple[str, List]]:
+        """Counter increments per user for the update script"""
+        updates = []
+        for user_id, counts in event_counts.items():
+            # Every counter is passed so derived features see fresh totals, 0 just refreshes it
+            counters = []
+            for feature_def, event_types in self.scripted_counters:
+                amount = sum(n for event_type, n in counts.items() if event_type in event_types)
+                counters.append((feature_def, amount))
+            updates.append((user_id, counters))
+        return updates
+
+    def _distinct_updates(self, parsed: List[Tuple[str, codec.UserEventRecord]]) -> List[Tuple[Any, str, List[str]]]:
+        """(feature, user_id, new values) for each DISTINCT feature a user's events touched"""
+        values: Dict[Tuple[str, str], set] = {}
+        for user_id, event in parsed:
+            for feature_def, event_types in self.scripted_distinct:
+                if event.event_type in event_types:
+                    value = getattr(event, feature_def.value_field)
+                    if value:
+                        values.setdefault((feature_def.name, user_id), set()).add(value)
+        return [(self.engine.features[name], user_id, sorted(user_values))
+                for (name, user_id), user_values in values.items()]
+
+    def _distinct_writes(self, distinct: List[Tuple[Any, str, List[str]]],
+                         counts: List[int]) -> Tuple[List, List[OfflineFeatureRow]]:
+        """Online updates and offline rows for the window counts update_distinct_many returned"""
+        changes: Dict[str, List[Tuple[str, Any]]] = defaultdict(list)
+        for (feature_def, user_id, _), count in zip(distinct, counts):
+            changes[user_id].append((feature_def.name, count))
+        return self._feature_writes(changes)
+
+    def _scripted_offline_rows(self, updates: List[Tuple[str, List]],
+                               results: List[Dict]) -> List[OfflineFeatureRow]:
+        """Offline rows for the features a scripted update changed"""
+        computed_at = datetime.utcnow()
+        offline_rows = []
+        for (user_id, counters), values in zip(updates, results):
+            changed = [feature_def.name for feature_def, amount in counters if amount]
+            changed.extend(feature_def.name for feature_def, _ in self.scripted_derived)
+            if self.update_sampler and self.sample_feature in values:
+                self.update_sampler.observe(user_id, values[self.sample_feature])
+            for feature_name in changed:
+                offline_rows.append(OfflineFeatureRow(
+                    user_id, self.ENTITY_TYPE, feature_name, str(values[feature_name]), computed_at))
+        return offline_rows
+
+    def _warm_states(self, states: Dict[str, EntityFeatures], event_time: Optional[float] = None):
+        """Reload cold users spilled earlier, seed the rest from the totals last written to Redis"""
+        spilled = self.redis.get_entity_states(self.ENTITY_TYPE, list(states))
+        unspilled = [user_id for user_id in states if user_id not in spilled]
+        stored = self.redis.get_features_with_ttl(self.warm_features, unspilled) if unspilled else {}
+        self._restore_states(states, spilled, stored, event_time)
+
+    def _restore_states(self, states: Dict[str, EntityFeatures], spilled: Dict[str, Any],
+                        stored: Dict[str, Dict], event_time: Optional[float] = None):
+        """
+        Fill cold accumulators from the serialized state spilled to Redis (which
+        carries its own bucket times) where there is some, else seed them from
+        stored (value, ttl) pairs
+        """
+        seeded = {}
+        for user_id, state in states.items():
+            if user_id in spilled:
+                self.engine.load_state(state, codec.loads(spilled[user_id]))
+                self.reloaded += 1
+            else:
+                seeded[user_id] = state
+        self._seed_states(seeded, stored, event_time)
+
+    def _seed_states(self, states: Dict[str, EntityFeatures], stored: Dict[str, Dict],
+                     event_time: Optional[float] = None):
+        """
+        Seed accumulators from stored (value, ttl) pairs
+        A key's remaining TTL tells us how long ago it was written, so the seeded
+        count is placed that far before event_time (the event time of the batch
+        being warmed for) and ages out of the window at about the right time.
+        Seeding at the wall clock instead would move the window past a lagging
+        consumer's events, which would then be dropped as late.
+        """
+        now = event_time or self.latest_event_time or time.time()
+
+        for user_id, state in states.items():
+            if user_id not in stored:
+                continue
+
+            for feature_def in self.warm_features:
+                value, ttl = stored[user_id][feature_def.name]
+                if not value:
+                    continue
+
+                written_at = now
+                if ttl > 0 and feature_def.window_seconds:
+                    written_at = now - max(0, feature_def.window_seconds - ttl)
+                self.engine.seed(state, feature_def.name, written_at, parse_number(value))
+
+    def prune_windows(self) -> int:
+        """Drop users whose windows have fully expired as of the latest event, returns how many were dropped"""
+        if not self.latest_event_time:
+            return 0
+        now = self.latest_event_time
+        return len(self.state.prune(lambda state: state.is_empty(now)))
+
+    def _spill(self, user_id: str, state: EntityFeatures):
+        """Remember an evicted user, serialized after the batch so its updates are included"""
+        self._spills[user_id] = state
+
+    def _take_spills(self) -> Dict[str, bytes]:
+        """Serialized pending spills, skipping state whose windows have all aged out"""
+        spills, self._spills = self._spills, {}
+        now = self.latest_event_time
+        return {user_id: codec.dumps(self.engine.dump_state(state))
+                for user_id, state in spills.items() if not state.is_empty(now)}
+
+    def _flush_spills(self):
+        """Write spilled state to Redis in one pipeline"""
+        payloads = self._take_spills()
+        if not payloads:
+            return
+
+        try:
+            self.redis.set_entity_states(self.ENTITY_TYPE, payloads, self.spill_ttl)
+            self.spilled += len(payloads)
+        except Exception as e:
+            logger.error("Failed to spill state", entity_type=self.ENTITY_TYPE,
+                         count=len(payloads), error=str(e))
+
+    def spill_states(self) -> int:
+        """
+        Spill every cached entity to Redis and forget it, returns how many were held
+        For partition handoff and shutdown: whoever processes them next reloads them.
+        """
+        states = self.state.clear()
+        self._spills.update(states)
+        self._flush_spills()
+        return len(states)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache and spill counters"""
+        return {**self.state.stats(), 'spilled': self.spilled, 'reloaded': self.reloaded}
+
+    def _store_features(self, updates: Dict[str, List[Tuple[str, Any]]]) -> int:
+        """
+        Write feature values to Redis (one pipeline) and PostgreSQL (one bulk write)
+        Returns the number of offline rows written
+        """
+        online_updates, offline_rows = self._feature_writes(updates)
+
+        # Write to Redis (online)
+        self.redis.set_features(online_updates)
+
+        # Write to PostgreSQL (offline)
+        self._store_offline_rows(offline_rows)
+
+        return len(offline_rows)
+
+    def _feature_writes(self, updates: Dict[str, List[Tuple[str, Any]]]) -> Tuple[List, List[OfflineFeatureRow]]:
+        """Online (feature, entity, value) updates and offline rows for a set of changes"""
+        computed_at = datetime.utcnow()
+        online_updates = []
+        offline_rows = []
+
+        for user_id, user_updates in updates.items():
+            for feature_name, value in user_updates:
+                online_updates.append((self.engine.features[feature_name], user_id, value))
+                offline_rows.append(OfflineFeatureRow(
+                    user_id, self.ENTITY_TYPE, feature_name, str(encode_value(value)), computed_at))
+                if feature_name == self.sample_feature and self.update_sampler:
+                    self.update_sampler.observe(user_id, value)
+
+        return online_updates, offline_rows
+
+    def _store_offline_rows(self, rows: List[OfflineFeatureRow]):
+        """Store offline rows, through the background writer if there is one"""
+        if self.offline_writer:
+            self.offline_writer.write_many(rows)
+        elif len(rows) == 1:
+            # Single-row path uses the prepared INSERT
+            row = rows[0]
+            self.postgres.store_offline_feature(
+                entity_id=row.entity_id,
+                entity_type=row.entity_type,
+                feature_name=row.feature_name,
+                feature_value=row.feature_value,
+                computed_at=row.computed_at
+            )
+        else:
+            self.postgres.store_offline_features(rows)
@@ -0,0 +1,116 @@
+from typing import Optional
+from src.common.features import FeatureDefinition
+
+
+class SlidingWindowCounter:
+    """
+    Sliding-window count held in a fixed ring of time buckets
+    The window covers the current bucket plus the previous (num_buckets - 1),
+    so memory is num_buckets ints however many events arrive
+    """
+
+    __slots__ = ("bucket_seconds", "num_buckets", "counts", "head", "total")
+
+    def __init__(self, bucket_seconds: float, num_buckets: int):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.counts = [0] * num_buckets
+        self.head: Optional[int] = None   # Newest bucket id seen
+        self.total = 0                    # Running sum of all buckets
+
+    @classmethod
+    def for_feature(cls, feature_def: FeatureDefinition) -> "SlidingWindowCounter":
+        """Counter sized from a windowed FeatureDefinition"""
+        return cls(feature_def.bucket_seconds, feature_def.window_buckets)
+
+    def _advance(self, bucket_id: int):
+        """Move the window forward, clearing buckets that fell out of it"""
+        if self.head is None:
+            self.head = bucket_id
+            return
+
+        gap = bucket_id - self.head
+        if gap <= 0:
+            return
+
+        if gap >= self.num_buckets:
+            # Whole window expired
+            self.counts = [0] * self.num_buckets
+            self.total = 0
+        else:
+            for b in range(self.head + 1, bucket_id + 1):
+                slot = b % self.num_buckets
+                self.total -= self.counts[slot]
+                self.counts[slot] = 0
+
+        self.head = bucket_id
+
+    def add(self, timestamp: float, amount: int = 1) -> int:
+        """Add to the bucket for timestamp and return the window total"""
+        bucket_id = int(timestamp // self.bucket_seconds)
+        self._advance(bucket_id)
+
+        # Late event that is already outside the window
+        if bucket_id <= self.head - self.num_buckets:
+            return self.total
+
+        self.counts[bucket_id % self.num_buckets] += amount
+        self.total += amount
+        return self.total
+
+    def value(self, timestamp: float) -> int:
+        """Window total as of timestamp"""
+        self._advance(int(timestamp // self.bucket_seconds))
+        return self.total
+
+    def is_empty(self, timestamp: float) -> bool:
+        """
+        True once every bucket has aged out of the window as of timestamp
+        Read-only, so checking doesn't move the window or drop later events as late
+        """
+        if self.total == 0:
+            return True
+
+        bucket_id = int(timestamp // self.bucket_seconds)
+        if bucket_id <= self.head:
+            return False
+        # Buckets still inside the window as of timestamp
+        for b in range(bucket_id - self.num_buckets + 1, self.head + 1):
+            if self.counts[b % self.num_buckets]:
+                return False
+        return True
+
+    def snapshot(self) -> list:
+        """[head, counts], JSON-serializable"""
+        return [self.head, self.counts]
+
+    def restore(self, snapshot: list):
+        """Load a snapshot() taken from a counter with the same bucket layout"""
+        self.head, counts = snapshot
+        self.counts = list(counts)
+        self.total = sum(self.counts)
+
+
+class RunningTotal:
+    """All-time total with the same interface as SlidingWindowCounter, for unwindowed features"""
+
+    __slots__ = ("total",)
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, timestamp: float, amount: int = 1) -> int:
+        self.total += amount
+        return self.total
+
+    def value(self, timestamp: float) -> int:
+        return self.total
+
+    def is_empty(self, timestamp: float) -> bool:
+        return self.total == 0
+
+    def snapshot(self):
+        return self.total
+
+    def restore(self, snapshot):
+        self.total = snapshot
@@ -1,9 +1,15 @@
 import structlog
 import time
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from src.common.config import Config, ConsistencyConfig
 from src.storage.redis_client import RedisClient
-from src.storage.postgres_client import PostgresClient
+from src.storage.feature_cache import FeatureCache
+from src.storage.postgres_client import PostgresClient, ConsistencyCheckRow
 from src.common.features import USER_FEATURES
+from src.streaming.update_sampler import ACTIVITY_STRATA
+from src.validation.statistics import LoadBudget, stratified_rate, wilson_interval
 
 logger = structlog.get_logger()
 
@@ -14,10 +20,20 @@ class ConsistencyChecker:
     This is critical for ensuring training data integrity
     """
     
-    def __init__(self):
-        self.redis = RedisClient()
+    def __init__(self, batch_size: int = 1000, max_workers: int = 4,
+                 redis_key_layout: str = "string", redis_expiry_bucket_seconds: int = 60,
+                 cache_entries: int = 0, cache_max_staleness_seconds: float = 5.0):
+        self.redis = RedisClient(key_layout=redis_key_layout,
+                                 expiry_bucket_seconds=redis_expiry_bucket_seconds)
+        if cache_entries > 0:
+            # Repeat checks of an entity within the staleness bound skip Redis
+            self.redis = FeatureCache(self.redis, max_entries=cache_entries,  # type: ignore[assignment]
+                                      max_staleness_seconds=cache_max_staleness_seconds)
         self.postgres = PostgresClient()
-        logger.info("ConsistencyChecker initialized")
+        self.batch_size = batch_size    # Entities per batch (one MGET, one query, one INSERT)
+        self.max_workers = max_workers  # Batches checked concurrently
+        logger.info("ConsistencyChecker initialized",
+                   batch_size=batch_size, max_workers=max_workers)
     
     def check_feature_consistency(self, entity_id: str, entity_type: str,
                                   feature_name: str) -> Dict[str, Any]:
@@ -67,26 +83,71 @@ class ConsistencyChecker:
         
         return result
     
+    def check_batch(self, entity_ids: List[str], entity_type: str = "user",
+                    feature_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Check every (entity, feature) pair of a batch in three round trips
+        Online values come from one MGET, offline values from one DISTINCT ON
+        query, and every result is recorded with one multi-row INSERT
+        """
+        feature_defs = [USER_FEATURES[name] for name in (feature_names or list(USER_FEATURES))]
+        names = [feature_def.name for feature_def in feature_defs]
+
+        online = self.redis.get_features_many(feature_defs, entity_ids)
+        offline = self.postgres.get_latest_offline_features(entity_ids, entity_type, names)
+
+        check_time = datetime.utcnow()
+        results = []
+        rows = []
+        for entity_id in entity_ids:
+            for name in names:
+                online_value = online[entity_id][name]
+                offline_value = offline.get((entity_id, name))
+                is_consistent = str(online_value) == str(offline_value)
+
+                difference = None
+                if not is_consistent:
+                    difference = f"Online: {online_value}, Offline: {offline_value}"
+
+                results.append({
+                    'entity_id': entity_id,
+                    'feature_name': name,
+                    'online_value': online_value,
+                    'offline_value': offline_value,
+                    'is_consistent': is_consistent
+                })
+                rows.append(ConsistencyCheckRow(
+                    check_time, entity_id, entity_type, name,
+                    str(online_value), str(offline_value), is_consistent, difference
+                ))
+
+        self.postgres.record_consistency_checks(rows)
+        return results
+
     def check_multiple_entities(self, entity_ids: List[str], 
                                 entity_type: str = "user") -> Dict[str, Any]:
-        """Check consistency for multiple entities"""
+        """Check consistency for multiple entities, batch_size at a time in parallel"""
+        start = time.perf_counter()
+        batches = [entity_ids[i:i + self.batch_size]
+                   for i in range(0, len(entity_ids), self.batch_size)]
+
         results = []
+        if len(batches) > 1 and self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="consistency-check") as executor:
+                for batch_results in executor.map(lambda batch: self.check_batch(batch, entity_type),
+                                                  batches):
+                    results.extend(batch_results)
+        else:
+            for batch in batches:
+                results.extend(self.check_batch(batch, entity_type))
+
         inconsistent_count = 0
-        
-        for entity_id in entity_ids:
-            for feature_name in USER_FEATURES.keys():
-                result = self.check_feature_consistency(
-                    entity_id=entity_id,
-                    entity_type=entity_type,
-                    feature_name=feature_name
-                )
-                
-                results.append(result)
-                
-                if not result.get('is_consistent', False):
-                    inconsistent_count += 1
-                    logger.warning("Inconsistency detected", **result)
-        
+        for result in results:
+            if not result['is_consistent']:
+                inconsistent_count += 1
+                logger.debug("Inconsistency detected", **result)
+
         consistency_rate = 1.0 - (inconsistent_count / len(results)) if results else 0.0
         
         summary = {
@@ -97,36 +158,151 @@ class ConsistencyChecker:
             'results': results
         }
         
-        logger.info("Consistency check complete", **summary)
+        logger.info("Consistency check complete",
+                   total_checks=summary['total_checks'],
+                   inconsistent=inconsistent_count,
+                   consistency_rate=consistency_rate,
+                   batches=len(batches),
+                   duration_ms=round((time.perf_counter() - start) * 1000, 2))
         return summary
     
-    def continuous_monitoring(self, interval_seconds: int = 60):
-        """Continuously monitor consistency"""
+    def sample_recent_entities(self, size: int, entity_type: str = "user",
+                               sample_interval_seconds: float = 60.0,
+                               min_per_stratum: int = 10) -> Dict[str, Tuple[List[str], int]]:
+        """
+        Draw about size entities from those the stream processor updated in the
+        last complete sample interval (see src.streaming.update_sampler)
+        Entities are allocated to activity strata in proportion to their update
+        counts, with at least min_per_stratum each so quiet strata still get an
+        estimate. Returns {stratum: (entity ids, updates seen)}.
+        """
+        interval = int(time.time() // sample_interval_seconds) - 1
+        strata = [name for name, _ in ACTIVITY_STRATA]
+        available = self.redis.get_update_sample(entity_type, interval, strata, size)
+
+        total_seen = sum(seen for _, seen in available.values())
+        sample: Dict[str, Tuple[List[str], int]] = {}
+        for stratum, (entity_ids, seen) in available.items():
+            if not entity_ids:
+                continue
+            share = int(size * seen / total_seen) if total_seen else 0
+            sample[stratum] = (entity_ids[:max(share, min_per_stratum)], seen)
+        return sample
+
+    def summarize_cycle(self, results: Dict[str, Tuple[List[Dict[str, Any]], int]],
+                        confidence: float = 0.95) -> Dict[str, Any]:
+        """
+        Consistency rates with confidence intervals for one monitoring cycle
+        results: {stratum: (check results, updates seen)}. The overall and
+        per-feature rates are stratified estimates weighted by updates seen,
+        per-stratum rates use Wilson intervals.
+        """
+        overall: Dict[str, Tuple[int, int, int]] = {}
+        by_feature: Dict[str, Dict[str, Tuple[int, int, int]]] = {}
+        by_stratum: Dict[str, Dict[str, Any]] = {}
+
+        for stratum, (stratum_results, seen) in results.items():
+            consistent = sum(1 for r in stratum_results if r['is_consistent'])
+            overall[stratum] = (consistent, len(stratum_results), seen)
+
+            low, high = wilson_interval(consistent, len(stratum_results), confidence)
+            by_stratum[stratum] = {
+                'checks': len(stratum_results),
+                'updates_seen': seen,
+                'consistency_rate': consistent / len(stratum_results) if stratum_results else 0.0,
+                'ci': (round(low, 4), round(high, 4)),
+            }
+
+            counts: Dict[str, List[int]] = {}
+            for r in stratum_results:
+                feature_counts = counts.setdefault(r['feature_name'], [0, 0])
+                feature_counts[0] += r['is_consistent']
+                feature_counts[1] += 1
+            for feature_name, (feature_consistent, checks) in counts.items():
+                by_feature.setdefault(feature_name, {})[stratum] = (feature_consistent, checks, seen)
+
+        rate, low, high = stratified_rate(overall, confidence)
+        features = {}
+        for feature_name, strata in by_feature.items():
+            feature_rate, feature_low, feature_high = stratified_rate(strata, confidence)
+            features[feature_name] = {
+                'consistency_rate': round(feature_rate, 4),
+                'ci': (round(feature_low, 4), round(feature_high, 4)),
+            }
+
+        return {
+            'total_checks': sum(trials for _, trials, _ in overall.values()),
+            'consistency_rate': round(rate, 4),
+            'ci': (round(low, 4), round(high, 4)),
+            'confidence': confidence,
+            'features': features,
+            'strata': by_stratum,
+        }
+
+    def continuous_monitoring(self, config: Optional[ConsistencyConfig] = None,
+                              entity_type: str = "user"):
+        """
+        Continuously monitor consistency of recently updated entities
+        Each cycle samples from the processor's update sample, sized to the
+        Redis/PostgreSQL load budget, and logs rates with confidence intervals
+        """
+        config = config or ConsistencyConfig()
+        num_features = len(USER_FEATURES)
+        budget = LoadBudget(
+            interval_seconds=config.interval_seconds,
+            redis_keys_per_second=config.redis_keys_per_second,
+            postgres_rows_per_second=config.postgres_rows_per_second,
+            max_duty_cycle=config.max_duty_cycle,
+            min_entities=config.min_sample_size,
+            max_entities=config.max_sample_size,
+        )
         logger.info("Starting continuous consistency monitoring",
-                   interval=interval_seconds)
+                   interval=config.interval_seconds,
+                   max_sample_size=config.max_sample_size)
         
         try:
             while True:
-                # Sample random users
-                sample_users = [f"user_{i}" for i in range(0, 10)]
-                
-                summary = self.check_multiple_entities(sample_users)
-                
-                logger.info("Consistency check cycle",
-                           consistency_rate=summary['consistency_rate'],
-                           inconsistent=summary['inconsistent'])
-                
-                time.sleep(interval_seconds)
+                cycle_start = time.perf_counter()
+                size = budget.next_size(num_features)
+                sample = self.sample_recent_entities(size, entity_type,
+                                                     config.sample_interval_seconds,
+                                                     config.min_per_stratum)
+
+                results = {}
+                for stratum, (entity_ids, seen) in sample.items():
+                    summary = self.check_multiple_entities(entity_ids, entity_type)
+                    results[stratum] = (summary['results'], seen)
+
+                duration = time.perf_counter() - cycle_start
+                checked = sum(len(entity_ids) for entity_ids, _ in sample.values())
+                budget.record(checked, duration, num_features)
+
+                if checked:
+                    logger.info("Consistency check cycle",
+                               entities=checked,
+                               duration_ms=round(duration * 1000, 2),
+                               next_sample_size=budget.entities,
+                               **self.summarize_cycle(results, config.confidence))
+                else:
+                    logger.info("Consistency check cycle, no recently updated entities")
+
+                time.sleep(max(0.0, config.interval_seconds - duration))
                 
         except KeyboardInterrupt:
             logger.info("Stopping consistency monitoring")
 
 
 def main():
-    checker = ConsistencyChecker()
+    config = Config()
+    checker = ConsistencyChecker(batch_size=config.consistency.batch_size,
+                                 max_workers=config.consistency.max_workers,
+                                 redis_key_layout=config.redis.key_layout,
+                                 redis_expiry_bucket_seconds=config.redis.expiry_bucket_seconds,
+                                 cache_entries=config.redis.local_cache_entries,
+                                 cache_max_staleness_seconds=config.redis.local_cache_max_staleness_seconds)
     
     # Run continuous monitoring
-    checker.continuous_monitoring(interval_seconds=30)
+    checker.continuous_monitoring(config.consistency)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+import math
+from typing import Dict, Tuple
+
+# Two-sided normal quantiles for the confidence levels we report
+Z_SCORES = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+
+def z_score(confidence: float) -> float:
+    """Normal quantile for a two-sided confidence level"""
+    if confidence not in Z_SCORES:
+        raise ValueError(f"Unsupported confidence level {confidence}, use one of {sorted(Z_SCORES)}")
+    return Z_SCORES[confidence]
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Wilson score interval for a proportion
+    Unlike the normal approximation it stays inside [0, 1] and behaves at
+    rates close to 1, which is where consistency rates live
+    """
+    if trials == 0:
+        return 0.0, 1.0
+
+    z = z_score(confidence)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def stratified_rate(strata: Dict[str, Tuple[int, int, int]],
+                    confidence: float = 0.95) -> Tuple[float, float, float]:
+    """
+    Population rate estimated from a stratified sample
+    strata: {name: (successes, trials, population size)}, each stratum's rate
+    is weighted by its share of the population. Returns (rate, low, high),
+    the interval from the normal approximation of the stratified variance
+    with a finite population correction.
+    """
+    sampled = {name: s for name, s in strata.items() if s[1] > 0}
+    population = sum(size for _, _, size in sampled.values())
+    if population == 0:
+        return 0.0, 0.0, 1.0
+
+    rate = 0.0
+    variance = 0.0
+    for successes, trials, size in sampled.values():
+        weight = size / population
+        p = successes / trials
+        rate += weight * p
+        if trials > 1:
+            correction = max(0.0, 1 - trials / size) if size else 1.0
+            variance += weight * weight * correction * p * (1 - p) / (trials - 1)
+
+    margin = z_score(confidence) * math.sqrt(variance)
+    return rate, max(0.0, rate - margin), min(1.0, rate + margin)
+
+
+class LoadBudget:
+    """
+    Sizes each consistency cycle to a Redis/PostgreSQL load budget
+    A checked entity costs one Redis key and about two offline rows (one
+    read, one recorded result) per feature. The sample is capped by the
+    per-second budgets over the cycle interval, and adapts to observed cost:
+    if a cycle spends more than max_duty_cycle of its interval checking, the
+    next one is halved, otherwise it grows by a quarter back towards the cap.
+    """
+
+    def __init__(self, interval_seconds: float, redis_keys_per_second: float,
+                 postgres_rows_per_second: float, max_duty_cycle: float = 0.1,
+                 min_entities: int = 10, max_entities: int = 10000):
+        self.interval_seconds = interval_seconds
+        self.redis_keys_per_second = redis_keys_per_second
+        self.postgres_rows_per_second = postgres_rows_per_second
+        self.max_duty_cycle = max_duty_cycle
+        self.min_entities = min_entities
+        self.max_entities = max_entities
+        self.entities = max_entities
+
+    def cap(self, num_features: int) -> int:
+        """Most entities a cycle may check within the per-second budgets"""
+        redis_cap = self.redis_keys_per_second * self.interval_seconds / num_features
+        postgres_cap = self.postgres_rows_per_second * self.interval_seconds / (2 * num_features)
+        return max(self.min_entities, min(self.max_entities, int(redis_cap), int(postgres_cap)))
+
+    def next_size(self, num_features: int) -> int:
+        """Entities to check in the next cycle"""
+        self.entities = max(self.min_entities, min(self.entities, self.cap(num_features)))
+        return self.entities
+
+    def record(self, checked: int, duration_seconds: float, num_features: int):
+        """Adapt to how long the last cycle took"""
+        if not checked:
+            return
+
+        if duration_seconds > self.max_duty_cycle * self.interval_seconds:
+            self.entities = max(self.min_entities, self.entities // 2)
+        else:
+            self.entities = min(self.cap(num_features), int(self.entities * 1.25) + 1)
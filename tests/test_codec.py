@@ -0,0 +1,136 @@
+import math
+from datetime import datetime, timezone
+import pytest
+from src.common import codec
+from src.common.event_generator import EventGenerator
+from src.common.events import ContentEvent, EventType, UserEvent
+
+ENCODINGS = [codec.ENCODING_JSON, codec.ENCODING_BINARY]
+TIMESTAMP = datetime(2024, 5, 17, 12, 30, 45, 123456, tzinfo=timezone.utc)
+
+
+def user_event(**overrides) -> UserEvent:
+    fields = dict(event_id="0e9aee2d-9272-49f7-bc3f-76f1c475f61f", event_type=EventType.USER_VIEW,
+                  timestamp=TIMESTAMP, user_id="user_1", post_id="post_2", subreddit="aww",
+                  session_id="session_3", device_type="mobile", duration_seconds=12.5)
+    fields.update(overrides)
+    return UserEvent(**fields)
+
+
+def content_event(**overrides) -> ContentEvent:
+    fields = dict(event_id="9d36c5ca-7eff-4ec8-bfd8-12e6a81f6c93", event_type=EventType.POST_CREATED,
+                  timestamp=TIMESTAMP, post_id="post_2", author_id="user_1", subreddit="science",
+                  title="Ünïcode title", content_type="video", word_count=250)
+    fields.update(overrides)
+    return ContentEvent(**fields)
+
+
+def decode(event, payload: bytes, encoding: bytes):
+    if isinstance(event, UserEvent):
+        return codec.decode_user_event(payload, encoding)
+    return codec.decode_content_event(payload, encoding)
+
+
+def assert_round_trip(event, encoding: bytes):
+    """Every field decodes back to what was encoded"""
+    record = decode(event, codec.encode_event(event, encoding), encoding)
+    expected = event.model_dump()
+    for name, value in record._asdict().items():
+        original = expected[name]
+        if name == 'event_type':
+            assert codec.EVENT_TYPES_BY_CODE[value] == original
+        elif name == 'timestamp':
+            assert value == pytest.approx(original.timestamp(), abs=1e-6)
+        elif isinstance(original, float):
+            assert math.isclose(value, original)
+        else:
+            assert value == original, name
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("event", [
+    user_event(),
+    user_event(event_type=EventType.USER_CLICK, duration_seconds=None),
+    user_event(device_type="smart-tv"),   # Not interned in the binary format
+    content_event(),
+    content_event(event_type=EventType.POST_EDITED, word_count=None, content_type="poll"),
+], ids=["user", "user-no-duration", "user-other-device", "content", "content-optional-unset"])
+def test_round_trip(event, encoding):
+    assert_round_trip(event, encoding)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_round_trip_generated_events(encoding):
+    generator = EventGenerator()
+    for _ in range(200):
+        assert_round_trip(generator.generate_user_event(), encoding)
+        assert_round_trip(generator.generate_content_event(), encoding)
+
+
+@pytest.mark.parametrize("event", [user_event(), user_event(duration_seconds=None), content_event()])
+def test_binary_reencode_is_identical(event):
+    payload = codec.encode_event_binary(event)
+    assert codec.encode_event_binary(codec.to_model(decode(event, payload, codec.ENCODING_BINARY))) == payload
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_encode_record_matches_encode_event(encoding):
+    for event in (user_event(), content_event()):
+        record = decode(event, codec.encode_event(event, encoding), encoding)
+        assert decode(event, codec.encode_record(record, encoding), encoding) == record
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_encode_records_matches_encode_record(encoding):
+    events = [user_event(), user_event(duration_seconds=None, device_type="smart-tv")]
+    records = [decode(event, codec.encode_event(event, encoding), encoding) for event in events]
+    columns = [list(column) for column in zip(*records)]
+    assert codec.encode_records(codec.UserEventRecord, columns, encoding) == \
+        [codec.encode_record(record, encoding) for record in records]
+
+
+@pytest.mark.parametrize("event_id", [
+    "0E9AEE2D-9272-49F7-BC3F-76F1C475F61F",   # Upper case
+    "0e9aee2d927249f7bc3f76f1c475f61f",       # No hyphens
+    "{0e9aee2d-9272-49f7-bc3f-76f1c475f61f}",
+    "not-a-uuid",
+])
+def test_binary_rejects_non_canonical_uuid(event_id):
+    with pytest.raises(ValueError):
+        codec.encode_event_binary(user_event(event_id=event_id))
+
+
+def test_json_keeps_non_canonical_uuid():
+    event = user_event(event_id="0E9AEE2D-9272-49F7-BC3F-76F1C475F61F")
+    assert codec.decode_user_event(codec.encode_event_json(event)).event_id == event.event_id
+
+
+@pytest.mark.parametrize("headers, expected", [
+    (None, codec.ENCODING_JSON),
+    ([], codec.ENCODING_JSON),
+    ([("trace", b"abc")], codec.ENCODING_JSON),
+    ([("trace", b"abc"), (codec.ENCODING_HEADER, codec.ENCODING_BINARY)], codec.ENCODING_BINARY),
+    ([(codec.ENCODING_HEADER, codec.ENCODING_JSON)], codec.ENCODING_JSON),
+])
+def test_message_encoding(headers, expected):
+    assert codec.message_encoding(headers) == expected
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_header_selects_decoder(encoding):
+    event = user_event()
+    headers = [(codec.ENCODING_HEADER, encoding)]
+    payload = codec.encode_event(event, encoding)
+    assert codec.decode_user_event(payload, codec.message_encoding(headers)).user_id == "user_1"
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        codec.decode_user_event(codec.encode_event_json(user_event()), b"avro")
+
+
+def test_unknown_binary_version_is_rejected():
+    payload = bytearray(codec.encode_event_binary(user_event()))
+    payload[0] = codec.BINARY_VERSION + 1
+    with pytest.raises(ValueError):
+        codec.decode_user_event(bytes(payload), codec.ENCODING_BINARY)
@@ -0,0 +1,191 @@
+import asyncio
+import pytest
+from src.common.features import CONTENT_FEATURES, USER_FEATURES
+from src.serving.feature_service import FeatureBatcher, FeatureLookup, resolve_features
+
+CLICKS = USER_FEATURES["user_clicks_1h"]
+VIEWS = USER_FEATURES["user_views_1h"]
+POST_VIEWS = CONTENT_FEATURES["post_views_10m"]
+
+
+class FakeRedis:
+    """AsyncRedisClient.get_raw_values_many over a dict, reads can be held open with gate"""
+
+    def __init__(self, values=None):
+        self.values = values or {}   # (feature_name, entity_id) -> raw value
+        self.reads = []
+        self.gate = None
+        self.error = None
+
+    async def get_raw_values_many(self, requests, chunk_size=1000):
+        self.reads.append([(f.name, e) for feature_defs, entity_ids in requests
+                           for e in entity_ids for f in feature_defs])
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return [[self.values.get((f.name, e)) for e in entity_ids for f in feature_defs]
+                for feature_defs, entity_ids in requests]
+
+
+class FakePostgres:
+    def __init__(self, values=None, error=None):
+        self.values = values or {}   # (entity_id, feature_name) -> value, as latest_features returns
+        self.error = error
+        self.queries = []
+
+    async def get_latest_offline_features(self, entity_ids, entity_type, feature_names):
+        self.queries.append((entity_type, sorted(entity_ids), sorted(feature_names)))
+        if self.error is not None:
+            raise self.error
+        return {key: value for key, value in self.values.items()
+                if key[0] in entity_ids and key[1] in feature_names}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_lookups_share_one_read():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3", ("user_views_1h", "user_2"): "4"})
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, max_wait_ms=5)
+        results = await asyncio.gather(
+            batcher.get([CLICKS], ["user_1"]),
+            batcher.get([CLICKS, VIEWS], ["user_1", "user_2"]),
+            batcher.get([POST_VIEWS], ["post_1"]),
+        )
+        return results, batcher.stats()
+
+    results, stats = run(lookups())
+    assert results[0] == [FeatureLookup("3", "redis")]
+    assert results[1] == [FeatureLookup("3", "redis"), FeatureLookup(None, None),
+                          FeatureLookup(None, None), FeatureLookup("4", "redis")]
+    assert results[2] == [FeatureLookup(None, None)]
+    assert len(redis.reads) == 1
+    assert sorted(redis.reads[0]) == sorted([("user_clicks_1h", "user_1"), ("user_views_1h", "user_1"),
+                                             ("user_clicks_1h", "user_2"), ("user_views_1h", "user_2"),
+                                             ("post_views_10m", "post_1")])
+    assert stats["lookups"] == 6
+    assert stats["coalesced"] == 1
+    assert (stats["batches"], stats["avg_batch_keys"], stats["redis_misses"]) == (1, 5.0, 3)
+    assert stats["in_flight"] == 0
+
+
+def test_full_batch_flushes_without_waiting():
+    redis = FakeRedis()
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, max_batch_keys=2, max_wait_ms=10_000)
+        await asyncio.wait_for(batcher.get([CLICKS, VIEWS], ["user_1"]), 1)
+        return batcher.stats()
+
+    assert run(lookups())["batches"] == 1
+
+
+def test_lookup_joins_read_in_flight():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3"})
+
+    async def lookups():
+        redis.gate = asyncio.Event()
+        batcher = FeatureBatcher(redis, max_wait_ms=0)
+        first = asyncio.create_task(batcher.get([CLICKS], ["user_1"]))
+        while not redis.reads:
+            await asyncio.sleep(0)
+        second = asyncio.create_task(batcher.get([CLICKS], ["user_1"]))
+        await asyncio.sleep(0.01)
+        redis.gate.set()
+        return await first, await second, batcher.stats()
+
+    first, second, stats = run(lookups())
+    assert first == second == [FeatureLookup("3", "redis")]
+    assert len(redis.reads) == 1
+    assert stats["coalesced"] == 1
+
+
+def test_read_error_reaches_every_lookup():
+    redis = FakeRedis()
+    redis.error = ConnectionError("down")
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, max_wait_ms=1)
+        results = await asyncio.gather(batcher.get([CLICKS], ["user_1"]), batcher.get([CLICKS], ["user_1"]),
+                                       batcher.get([VIEWS], ["user_2"]), return_exceptions=True)
+        # Nothing is left behind, the next lookup reads again
+        redis.error = None
+        retry = await batcher.get([CLICKS], ["user_1"])
+        return results, retry, batcher.stats()
+
+    results, retry, stats = run(lookups())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert retry == [FeatureLookup(None, None)]
+    assert stats["errors"] == 1
+    assert stats["in_flight"] == 0
+    assert len(redis.reads) == 2
+
+
+def test_cancelled_lookup_does_not_cancel_shared_key():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3"})
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, max_wait_ms=5)
+        cancelled = asyncio.create_task(batcher.get([CLICKS], ["user_1"]))
+        kept = asyncio.create_task(batcher.get([CLICKS], ["user_1"]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept
+
+    assert run(lookups()) == [FeatureLookup("3", "redis")]
+
+
+def test_offline_fallback_for_redis_misses():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3"})
+    postgres = FakePostgres({("user_1", "user_views_1h"): "10", ("user_1", "user_clicks_1h"): "1",
+                             ("post_1", "post_views_10m"): "7"})
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, postgres, max_wait_ms=1)
+        return await batcher.get([CLICKS, VIEWS], ["user_1"]), await batcher.get([POST_VIEWS], ["post_1"]), \
+            batcher.stats()
+
+    user, post, stats = run(lookups())
+    assert user == [FeatureLookup("3", "redis"), FeatureLookup("10", "postgres")]
+    assert post == [FeatureLookup("7", "postgres")]
+    # Only what Redis was missing, one query per entity type
+    assert postgres.queries == [("user", ["user_1"], ["user_views_1h"]), ("post", ["post_1"], ["post_views_10m"])]
+    assert stats["postgres_hits"] == 2
+
+
+def test_offline_fallback_error_keeps_redis_values():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3"})
+    postgres = FakePostgres(error=ConnectionError("down"))
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, postgres, max_wait_ms=1)
+        return await batcher.get([CLICKS, VIEWS], ["user_1"]), batcher.stats()
+
+    result, stats = run(lookups())
+    assert result == [FeatureLookup("3", "redis"), FeatureLookup(None, None)]
+    assert stats["errors"] == 0
+
+
+def test_close_finishes_queued_lookups():
+    redis = FakeRedis({("user_clicks_1h", "user_1"): "3"})
+
+    async def lookups():
+        batcher = FeatureBatcher(redis, max_wait_ms=10_000)
+        lookup = asyncio.create_task(batcher.get([CLICKS], ["user_1"]))
+        await asyncio.sleep(0)
+        await batcher.close()
+        return await asyncio.wait_for(lookup, 1)
+
+    assert run(lookups()) == [FeatureLookup("3", "redis")]
+
+
+def test_resolve_features():
+    assert resolve_features("user", ["user_views_1h", "user_clicks_1h"]) == [VIEWS, CLICKS]
+    with pytest.raises(ValueError, match="entity_type"):
+        resolve_features("comment", ["user_views_1h"])
+    with pytest.raises(ValueError, match="post_views_10m"):
+        resolve_features("user", ["user_clicks_1h", "post_views_10m"])
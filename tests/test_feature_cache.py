@@ -0,0 +1,238 @@
+import threading
+import time
+import pytest
+from src.common.features import USER_FEATURES
+from src.storage.feature_cache import FeatureCache
+
+CLICKS = USER_FEATURES["user_clicks_1h"]
+VIEWS = USER_FEATURES["user_views_1h"]
+SCORE = USER_FEATURES["user_engagement_score"]
+DISTINCT = USER_FEATURES["user_distinct_subreddits_1h"]
+
+
+class FakeRedisClient:
+    """RedisClient's feature reads and writes over a dict, reads can be held open with gate"""
+
+    def __init__(self):
+        self.values = {}   # (feature_name, entity_id) -> raw value
+        self.reads = []
+        self.gate = None
+        self.error = None
+
+    def get_raw_values(self, feature_defs, entity_ids, chunk_size=1000):
+        self.reads.append([(f.name, e) for e in entity_ids for f in feature_defs])
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [self.values.get((f.name, e)) for e in entity_ids for f in feature_defs]
+
+    def set_feature(self, feature_def, entity_id, value, ttl=None):
+        self.values[(feature_def.name, entity_id)] = str(value)
+
+    def set_features(self, updates):
+        for feature_def, entity_id, value in updates:
+            self.set_feature(feature_def, entity_id, value)
+
+    def increment_counter(self, feature_def, entity_id, amount=1):
+        key = (feature_def.name, entity_id)
+        self.values[key] = str(int(self.values.get(key) or 0) + amount)
+        return int(self.values[key])
+
+    def update_features_scripted_many(self, updates, derived=None, event_time=None):
+        results = []
+        for entity_id, counters in updates:
+            for feature_def, amount in counters:
+                self.increment_counter(feature_def, entity_id, amount)
+            for feature_def, weights in derived or []:
+                self.values[(feature_def.name, entity_id)] = str(sum(
+                    weight * int(self.values.get((name, entity_id)) or 0) for name, weight in weights.items()))
+            results.append({})
+        return results
+
+    def update_distinct_many(self, updates, event_time=None):
+        for feature_def, entity_id, values in updates:
+            self.values[(feature_def.name, entity_id)] = str(len(values))
+        return [len(values) for _, _, values in updates]
+
+    def get_update_sample(self, entity_type, interval, strata, count):
+        return {stratum: ([], 0) for stratum in strata}
+
+
+@pytest.fixture
+def redis():
+    return FakeRedisClient()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_read_through(redis):
+    redis.values[("user_clicks_1h", "user_1")] = "3"
+    cache = FeatureCache(redis)
+    assert cache.get_feature(CLICKS, "user_1") == 3
+    assert cache.get_feature(CLICKS, "user_1") == 3
+    assert cache.get_feature(CLICKS, "user_2") is None
+    assert cache.get_feature(CLICKS, "user_2") is None   # Missing values are cached too
+    assert len(redis.reads) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+
+
+def test_only_misses_are_read(redis):
+    redis.values.update({("user_clicks_1h", "user_1"): "1", ("user_views_1h", "user_2"): "2"})
+    cache = FeatureCache(redis)
+    cache.get_feature(CLICKS, "user_1")
+    assert cache.get_features_many([CLICKS, VIEWS], ["user_1", "user_2"]) == {
+        "user_1": {"user_clicks_1h": 1, "user_views_1h": None},
+        "user_2": {"user_clicks_1h": None, "user_views_1h": 2},
+    }
+    assert set(redis.reads[1]) >= {("user_views_1h", "user_1"), ("user_clicks_1h", "user_2"),
+                                   ("user_views_1h", "user_2")}
+    assert cache.get_multiple_features([CLICKS, VIEWS], "user_2") == {"user_clicks_1h": None, "user_views_1h": 2}
+    assert len(redis.reads) == 2
+
+
+def test_staleness(redis):
+    cache = FeatureCache(redis, max_staleness_seconds=0)
+    cache.get_feature(CLICKS, "user_1")
+    cache.get_feature(CLICKS, "user_1")
+    assert len(redis.reads) == 2
+
+
+def test_lru_eviction(redis):
+    cache = FeatureCache(redis, max_entries=2)
+    for entity_id in ("a", "b", "a", "c"):
+        cache.get_feature(CLICKS, entity_id)
+    assert cache.stats()["evictions"] == 1
+    cache.get_feature(CLICKS, "a")    # Recently used, kept
+    assert len(redis.reads) == 3
+    cache.get_feature(CLICKS, "b")
+    assert len(redis.reads) == 4
+
+
+def test_concurrent_misses_share_one_read(redis):
+    redis.values[("user_clicks_1h", "user_1")] = "7"
+    redis.gate = threading.Event()
+    cache = FeatureCache(redis)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_feature(CLICKS, "user_1")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()["coalesced"] == 3)
+    redis.gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [7] * 4
+    assert len(redis.reads) == 1
+    assert cache.stats()["misses"] == 4
+
+
+def test_read_error_reaches_waiters(redis):
+    redis.gate = threading.Event()
+    redis.error = ConnectionError("down")
+    cache = FeatureCache(redis)
+    errors = []
+
+    def read():
+        try:
+            cache.get_raw_values([CLICKS], ["user_1"])
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()["coalesced"] == 2)
+    redis.gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    # Failed reads aren't cached
+    redis.error = None
+    assert cache.get_feature(CLICKS, "user_1") is None
+    assert len(redis.reads) == 2
+
+
+def test_invalidated_read_in_flight_is_not_cached(redis):
+    redis.values[("user_clicks_1h", "user_1")] = "1"
+    redis.gate = threading.Event()
+    cache = FeatureCache(redis)
+    reader = threading.Thread(target=cache.get_feature, args=(CLICKS, "user_1"))
+    reader.start()
+    wait_for(lambda: redis.reads)
+    cache.invalidate(["user_1"])
+    redis.gate.set()
+    reader.join()
+
+    redis.gate = None
+    redis.values[("user_clicks_1h", "user_1")] = "2"
+    assert cache.get_feature(CLICKS, "user_1") == 2
+
+
+@pytest.mark.parametrize("write", [
+    lambda cache: cache.set_feature(CLICKS, "user_1", 5),
+    lambda cache: cache.set_features([(CLICKS, "user_1", 5)]),
+    lambda cache: cache.increment_counter(CLICKS, "user_1", 4),
+    lambda cache: cache.update_features_scripted("user_1", [(CLICKS, 4)]),
+    lambda cache: cache.update_features_scripted_many([("user_1", [(CLICKS, 4)])]),
+    lambda cache: cache.update_distinct_many([(CLICKS, "user_1", list("abcde"))]),
+], ids=["set_feature", "set_features", "increment_counter", "update_features_scripted",
+        "update_features_scripted_many", "update_distinct_many"])
+def test_writes_invalidate(redis, write):
+    redis.values[("user_clicks_1h", "user_1")] = "1"
+    redis.values[("user_clicks_1h", "user_2")] = "1"
+    cache = FeatureCache(redis)
+    cache.get_features_many([CLICKS], ["user_1", "user_2"])
+
+    write(cache)
+    assert cache.get_feature(CLICKS, "user_1") == 5
+    assert cache.get_feature(CLICKS, "user_2") == 1    # Untouched, still cached
+    assert len(redis.reads) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_scripted_update_invalidates_derived(redis):
+    cache = FeatureCache(redis)
+    cache.get_multiple_features([CLICKS, SCORE, DISTINCT], "user_1")
+    cache.update_features_scripted_many([("user_1", [(CLICKS, 2)])], derived=[(SCORE, {"user_clicks_1h": 1.5})])
+    assert cache.get_multiple_features([CLICKS, SCORE, DISTINCT], "user_1") == \
+        {"user_clicks_1h": 2, "user_engagement_score": 3.0, "user_distinct_subreddits_1h": None}
+    assert redis.reads[-1] == [("user_clicks_1h", "user_1"), ("user_engagement_score", "user_1")]
+
+
+def test_failed_write_still_invalidates(redis):
+    cache = FeatureCache(redis)
+    cache.get_feature(CLICKS, "user_1")
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("down")
+
+    redis.update_features_scripted_many = fail
+    with pytest.raises(ConnectionError):
+        cache.update_features_scripted("user_1", [(CLICKS, 1)])
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_clear(redis):
+    cache = FeatureCache(redis)
+    cache.get_features_many([CLICKS, VIEWS], ["user_1", "user_2"])
+    cache.clear()
+    assert cache.stats()["size"] == 0
+    cache.get_feature(CLICKS, "user_1")
+    assert len(redis.reads) == 2
+
+
+def test_only_allowed_methods_pass_through(redis):
+    cache = FeatureCache(redis)
+    assert cache.get_update_sample("user", 1, ["low"], 10) == {"low": ([], 0)}
+    with pytest.raises(AttributeError):
+        cache.client
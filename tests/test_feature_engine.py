@@ -0,0 +1,208 @@
+import json
+import pytest
+from src.common import codec
+from src.common.events import EventType
+from src.common.features import (Aggregation, CONTENT_FEATURES, FeatureDefinition, FeatureType,
+                                 SUBREDDIT_FEATURES, USER_FEATURES)
+from src.streaming.feature_engine import FeatureEngine
+
+
+def feature(name: str, **fields) -> FeatureDefinition:
+    return FeatureDefinition(name=name, feature_type=FeatureType.REAL_TIME, description="", **fields)
+
+
+def registry(*features: FeatureDefinition):
+    return {f.name: f for f in features}
+
+
+FEATURES = registry(
+    feature("clicks_1m", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.COUNT,
+            window_seconds=60, window_buckets=6),
+    feature("views", source_events=(EventType.USER_VIEW,), aggregation=Aggregation.COUNT),
+    feature("watch_time_1m", source_events=(EventType.USER_VIEW,), aggregation=Aggregation.SUM,
+            value_field="duration_seconds", window_seconds=60, window_buckets=6),
+    feature("upvote_ratio", source_events=(EventType.USER_UPVOTE, EventType.USER_DOWNVOTE),
+            aggregation=Aggregation.RATIO, numerator_events=(EventType.USER_UPVOTE,)),
+    feature("click_rate_1m", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.RATE,
+            window_seconds=60, window_buckets=6, rate_seconds=10),
+    feature("score", derived_from={"clicks_1m": 2.0, "views": 1.0}),
+    feature("boosted_score", derived_from={"score": 10.0}),
+)
+
+
+def event(event_type: str, timestamp: float, duration_seconds=None, user_id="user_1"):
+    return codec.UserEventRecord(None, codec.EVENT_TYPE_CODES[event_type], timestamp, user_id,
+                                 "post_1", "aww", None, None, duration_seconds)
+
+
+def apply_all(engine: FeatureEngine, state, events):
+    changed = set()
+    for e in events:
+        changed |= engine.apply(state, e) or set()
+    return changed
+
+
+def values(engine: FeatureEngine, state, timestamp: float):
+    return dict(engine.compute(state, frozenset(engine.features), timestamp))
+
+
+@pytest.fixture
+def engine():
+    return FeatureEngine(FEATURES)
+
+
+def test_dispatch(engine):
+    assert engine.handles(codec.USER_CLICK)
+    assert engine.handles(codec.USER_DOWNVOTE)
+    assert not engine.handles(codec.USER_COMMENT)
+    assert engine.entity_key == "user_id"
+    assert engine.entity_id(event("user_click", 0)) == "user_1"
+
+
+def test_unused_event_type_changes_nothing(engine):
+    state = engine.new_state()
+    assert engine.apply(state, event("user_comment", 0)) is None
+    assert state.is_empty(0)
+
+
+def test_apply_returns_affected_features(engine):
+    state = engine.new_state()
+    assert engine.apply(state, event("user_click", 0)) == \
+        {"clicks_1m", "click_rate_1m", "score", "boosted_score"}
+    assert engine.apply(state, event("user_upvote", 0)) == {"upvote_ratio"}
+
+
+def test_count_and_sum(engine):
+    state = engine.new_state()
+    apply_all(engine, state, [
+        event("user_click", 0), event("user_click", 5),
+        event("user_view", 1, duration_seconds=4.5), event("user_view", 2, duration_seconds=None),
+    ])
+    result = values(engine, state, 10)
+    assert result["clicks_1m"] == 2
+    assert result["views"] == 2
+    assert result["watch_time_1m"] == 4.5
+
+
+def test_windowed_features_expire(engine):
+    state = engine.new_state()
+    apply_all(engine, state, [event("user_click", 0), event("user_view", 0, duration_seconds=3.0)])
+    result = values(engine, state, 120)
+    assert result["clicks_1m"] == 0
+    assert result["watch_time_1m"] == 0
+    assert result["views"] == 1    # All-time
+
+
+def test_ratio(engine):
+    state = engine.new_state()
+    assert values(engine, state, 0)["upvote_ratio"] == 0.0
+    apply_all(engine, state, [event("user_upvote", 0), event("user_upvote", 1), event("user_upvote", 2),
+                              event("user_downvote", 3)])
+    assert values(engine, state, 4)["upvote_ratio"] == 0.75
+
+
+def test_rate(engine):
+    state = engine.new_state()
+    apply_all(engine, state, [event("user_click", t) for t in range(0, 60, 5)])
+    # 12 clicks in a 60s window, per 10s
+    assert values(engine, state, 59)["click_rate_1m"] == 2.0
+
+
+def test_derived_follow_dependencies(engine):
+    order = engine.order
+    assert order.index("clicks_1m") < order.index("score") < order.index("boosted_score")
+    assert order.index("views") < order.index("score")
+
+    state = engine.new_state()
+    apply_all(engine, state, [event("user_click", 0), event("user_view", 0)])
+    assert engine.compute(state, frozenset({"score", "boosted_score"}), 1) == \
+        [("score", 3.0), ("boosted_score", 30.0)]
+
+
+def test_shared_slots():
+    engine = FeatureEngine(registry(
+        feature("clicks", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.COUNT,
+                window_seconds=60),
+        feature("click_rate", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.RATE,
+                window_seconds=60),
+    ))
+    assert len(engine.new_state().slots) == 1
+
+
+def test_derived_cycle_is_rejected():
+    with pytest.raises(ValueError, match="derived from itself"):
+        FeatureEngine(registry(
+            feature("a", derived_from={"b": 1.0}),
+            feature("b", derived_from={"a": 1.0}),
+        ))
+
+
+def test_self_derived_is_rejected():
+    with pytest.raises(ValueError, match="derived from itself"):
+        FeatureEngine(registry(feature("a", derived_from={"a": 1.0})))
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown feature"):
+        FeatureEngine(registry(feature("a", derived_from={"missing": 1.0})))
+
+
+def test_feature_without_computation_is_rejected():
+    with pytest.raises(ValueError, match="neither"):
+        FeatureEngine(registry(feature("a")))
+
+
+def test_mixed_entity_keys_are_rejected():
+    with pytest.raises(ValueError, match="entity_key"):
+        FeatureEngine(registry(
+            feature("a", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.COUNT),
+            feature("b", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.COUNT,
+                    entity_key="post_id"),
+        ))
+
+
+def test_dump_and_load_state(engine):
+    state = engine.new_state()
+    apply_all(engine, state, [event("user_click", 0), event("user_view", 1, duration_seconds=2.0),
+                              event("user_downvote", 2)])
+    restored = engine.new_state()
+    engine.load_state(restored, json.loads(json.dumps(engine.dump_state(state))))
+    assert values(engine, restored, 3) == values(engine, state, 3)
+
+
+def test_load_state_ignores_other_layouts(engine):
+    state = engine.new_state()
+    engine.load_state(state, [5])
+    assert state.is_empty(0)
+
+
+def test_seed(engine):
+    assert {f.name for f in engine.seedable_features()} == {"clicks_1m", "views", "watch_time_1m"}
+    state = engine.new_state()
+    engine.seed(state, "views", 0, 7)
+    engine.apply(state, event("user_view", 1))
+    assert values(engine, state, 1)["views"] == 8
+
+
+def test_scripted_spec():
+    engine = FeatureEngine(registry(
+        feature("clicks", source_events=(EventType.USER_CLICK,), aggregation=Aggregation.COUNT),
+        feature("score", derived_from={"clicks": 2.0}),
+    ))
+    counters, derived, distinct = engine.scripted_spec()
+    assert [(f.name, codes) for f, codes in counters] == [("clicks", frozenset({codec.USER_CLICK}))]
+    assert [(f.name, weights) for f, weights in derived] == [("score", {"clicks": 2.0})]
+    assert distinct == []
+
+
+def test_scripted_spec_rejects_unsupported_features(engine):
+    with pytest.raises(ValueError, match="update script"):
+        engine.scripted_spec()
+
+
+@pytest.mark.parametrize("features", [USER_FEATURES, CONTENT_FEATURES, SUBREDDIT_FEATURES],
+                         ids=["user", "content", "subreddit"])
+def test_registries_compile(features):
+    engine = FeatureEngine(features)
+    assert sorted(engine.order) == sorted(features)
+    assert engine.state_size_bytes() > 0
@@ -0,0 +1,240 @@
+import re
+from pathlib import Path
+import pytest
+from src.common.features import (ENTITY_FEATURES, ENTITY_HASH_PREFIXES, CONTENT_FEATURES, FeatureDefinition,
+                                 FeatureType, USER_FEATURES)
+from src.storage.key_layout import HashKeyLayout, StringKeyLayout, make_key_layout
+
+CLICKS = USER_FEATURES["user_clicks_1h"]            # ttl 3600
+SCORE = USER_FEATURES["user_engagement_score"]      # ttl 3600
+POST_VIEWS = CONTENT_FEATURES["post_views_10m"]     # ttl 600
+NOW = 1_000_000.0
+
+GO_KEY_LAYOUT = Path(__file__).parent.parent / "feature-api" / "internal" / "storage" / "key_layout.go"
+
+
+class FakeRedis:
+    """Just the commands the key layouts queue, TTLs are recorded but never run down"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def ttl(self, key):
+        if key not in self.data:
+            return -2
+        return self.ttls.get(key, -1)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def hsetnx(self, key, field, value):
+        fields = self.data.setdefault(key, {})
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    def expire(self, key, seconds, nx=False, gt=False):
+        current = self.ttls.get(key)
+        if (nx and current is not None) or (gt and (current is None or seconds <= current)):
+            return False
+        self.ttls[key] = seconds
+        return True
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def __len__(self):
+        return len(self.commands)
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def write(layout, redis: FakeRedis, updates, now=NOW, **kwargs):
+    pipeline = redis.pipeline()
+    layout.queue_set(pipeline, updates, now, **kwargs)
+    pipeline.execute()
+
+
+def read(layout, redis: FakeRedis, feature_defs, entity_ids, now=NOW, chunk_size=1000):
+    pipeline = redis.pipeline()
+    layout.queue_get(pipeline, feature_defs, entity_ids, chunk_size)
+    return layout.parse_get(pipeline.execute(), feature_defs, entity_ids, now), len(pipeline)
+
+
+def read_with_ttl(layout, redis: FakeRedis, feature_defs, entity_ids, now=NOW):
+    pipeline = redis.pipeline()
+    layout.queue_get_with_ttl(pipeline, feature_defs, entity_ids)
+    return layout.parse_get_with_ttl(pipeline.execute(), feature_defs, entity_ids, now)
+
+
+def test_encode_field():
+    layout = HashKeyLayout(60)
+    # Expiry at 1300s is bucket 22 (1320s), rounded up
+    assert layout.encode_field(3.5, 300, 1000) == "22|3.5"
+    assert layout.encode_field({"a": 1}, 300, 1000) == '22|{"a": 1}'
+    assert layout.encode_field("x|y", 300, 1000) == "22|x|y"
+
+
+def test_decode_field():
+    layout = HashKeyLayout(60)
+    assert layout.decode_field("22|3.5", 1000) == ("3.5", 320)
+    assert layout.decode_field("22|x|y", 1000) == ("x|y", 320)
+    assert layout.decode_field("22|3.5", 1319) == ("3.5", 1)
+    assert layout.decode_field("22|3.5", 1320) == (None, -2)
+    assert layout.decode_field(None, 1000) == (None, -2)
+
+
+@pytest.mark.parametrize("bucket_seconds", [1, 60, 300])
+def test_expiry_bucket_round_trip(bucket_seconds):
+    """A field lives at least its TTL and less than one bucket longer"""
+    layout = HashKeyLayout(bucket_seconds)
+    for now in (NOW, NOW + 0.5, NOW + 59.9, NOW + 61):
+        for ttl in (1, 59, 60, 600, 3600):
+            raw = layout.encode_field(7, ttl, now)
+            value, remaining = layout.decode_field(raw, now)
+            assert value == "7"
+            assert ttl <= remaining + 1 and remaining < ttl + bucket_seconds
+            assert layout.decode_field(raw, now + ttl - 1)[0] == "7"
+            assert layout.decode_field(raw, now + ttl + bucket_seconds)[0] is None
+
+
+def test_hash_write_and_read():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4), (SCORE, "user_1", 2.5), (CLICKS, "user_2", 1),
+                          (POST_VIEWS, "post_1", 9)])
+
+    assert set(redis.data) == {"h:u:user_1", "h:u:user_2", "h:p:post_1"}
+    assert set(redis.data["h:u:user_1"]) == {"c1h", "es"}
+    # Longest-lived field plus a bucket
+    assert redis.ttls["h:u:user_1"] == 3660
+    assert redis.ttls["h:p:post_1"] == 660
+
+    values, commands = read(layout, redis, [CLICKS, SCORE], ["user_1", "user_2", "user_3"])
+    assert values == ["4", "2.5", "1", None, None, None]
+    assert commands == 3    # One HMGET per entity
+
+
+def test_hash_read_mixed_entity_keys():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "x", 1), (POST_VIEWS, "x", 2)])
+    values, commands = read(layout, redis, [POST_VIEWS, CLICKS], ["x"])
+    assert values == ["2", "1"]
+    assert commands == 2
+
+
+def test_hash_fields_expire_on_read():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4), (POST_VIEWS, "user_1", 9)])
+    write(layout, redis, [(SCORE, "user_1", 1.0)], now=NOW + 3000)
+    values, _ = read(layout, redis, [CLICKS, SCORE], ["user_1"], now=NOW + 3700)
+    assert values == [None, "1.0"]
+    assert read(layout, redis, [POST_VIEWS], ["user_1"], now=NOW + 700)[0] == [None]
+
+
+def test_hash_ttl_override_and_extension():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4)], ttl=60)
+    assert redis.ttls["h:u:user_1"] == 120
+    assert read(layout, redis, [CLICKS], ["user_1"], now=NOW + 200)[0] == [None]
+    write(layout, redis, [(SCORE, "user_1", 1)])
+    assert redis.ttls["h:u:user_1"] == 3660
+    write(layout, redis, [(CLICKS, "user_1", 5)], ttl=60)
+    assert redis.ttls["h:u:user_1"] == 3660    # Never shortened
+
+
+def test_hash_read_with_ttl():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4)])
+    # Expires at the end of NOW + 3600's bucket, 1003620s
+    assert read_with_ttl(layout, redis, [CLICKS, SCORE], ["user_1"], now=NOW + 100) == \
+        {"user_1": {"user_clicks_1h": ("4", 3520), "user_engagement_score": (None, -2)}}
+
+
+def test_hash_if_missing_keeps_existing():
+    layout, redis = HashKeyLayout(60), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4)])
+    pipeline = redis.pipeline()
+    layout.queue_set_with_ttl(pipeline, [(CLICKS, "user_1", 8, 3600), (SCORE, "user_1", 2, 3600)], NOW,
+                              if_missing=True)
+    pipeline.execute()
+    assert read(layout, redis, [CLICKS, SCORE], ["user_1"])[0] == ["4", "2"]
+
+
+def test_hash_layout_needs_ttl_and_field_code():
+    layout = HashKeyLayout(60)
+    no_ttl = FeatureDefinition(name="a", feature_type=FeatureType.REAL_TIME, description="", field_code="a")
+    no_code = FeatureDefinition(name="b", feature_type=FeatureType.REAL_TIME, description="", ttl_seconds=60)
+    with pytest.raises(ValueError, match="TTL"):
+        write(layout, FakeRedis(), [(no_ttl, "user_1", 1)])
+    with pytest.raises(ValueError, match="field_code"):
+        write(layout, FakeRedis(), [(no_code, "user_1", 1)])
+    with pytest.raises(ValueError, match="field_code"):
+        read(layout, FakeRedis(), [no_code], ["user_1"])
+
+
+def test_string_write_and_read():
+    layout, redis = StringKeyLayout(), FakeRedis()
+    write(layout, redis, [(CLICKS, "user_1", 4), (SCORE, "user_1", [1, 2]), (CLICKS, "user_2", 1)])
+    assert redis.data["feature:user_clicks_1h:user_1"] == "4"
+    assert redis.data["feature:user_engagement_score:user_1"] == "[1, 2]"
+    assert redis.ttls["feature:user_clicks_1h:user_1"] == 3600
+
+    values, commands = read(layout, redis, [CLICKS, SCORE], ["user_1", "user_2"], chunk_size=3)
+    assert values == ["4", "[1, 2]", "1", None]
+    assert commands == 2    # MGETs of at most chunk_size keys
+    assert read_with_ttl(layout, redis, [CLICKS, SCORE], ["user_2"]) == \
+        {"user_2": {"user_clicks_1h": ("1", 3600), "user_engagement_score": (None, -2)}}
+
+
+def test_make_key_layout():
+    assert isinstance(make_key_layout(), StringKeyLayout)
+    assert make_key_layout("string").name == "string"
+    layout = make_key_layout("hash", expiry_bucket_seconds=15)
+    assert isinstance(layout, HashKeyLayout)
+    assert layout.expiry_bucket_seconds == 15
+    with pytest.raises(ValueError, match="Unknown Redis key layout"):
+        make_key_layout("json")
+
+
+def test_field_codes_are_unique():
+    for features in ENTITY_FEATURES.values():
+        codes = [feature.field_code for feature in features.values()]
+        assert all(codes) and len(set(codes)) == len(codes)
+
+
+def test_go_reader_field_codes_match():
+    """feature-api reads the hash layout with its own copy of the field codes"""
+    go_fields = {name: (prefix, code) for name, prefix, code in
+                 re.findall(r'"(\w+)":\s*\{"(\w+)",\s*"(\w+)"\}', GO_KEY_LAYOUT.read_text())}
+    assert go_fields == {feature.name: (ENTITY_HASH_PREFIXES[feature.entity_key], feature.field_code)
+                         for features in ENTITY_FEATURES.values() for feature in features.values()}
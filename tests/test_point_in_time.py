@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from src.common.features import FeatureDefinition, FeatureType
+from src.storage.point_in_time import point_in_time_join
+
+T0 = datetime(2024, 5, 17, 12, 0, 0)
+
+
+def feature(name: str, ttl_seconds=None) -> FeatureDefinition:
+    return FeatureDefinition(name=name, feature_type=FeatureType.REAL_TIME, description="",
+                             ttl_seconds=ttl_seconds)
+
+
+CLICKS = feature("clicks", ttl_seconds=3600)
+VIEWS = feature("views")
+
+
+def at(seconds: float) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+
+class FakePostgres:
+    """offline_features history, filtered the way get_offline_feature_history's query is"""
+
+    def __init__(self, rows):
+        self.rows = rows   # (entity_id, feature_name, feature_value, computed_at)
+        self.calls = []
+
+    def get_offline_feature_history(self, entity_ids, entity_type, feature_names,
+                                    start=None, end=None, itersize=10000):
+        self.calls.append((list(entity_ids), start, end))
+        return [row for row in self.rows
+                if row[0] in entity_ids and row[1] in feature_names
+                and (start is None or row[3] >= start) and (end is None or row[3] <= end)]
+
+
+def labels(*rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["entity_id", "timestamp"])
+
+
+def test_no_future_leakage():
+    # Values are the second they were computed at, so a leak shows as a value past the label
+    rng = np.random.default_rng(3)
+    history = [(f"user_{e}", name, str(s), at(s))
+               for e in range(5) for name in ("clicks", "views")
+               for s in rng.choice(1000, size=30, replace=False).tolist()]
+    label_rows = [(f"user_{e}", at(s)) for e in range(5) for s in rng.integers(0, 1000, size=20).tolist()]
+
+    result = point_in_time_join(FakePostgres(history), labels(*label_rows), [CLICKS, VIEWS])
+
+    for row in result.itertuples():
+        label_second = (row.timestamp - T0).total_seconds()
+        for name in ("clicks", "views"):
+            past = [int(value) for entity_id, feature_name, value, _ in history
+                    if entity_id == row.entity_id and feature_name == name and int(value) <= label_second]
+            expected = max(past) if past else None
+            value = getattr(row, name)
+            if expected is None:
+                assert np.isnan(value)
+            else:
+                assert value == expected <= label_second
+
+
+def test_equal_timestamp_is_included():
+    history = [("user_1", "clicks", "1", at(0)), ("user_1", "clicks", "2", at(10)),
+               ("user_1", "clicks", "3", at(11))]
+    result = point_in_time_join(FakePostgres(history), labels(("user_1", at(10))), [CLICKS])
+    assert result["clicks"].tolist() == [2]
+
+
+def test_entity_without_prior_value():
+    history = [("user_1", "clicks", "5", at(100)), ("user_2", "clicks", "7", at(0))]
+    result = point_in_time_join(FakePostgres(history),
+                                labels(("user_1", at(50)), ("user_2", at(50)), ("user_3", at(50))),
+                                [CLICKS])
+    clicks = result["clicks"].tolist()
+    assert np.isnan(clicks[0])    # Only a later value
+    assert clicks[1] == 7
+    assert np.isnan(clicks[2])    # No history at all
+
+
+def test_row_order_and_chunking():
+    history = [(f"user_{e}", "views", str(e * 10 + s), at(s)) for e in range(4) for s in range(0, 100, 10)]
+    label_rows = labels(("user_3", at(55)), ("user_0", at(5)), ("user_2", at(99)), ("user_0", at(-1)))
+    postgres = FakePostgres(history)
+
+    result = point_in_time_join(postgres, label_rows, [VIEWS], chunk_entities=2)
+    assert result["entity_id"].tolist() == ["user_3", "user_0", "user_2", "user_0"]
+    assert result["views"].tolist()[:3] == [80, 0, 110]
+    assert np.isnan(result["views"].tolist()[3])
+    assert len(postgres.calls) == 2
+    assert result.equals(point_in_time_join(FakePostgres(history), label_rows, [VIEWS]))
+
+
+def test_ttl_drops_stale_values():
+    history = [("user_1", "clicks", "1", at(0)), ("user_1", "views", "2", at(0))]
+    postgres = FakePostgres(history)
+    result = point_in_time_join(postgres, labels(("user_1", at(3599)), ("user_1", at(3601))),
+                                [CLICKS], use_ttl=True)
+    assert result["clicks"].tolist()[0] == 1
+    assert np.isnan(result["clicks"].tolist()[1])
+    # History before the longest ttl isn't read
+    assert postgres.calls[0][1] == at(3599) - timedelta(seconds=3600)
+
+    # A feature without a ttl never goes stale
+    result = point_in_time_join(FakePostgres(history), labels(("user_1", at(10 ** 6))),
+                                [CLICKS, VIEWS], use_ttl=True)
+    assert np.isnan(result["clicks"].tolist()[0])
+    assert result["views"].tolist() == [2]
+
+
+def test_timezone_aware_labels():
+    history = [("user_1", "clicks", "1", at(0)), ("user_1", "clicks", "2", at(7200))]
+    label_rows = labels(("user_1", pd.Timestamp(at(3600)).tz_localize("UTC").tz_convert("Europe/Berlin")))
+    result = point_in_time_join(FakePostgres(history), label_rows, [CLICKS])
+    assert result["clicks"].tolist() == [1]
+
+
+@pytest.mark.parametrize("label_rows", [labels(), labels(("user_1", at(0)))], ids=["no-rows", "no-history"])
+def test_empty(label_rows):
+    result = point_in_time_join(FakePostgres([]), label_rows, [CLICKS])
+    assert list(result.columns) == ["entity_id", "timestamp", "clicks"]
+    assert result["clicks"].isna().all()
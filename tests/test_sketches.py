@@ -0,0 +1,272 @@
+import json
+from collections import Counter
+import numpy as np
+import pytest
+from src.common.events import EventType
+from src.common.features import Aggregation, FeatureDefinition, FeatureType
+from src.streaming.sketches import (CountMinSketch, HyperLogLog, SlidingWindowDistinct,
+                                    SlidingWindowTopK, SpaceSaving)
+
+
+def zipf_items(n: int, distinct: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, distinct + 1) ** 1.1
+    return [f"post_{i}" for i in rng.choice(distinct, size=n, p=weights / weights.sum())]
+
+
+def json_round_trip(snapshot):
+    return json.loads(json.dumps(snapshot))
+
+
+@pytest.mark.parametrize("precision", [10, 12])
+@pytest.mark.parametrize("cardinality", [100, 5000, 50000])
+def test_hll_error_within_bound(precision, cardinality):
+    sketch = HyperLogLog(precision)
+    for i in range(cardinality):
+        sketch.add(f"user_{i}")
+    assert abs(sketch.count() - cardinality) <= 3 * sketch.standard_error * cardinality
+
+
+def test_hll_ignores_duplicates():
+    sketch = HyperLogLog(10)
+    for _ in range(5):
+        for i in range(500):
+            sketch.add(i)
+    assert abs(sketch.count() - 500) <= 3 * sketch.standard_error * 500
+
+
+def test_hll_empty():
+    assert HyperLogLog(10).count() == 0
+
+
+def test_hll_precision_is_validated():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(17)
+
+
+def test_hll_merge_is_union():
+    left, right, both = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    for i in range(0, 6000):
+        left.add(i)
+        both.add(i)
+    for i in range(4000, 10000):
+        right.add(i)
+        both.add(i)
+    left.merge(right)
+    assert np.array_equal(left.registers, both.registers)
+    assert abs(left.count() - 10000) <= 3 * left.standard_error * 10000
+
+
+def test_hll_merge_needs_same_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+def test_hll_bytes_round_trip():
+    sketch = HyperLogLog(8)
+    for i in range(1000):
+        sketch.add(i)
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == 8
+    assert restored.count() == sketch.count()
+    restored.add("new")   # Writable copy, not a view of the bytes
+
+
+def test_count_min_error_within_bound():
+    items = zipf_items(20000, 5000)
+    exact = Counter(items)
+    sketch = CountMinSketch(512, 4)
+    for item in items:
+        sketch.add(item)
+
+    errors = [sketch.estimate(item) - count for item, count in exact.items()]
+    # Never underestimates, and exceeds e/w of the stream with probability at most e^-depth
+    assert min(errors) >= 0
+    over_bound = sum(error > sketch.epsilon * len(items) for error in errors)
+    assert over_bound <= 2 * sketch.delta * len(exact)
+    # Heavy hitters are counted closely
+    for item, count in exact.most_common(10):
+        assert sketch.estimate(item) - count <= sketch.epsilon * len(items)
+
+
+def test_count_min_amounts_and_unseen_items():
+    sketch = CountMinSketch(256, 4)
+    sketch.add("a", 5)
+    sketch.add("a")
+    assert sketch.estimate("a") == 6
+    assert sketch.estimate("never") == 0
+
+
+def test_count_min_depth_is_validated():
+    with pytest.raises(ValueError):
+        CountMinSketch(256, 0)
+
+
+def test_count_min_merge():
+    items = zipf_items(5000, 1000)
+    left, right, both = CountMinSketch(256, 4), CountMinSketch(256, 4), CountMinSketch(256, 4)
+    for i, item in enumerate(items):
+        (left if i % 2 else right).add(item)
+        both.add(item)
+    left.merge(right)
+    assert np.array_equal(left.counts, both.counts)
+    with pytest.raises(ValueError):
+        left.merge(CountMinSketch(512, 4))
+
+
+def test_count_min_bytes_round_trip():
+    sketch = CountMinSketch(128, 3)
+    for item in zipf_items(1000, 100):
+        sketch.add(item)
+    restored = CountMinSketch.from_bytes(sketch.to_bytes())
+    assert (restored.width, restored.depth) == (128, 3)
+    assert np.array_equal(restored.counts, sketch.counts)
+    restored.add("new")
+
+
+def test_space_saving_keeps_heavy_hitters():
+    items = zipf_items(20000, 5000)
+    exact = Counter(items)
+    summary = SpaceSaving(64)
+    for item in items:
+        summary.add(item)
+
+    assert len(summary) == 64
+    top = summary.top(5)
+    assert [item for item, _ in top] == [item for item, _ in exact.most_common(5)]
+    # Counts are upper bounds
+    for item, count in summary.counts.items():
+        assert count >= exact[item]
+
+
+def test_space_saving_exact_below_capacity():
+    summary = SpaceSaving(10)
+    for item, amount in (("a", 3), ("b", 1), ("a", 2), ("c", 4)):
+        summary.add(item, amount)
+    assert summary.top(2) == [("a", 5), ("c", 4)]
+
+
+def test_space_saving_merge():
+    left, right = SpaceSaving(3), SpaceSaving(3)
+    for item, amount in (("a", 5), ("b", 3), ("c", 1)):
+        left.add(item, amount)
+    for item, amount in (("b", 4), ("d", 2), ("e", 1)):
+        right.add(item, amount)
+    left.merge(right)
+    assert len(left) == 3
+    assert left.top(3) == [("b", 7), ("a", 5), ("d", 2)]
+
+
+def test_windowed_distinct():
+    window = SlidingWindowDistinct(10, 6, precision=10)
+    for i in range(300):
+        window.add(i * 0.1, f"user_{i}")         # Buckets 0-2
+    for i in range(200, 600):
+        window.add(30 + i * 0.05, f"user_{i}")   # Buckets 3-5, 200 repeats
+    assert abs(window.value(59) - 600) <= 3 * 0.0325 * 600
+    # Buckets 0-2 age out
+    assert abs(window.value(89) - 400) <= 3 * 0.0325 * 400
+    assert window.value(1000) == 0
+
+
+def test_windowed_distinct_late_event_is_dropped():
+    window = SlidingWindowDistinct(10, 6)
+    window.add(100, "a")
+    window.add(0, "b")
+    assert window.value(100) == 1
+
+
+def test_windowed_distinct_is_empty_is_read_only():
+    window = SlidingWindowDistinct(10, 6)
+    assert window.is_empty(0)
+    window.add(100, "a")
+    assert not window.is_empty(150)
+    assert window.is_empty(1000)
+    window.add(105, "b")    # Still in the window the check looked past
+    assert window.value(105) == 2
+
+
+def test_windowed_distinct_snapshot_restore():
+    window = SlidingWindowDistinct(10, 6, precision=8)
+    for i in range(100):
+        window.add(i * 0.5, i)
+    restored = SlidingWindowDistinct(10, 6, precision=8)
+    restored.restore(json_round_trip(window.snapshot()))
+    assert restored.head == window.head
+    assert restored.value(50) == window.value(50)
+
+
+def test_windowed_top_k():
+    items = zipf_items(5000, 500)
+    exact = Counter(items)
+    window = SlidingWindowTopK(10, 6, k=5, capacity=32)
+    for i, item in enumerate(items):
+        window.add(i * 0.01, item)
+
+    top = window.value(50)
+    assert [item for item, _ in top] == [item for item, _ in exact.most_common(5)]
+    for item, count in top:
+        assert count >= exact[item]
+
+
+def test_windowed_top_k_expiry():
+    window = SlidingWindowTopK(10, 6, k=2)
+    for _ in range(5):
+        window.add(0, "old")
+    for _ in range(3):
+        window.add(30, "new")
+    assert window.value(30) == [["old", 5], ["new", 3]]
+    assert window.value(65) == [["new", 3]]
+    assert window.value(1000) == []
+    assert not window.totals.counts.any()
+
+
+def test_windowed_top_k_is_empty_is_read_only():
+    window = SlidingWindowTopK(10, 6)
+    assert window.is_empty(0)
+    window.add(100, "a")
+    assert not window.is_empty(100)
+    assert window.is_empty(1000)
+    window.add(105, "a")
+    assert window.value(105) == [["a", 2]]
+
+
+def test_windowed_top_k_snapshot_restore():
+    window = SlidingWindowTopK(10, 6, k=3, capacity=8)
+    for i, item in enumerate(zipf_items(500, 50)):
+        window.add(i * 0.1, item)
+    restored = SlidingWindowTopK(10, 6, k=3, capacity=8)
+    restored.restore(json_round_trip(window.snapshot()))
+    assert np.array_equal(restored.totals.counts, window.totals.counts)
+    assert restored.value(49) == window.value(49)
+
+
+def sketch_feature(**fields) -> FeatureDefinition:
+    defaults = dict(name="top_posts_1h", feature_type=FeatureType.REAL_TIME, description="",
+                    source_events=(EventType.USER_VIEW,), aggregation=Aggregation.TOP_K,
+                    value_field="post_id", window_seconds=3600, window_buckets=6)
+    defaults.update(fields)
+    return FeatureDefinition(**defaults)
+
+
+def test_for_feature():
+    top_k = SlidingWindowTopK.for_feature(sketch_feature(top_k=3, top_k_capacity=16))
+    assert (top_k.bucket_seconds, top_k.num_buckets, top_k.k, top_k.capacity) == (600, 6, 3, 16)
+    distinct = SlidingWindowDistinct.for_feature(sketch_feature(aggregation=Aggregation.DISTINCT,
+                                                                sketch_precision=8))
+    assert distinct.registers.shape == (6, 256)
+
+
+@pytest.mark.parametrize("aggregation", [Aggregation.DISTINCT, Aggregation.TOP_K])
+@pytest.mark.parametrize("fields", [{"value_field": None}, {"window_seconds": None}],
+                         ids=["no-value-field", "no-window"])
+def test_sketch_feature_validation(aggregation, fields):
+    with pytest.raises(ValueError):
+        sketch_feature(aggregation=aggregation, **fields)
+
+
+def test_top_k_feature_needs_capacity():
+    with pytest.raises(ValueError, match="top_k_capacity"):
+        sketch_feature(top_k=20, top_k_capacity=10)
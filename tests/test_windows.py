@@ -0,0 +1,113 @@
+import json
+import pytest
+from src.common.features import FeatureDefinition, FeatureType
+from src.streaming.windows import RunningTotal, SlidingWindowCounter
+
+
+def counter() -> SlidingWindowCounter:
+    """One-minute window in six 10s buckets"""
+    return SlidingWindowCounter(10, 6)
+
+
+def test_counts_within_window():
+    window = counter()
+    assert window.add(0) == 1
+    assert window.add(5, amount=3) == 4
+    assert window.add(55) == 5
+    assert window.value(59) == 5
+
+
+def test_advance_clears_expired_buckets():
+    window = counter()
+    window.add(0, amount=2)    # Bucket 0
+    window.add(15)             # Bucket 1
+    window.add(25)             # Bucket 2
+    assert window.value(60) == 2    # Bucket 0 dropped
+    assert window.value(70) == 1    # Bucket 1 dropped
+    assert window.value(85) == 0
+    assert window.counts == [0] * 6
+
+
+def test_whole_window_expiry():
+    window = counter()
+    for t in range(0, 60, 5):
+        window.add(t)
+    assert window.value(1000) == 0
+    assert window.head == 100
+    assert window.add(1001) == 1
+
+
+def test_late_event_inside_window_is_counted():
+    window = counter()
+    window.add(50)
+    assert window.add(10) == 2
+    assert window.value(50) == 2
+
+
+def test_late_event_outside_window_is_dropped():
+    window = counter()
+    window.add(100)
+    assert window.add(40) == 1    # Bucket 4, head 10, window is buckets 5..10
+    assert window.add(-1000) == 1
+    assert window.value(100) == 1
+
+
+def test_is_empty():
+    window = counter()
+    assert window.is_empty(0)
+    window.add(0)
+    assert not window.is_empty(0)
+    assert not window.is_empty(59)
+    assert window.is_empty(60)
+
+
+def test_is_empty_is_read_only():
+    window = counter()
+    window.add(100)
+    snapshot = json.dumps(window.snapshot())
+    assert window.is_empty(10000)
+    assert json.dumps(window.snapshot()) == snapshot
+    # A check far ahead of the data doesn't make in-window events late
+    assert window.add(110) == 2
+
+
+def test_is_empty_in_the_past():
+    window = counter()
+    window.add(100)
+    assert not window.is_empty(0)
+
+
+def test_snapshot_restore():
+    window = counter()
+    for t, amount in ((0, 1), (12, 2), (33, 4)):
+        window.add(t, amount)
+    restored = counter()
+    restored.restore(json.loads(json.dumps(window.snapshot())))
+    assert restored.total == 7
+    assert restored.value(65) == window.value(65) == 6
+
+
+def test_for_feature():
+    feature = FeatureDefinition(name="clicks_1h", feature_type=FeatureType.REAL_TIME,
+                                description="", window_seconds=3600, window_buckets=12)
+    window = SlidingWindowCounter.for_feature(feature)
+    assert window.bucket_seconds == 300
+    assert window.num_buckets == 12
+
+
+def test_for_feature_needs_window():
+    feature = FeatureDefinition(name="clicks", feature_type=FeatureType.REAL_TIME, description="")
+    with pytest.raises(ValueError):
+        SlidingWindowCounter.for_feature(feature)
+
+
+def test_running_total():
+    total = RunningTotal()
+    assert total.is_empty(0)
+    total.add(0)
+    total.add(1e9, amount=4)
+    assert total.value(0) == 5
+    restored = RunningTotal()
+    restored.restore(total.snapshot())
+    assert restored.value(2e9) == 5
+    assert not restored.is_empty(2e9)